@@ -1,11 +1,12 @@
-from game import play
+from game import play, scoring
 from agents import Agent
 from agents.random import RandomAgent
 import game.state_change as sc
 
 import logging
 import math
-import random
+import numpy as np
+import pickle
 
 
 def uct_score(parent_rollouts, child_rollouts, win_pct, temperature):
@@ -22,20 +23,23 @@ class MCTSNode:
         self.win_counts = {player: 0 for player in players}
         self.num_rollouts = 0
         self.children = []
-        self.unvisited_moves = uvmoves
+        # A copy, since moves get popped off it and some actions hand out the same list every time
+        self.unvisited_moves = list(uvmoves)
 
-    def add_random_child(self):
-        index = random.randint(0, len(self.unvisited_moves) - 1)
+    def add_random_child(self, rng):
+        index = rng.integers(len(self.unvisited_moves))
         new_move = self.unvisited_moves.pop(index)
         new_game_state = play.apply_move(self.game_state, new_move)
-        while not new_game_state.legal_moves():
+        while not new_game_state.is_over() and not new_game_state.legal_moves():
             new_game_state = play.apply_move(new_game_state, None)
         new_node = MCTSNode(new_game_state, self.win_counts.keys(), parent=self, move=new_move)
         self.children.append(new_node)
         return new_node
 
-    def record_win(self, winner):
-        self.win_counts[winner] += 1
+    # [wins] maps each player to their share of the win, which adds up to 1
+    def record_wins(self, wins):
+        for player, share in wins.items():
+            self.win_counts[player] += share
         self.num_rollouts += 1
 
     def winning_frac(self, player):
@@ -49,60 +53,96 @@ class MCTSNode:
 
 
 class MCTSAgent(Agent):
-    def __init__(self, players, temperature, num_rounds):
+    # With [rollout_turns], rollouts stop after that many turns and the players share the win according to
+    # [scoring.win_probabilities] with [score_scale], instead of playing on to the end of the game.
+    #
+    # With [num_trees] above 1, the rounds are split between that many independent trees searched from the same root
+    # on [executor] (e.g. a [concurrent.futures.ProcessPoolExecutor] that lasts as long as the agent), and their win
+    # counts for each move are added up
+    def __init__(self, players, temperature, num_rounds, rng=None, rollout_turns=None, score_scale=10, num_trees=1,
+                 executor=None):
         self.players = players
         self.temperature = temperature
         self.num_rounds = num_rounds
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.rollout_agent = RandomAgent(self.rng)
+        self.rollout_turns = rollout_turns
+        self.score_scale = score_scale
+        self.num_trees = num_trees
+        self.executor = executor
 
-    @staticmethod
-    def simulate_random_game(game_state):
-        agent = RandomAgent()
-        ctr = 0
+    def simulate_random_game(self, game_state):
+        agent = self.rollout_agent
+        last_turn = game_state.num_turns + self.rollout_turns if self.rollout_turns is not None else None
 
         while not game_state.is_over():
-            ctr += 1
-            next_action = game_state.action_stack.first
-            chosen = next_action.choose(agent, game_state)
+            if last_turn is not None and game_state.num_turns >= last_turn:
+                probabilities = scoring.win_probabilities(game_state, self.score_scale)
+                return {player.faction_name(): probabilities[i] for i, player in enumerate(game_state.players_by_idx)}
+            chosen = agent.select_move(game_state)
             game_state = play.apply_move(game_state, chosen)
 
-        return game_state.winner
+        return {game_state.winner: 1}
 
     def select_move(self, game_state):
-        old_level = logging.getLogger().level
-        logging.getLogger().setLevel(logging.ERROR)
         choices = game_state.legal_moves()
         if not choices:
-            logging.getLogger().setLevel(old_level)
             return None
         if len(choices) == 1:
-            logging.getLogger().setLevel(old_level)
             return choices[0]
+        if self.num_trees == 1:
+            wins, rollouts = self.search(game_state, choices, self.num_rounds)
+        else:
+            wins, rollouts = self.search_in_parallel(game_state, choices)
+        winning_fracs = np.where(rollouts > 0, wins / np.maximum(rollouts, 1), -1.0)
+        best = np.flatnonzero(winning_fracs == winning_fracs.max())
+        return choices[best[self.rng.integers(len(best))]]
+
+    # Runs [num_rounds] rounds from [game_state] and returns the current player's wins and the number of rollouts
+    # through each of [choices]
+    def search(self, game_state, choices, num_rounds):
+        old_level = logging.getLogger().level
+        logging.getLogger().setLevel(logging.ERROR)
         root = MCTSNode(game_state, self.players, unvisited_moves=choices)
-        for i in range(self.num_rounds):
+        for i in range(num_rounds):
             node = root
             while (not node.can_add_child()) and (not node.is_terminal()):
                 node = self.select_child(node)
 
             if node.can_add_child():
-                node = node.add_random_child()
+                node = node.add_random_child(self.rng)
 
-            winner = MCTSAgent.simulate_random_game(node.game_state)
+            wins = self.simulate_random_game(node.game_state)
 
             while node is not None:
-                node.record_win(winner)
+                node.record_wins(wins)
                 node = node.parent
 
-        best_move = None
-        best_pct = -1.0
         faction_name = sc.get_current_player(game_state).faction_name()
+        index_by_move = {move: i for i, move in enumerate(choices)}
+        wins, rollouts = np.zeros(len(choices)), np.zeros(len(choices))
         for child in root.children:
-            child_pct = child.winning_frac(faction_name)
-            if child_pct > best_pct:
-                best_pct = child_pct
-                best_move = child.move
-
+            wins[index_by_move[child.move]] = child.win_counts[faction_name]
+            rollouts[index_by_move[child.move]] = child.num_rollouts
         logging.getLogger().setLevel(old_level)
-        return best_move
+        return wins, rollouts
+
+    # The game state is pickled once and the same bytes go to every tree. Each tree gets its own seed from [rng], so
+    # the move chosen still depends only on the agent's generator. The trees run [num_rounds] between them, the first
+    # [num_rounds % num_trees] running one more than the rest.
+    def search_in_parallel(self, game_state, choices):
+        pickled_game_state = pickle.dumps(game_state, protocol=pickle.HIGHEST_PROTOCOL)
+        rounds_by_tree = [self.num_rounds // self.num_trees + (i < self.num_rounds % self.num_trees)
+                          for i in range(self.num_trees)]
+        seeds = self.rng.integers(2 ** 63, size=self.num_trees)
+        args = (pickled_game_state, self.players, self.temperature, self.rollout_turns, self.score_scale)
+        trees = [(num_rounds, seed) for num_rounds, seed in zip(rounds_by_tree, seeds) if num_rounds]
+        if self.executor is None:
+            results = [_search_tree(*args, num_rounds, seed) for num_rounds, seed in trees]
+        else:
+            results = [future.result() for future in
+                       [self.executor.submit(_search_tree, *args, num_rounds, seed) for num_rounds, seed in trees]]
+        return sum(wins for wins, _ in results), sum(rollouts for _, rollouts in results)
 
     def select_child(self, node):
         best_score = 0
@@ -115,3 +155,10 @@ class MCTSAgent(Agent):
                 best_score = score
                 best_child = child
         return best_child
+
+
+# One of the trees for [MCTSAgent.search_in_parallel], run wherever the executor puts it
+def _search_tree(pickled_game_state, players, temperature, rollout_turns, score_scale, num_rounds, seed):
+    game_state = pickle.loads(pickled_game_state)
+    agent = MCTSAgent(players, temperature, num_rounds, np.random.default_rng(seed), rollout_turns, score_scale)
+    return agent.search(game_state, game_state.legal_moves(), num_rounds)
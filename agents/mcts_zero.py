@@ -1,7 +1,7 @@
-from game import play
-from game.actions import MoveOnePiece
-from agents import Agent
-from training import constants as model_const, decode, model
+from game import play, record as game_record
+from game.actions import LoadCargo, MacroMoveOnePiece, MoveOnePiece
+from training import constants as model_const, decode, metrics, model
+from training.metrics import Counter, Phase
 import encoders.game_state as gs_enc
 import game.state_change as sc
 
@@ -10,7 +10,6 @@ import numpy as np
 import logging
 import time
 
-from collections import  defaultdict
 from enum import Enum
 
 logger = logging.getLogger('mcts_zero_debug_logger')
@@ -21,115 +20,147 @@ logger.setLevel(logging.ERROR)
 class ExperienceCollector:
     indices_by_faction_name = attr.ib()
     game_states = attr.ib(factory=list)
+    # For each game state, the visit count of each of its legal moves, in the order of [GameState.legal_moves]
     move_visits = attr.ib(factory=list)
+    model_versions = attr.ib(factory=list)
     winner = attr.ib(default=None)
 
-    def record_move(self, game_state, move_visits):
+    def record_move(self, game_state, move_visits, model_version=0):
         self.game_states.append(game_state)
         self.move_visits.append(move_visits)
+        self.model_versions.append(model_version)
 
     def complete_episode(self, winner):
         self.winner = winner
 
+    # Adds up [visits] by head index and turns them into (row, head, index, probability) entries for the indices
+    # that were visited at all
     @staticmethod
-    def _assign_move_probs_aux(values_and_move_probs, row, output_head, decoder, move_visits):
-        for move in move_visits.keys():
-            move_prob = move_visits[move] / sum(move_visits.values())
-            head = values_and_move_probs[output_head]
-            head[row, decoder(move)] = move_prob
+    def _move_probs_aux(row, output_head, indices, visits):
+        total_visits = visits.sum()
+        visits_by_index = np.bincount(indices, weights=visits)
+        return [(row, output_head, index, visits_by_index[index] / total_visits)
+                for index in np.flatnonzero(visits_by_index)]
 
     @staticmethod
-    def _assign_move_probs(values_and_move_probs, row, top_action_class, move_visits):
+    def _move_probs(row, top_action_class, choices, move_visits):
         output_head = decode.model_head_by_action_class[top_action_class].value
-        decoder = decode.decoders[top_action_class]
-        ExperienceCollector._assign_move_probs_aux(values_and_move_probs, row, output_head, decoder, move_visits)
+        return ExperienceCollector._move_probs_aux(row, output_head, decode.head_indices(top_action_class, choices),
+                                                   move_visits)
 
     @staticmethod
-    def _assign_move_probs__move_one_piece(values_and_move_probs, row, move_visits):
-        board_coord_visits = defaultdict(int)
-        piece_type_visits = defaultdict(int)
-        for move, visits in move_visits.items():
-            board_coords, piece_type = move
-            board_coord_visits[board_coords] += visits
-            piece_type_visits[piece_type] += visits
-        ExperienceCollector._assign_move_probs_aux(values_and_move_probs, row, model_const.Head.BOARD_COORDS_HEAD.value,
-                                                   decode.decode_board_space, board_coord_visits)
-        ExperienceCollector._assign_move_probs_aux(values_and_move_probs, row, model_const.Head.PIECE_TYP_HEAD.value,
-                                                   decode.decode_enum_value, piece_type_visits)
-
-    def to_numpy(self):
+    def _move_probs__move_one_piece(row, choices, move_visits):
+        board_coords_indices, piece_typ_indices = decode.board_coords_and_piece_typ_indices(choices)
+        return ExperienceCollector._move_probs_aux(row, model_const.Head.BOARD_COORDS_HEAD.value,
+                                                   board_coords_indices, move_visits) \
+            + ExperienceCollector._move_probs_aux(row, model_const.Head.PIECE_TYP_HEAD.value, piece_typ_indices,
+                                                  move_visits)
+
+    # Each sample only has a target for one policy head (two for [MoveOnePiece]), and only for the moves that were
+    # visited, so rather than filling in a dense array for every head, we keep a (head, index, probability) triple per
+    # visited index. The triples of all the samples are returned as flat arrays, in order, along with the number that
+    # belong to each sample. [model.sparse_to_dense] turns a batch of these back into dense targets.
+    def to_sparse(self):
         encoded_game_states = [gs_enc.encode(game_state) for game_state in self.game_states]
         encoded_boards = np.array([egs.board for egs in encoded_game_states])
         encoded_data = np.array([egs.encoded_data() for egs in encoded_game_states])
-        values_and_move_probs = model.empty_heads(len(self.game_states))
-        values_and_move_probs[model_const.Head.VALUE_HEAD.value][:, self.indices_by_faction_name[self.winner]] = 1
+        n = len(self.game_states)
+        values = np.zeros((n, model.head_sizes[model_const.Head.VALUE_HEAD]), dtype=np.float32)
+        values[:, self.indices_by_faction_name[self.winner]] = 1
+        lengths = np.zeros(n, dtype=np.int16)
+        entries = []
         for i, game_state in enumerate(self.game_states):
             top_action_class = game_state.action_stack.first.__class__
+            choices = game_state.legal_moves()
+            move_visits = np.asarray(self.move_visits[i], dtype=np.float64)
             if top_action_class is MoveOnePiece:
-            # If the action is [MoveOnePiece], we can't just use a decoder as normal. We need to compute probabilities
-            # for both board space and piece type from the available choices.
-                ExperienceCollector._assign_move_probs__move_one_piece(values_and_move_probs, i, self.move_visits[i])
+                # If the action is [MoveOnePiece], we can't just use a decoder as normal. We need to compute
+                # probabilities for both board space and piece type from the available choices.
+                sample_entries = ExperienceCollector._move_probs__move_one_piece(i, choices, move_visits)
+            elif top_action_class is MacroMoveOnePiece:
+                # The model has no say in anything but the piece, so that's all there is to train
+                sample_entries = ExperienceCollector._move_probs__move_one_piece(
+                    i, [macro_move[0] for macro_move in choices], move_visits)
+            elif top_action_class is LoadCargo:
+                # There's no head to train (see [decode.get_move_priors]); the sample still trains the value head
+                sample_entries = []
             else:
-                ExperienceCollector._assign_move_probs(values_and_move_probs, i, top_action_class, self.move_visits[i])
-
-        return encoded_boards, encoded_data, values_and_move_probs
-
-
-@attr.s(slots=True)
-class Branch:
-    # Prior probability of choosing this branch, based on the model's prediction
-    # for the parent state
-    prior = attr.ib()
-    visit_count = attr.ib(default=0)
-    total_value = attr.ib(default=0.0)
+                sample_entries = ExperienceCollector._move_probs(i, top_action_class, choices, move_visits)
+            lengths[i] = len(sample_entries)
+            entries.extend(sample_entries)
 
+        heads = np.array([head for _, head, _, _ in entries], dtype=np.int8)
+        indices = np.array([index for _, _, index, _ in entries], dtype=np.int16)
+        probs = np.array([prob for _, _, _, prob in entries], dtype=np.float32)
+        return encoded_boards, encoded_data, values, lengths, heads, indices, probs, \
+            np.array(self.model_versions, dtype=np.int64)
 
+    def to_numpy(self):
+        encoded_boards, encoded_data, values, lengths, heads, indices, probs, model_versions = self.to_sparse()
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        return encoded_boards, encoded_data, model.sparse_to_dense(values, rows, heads, indices, probs), \
+            model_versions
+
+
+# Rebuilds the experience of every player in a recorded game (see [game.record]) from its visit counts, e.g. to
+# re-encode old games into the replay buffer after [encoders.game_state] has changed
+def experience_collectors_from_record(record):
+    assert record.visits is not None, 'Game was recorded without visit counts'
+    experience_collectors = {}
+    for game_state, i in game_record.replay(record):
+        if i is None:
+            continue
+        faction_name = sc.get_current_player(game_state).faction_name()
+        if faction_name not in experience_collectors:
+            experience_collectors[faction_name] = \
+                ExperienceCollector(gs_enc.get_indices_by_faction_name(game_state))
+        experience_collectors[faction_name].record_move(game_state, record.visits[i])
+    for experience_collector in experience_collectors.values():
+        experience_collector.complete_episode(game_state.winner)
+    return experience_collectors
+
+
+# A node in the search tree. Moves from it are referred to by their index in [choices], which is the order of
+# [GameState.legal_moves], and everything known about them is kept in arrays in that order. Only when a move is
+# actually played does it get turned back into a choice.
 @attr.s(slots=True)
 class Node:
     game_state = attr.ib()
+    choices = attr.ib()
     # Mapping from player faction to value for this state
     values = attr.ib()
     # [parent] and [last_move] are stored to facilitate propagating values back up the tree
     parent = attr.ib()
     last_move = attr.ib()
+    # Prior probability of choosing each move, based on the model's prediction for this state
+    priors = attr.ib()
+    visit_counts = attr.ib()
+    total_values = attr.ib()
+    children = attr.ib()
     total_visit_count = attr.ib(default=1)
-    branches = attr.ib(factory=dict)
-    children = attr.ib(factory=dict)
 
     @classmethod
-    def from_state(cls, state, values, parent, last_move, priors):
-        node = cls(state, values, parent, last_move)
-        for move, p in priors.items():
-            node.branches[move] = Branch(p)
+    def from_state(cls, state, choices, values, parent, last_move, priors):
+        n = len(priors)
+        node = cls(state, choices, values, parent, last_move, priors, np.zeros(n, dtype=np.int64), np.zeros(n),
+                   [None] * n)
         if parent is not None:
-            parent._add_child(last_move, node)
+            parent.children[last_move] = node
         return node
 
-    def moves(self):
-        return list(self.branches.keys())
-
-    def _add_child(self, move, child_node):
-        self.children[move] = child_node
+    def num_moves(self):
+        return len(self.priors)
 
     def has_child(self, move):
-        return move in self.children
-
-    def expected_value(self, move):
-        branch = self.branches[move]
-        if branch.visit_count == 0:
-            return 0.0
-        return branch.total_value / branch.visit_count
+        return self.children[move] is not None
 
-    def prior(self, move):
-        return self.branches[move].prior
-
-    def visit_count(self, move):
-        return self.branches[move].visit_count
+    def expected_values(self):
+        return self.total_values / np.maximum(self.visit_counts, 1)
 
     def record_visit(self, move, value):
         self.total_visit_count += 1
-        self.branches[move].visit_count += 1
-        self.branches[move].total_value += value
+        self.visit_counts[move] += 1
+        self.total_values[move] += value
 
     def propagate_values(self):
         node = self
@@ -143,37 +174,37 @@ class Node:
             node = node.parent
 
 
+# The move with the best upper confidence bound from [node], as an index into its choices. Ties go to the first.
+def select_branch(node, c):
+    scores = node.expected_values() + c * node.priors * np.sqrt(node.total_visit_count) / (node.visit_counts + 1)
+    return int(np.argmax(scores))
+
+
+# The coroutine version of [MCTSZeroAgentManual]: each agent owns one slot of its worker's view, and many of them
+# share a [WorkerEnvConn] to wait for the evaluator together.
 # TODO: IMPORTANT - SHARE THE TREE BETWEEN SIMULATIONS OF THE SAME GAME
 @attr.s(slots=True)
-class MCTSZeroAgent(Agent):
+class MCTSZeroAgent:
     simulations_per_choice = attr.ib()
     c = attr.ib()
     view = attr.ib()
     worker_env_conn = attr.ib()
+    env_slot = attr.ib()
     experience_collectors = attr.ib(factory=dict)
+    # The newest model version that contributed predictions to the current search
+    model_version = attr.ib(default=0)
+    # For sampling the move to make from the visit counts
+    rng = attr.ib(factory=np.random.default_rng)
 
     def begin_episode(self, factions):
-        for faction in factions:
-            self.experience_collectors[faction] = None
+        self.experience_collectors = {faction: None for faction in factions}
 
     def complete_episode(self, winner):
         for experience_collector in self.experience_collectors.values():
-            experience_collector.complete_episode(winner)
-
-    def select_branch(self, node):
-        total_n = node.total_visit_count
-
-        def score_branch(move):
-            q = node.expected_value(move)
-            p = node.prior(move)
-            n = node.visit_count(move)
-            score = q + self.c * p * np.sqrt(total_n) / (n + 1)
-            # if logger.isEnabledFor(logging.DEBUG):
-            #     logger.debug(f'Evaluating move {move}')
-            #     logger.debug(f'EV: {q}; P: {p}; VC: {n}; Score: {score}')
-            return score
-
-        return max(node.moves(), key=score_branch)
+            # A player who never had a real choice to make won't have a collector
+            if experience_collector is not None:
+                experience_collector.complete_episode(winner)
+        metrics.increment(Counter.GAMES)
 
     # Even though [choices] is implied by [game_state], we pass it in here to avoid recomputing it
     # since we needed to compute it in the initial call to [select_move] in order to shortcut in the
@@ -184,22 +215,27 @@ class MCTSZeroAgent(Agent):
             for player in game_state.players_by_idx:
                 faction_name = player.faction_name()
                 values[faction_name] = 1 if faction_name is game_state.winner else 0
-            move_priors = {}
+            move_priors = np.zeros(0)
         else:
-            t = time.time()
             # Encode game state and write to shared memory
+            t = metrics.start()
             encoded_game_state = gs_enc.encode(game_state)
-            assert self.view.board.shape == encoded_game_state.board.shape
-            self.view.board[:] = encoded_game_state.board
             encoded_data = encoded_game_state.encoded_data()
-            assert self.view.data.shape == encoded_data.shape
-            self.view.data[:] = encoded_data
-            self.worker_env_conn.wake_up_env()
-            await self.worker_env_conn.worker_get_woken_up()
+            metrics.stop(Phase.ENCODE, t)
+            t = metrics.start()
+            self.view.write_board(encoded_game_state.board, self.env_slot)
+            self.view.write_data(encoded_data, self.env_slot)
+            metrics.stop(Phase.SHM_WRITE, t)
+            t = metrics.start()
+            await self.worker_env_conn.request_predictions()
+            metrics.stop(Phase.WAIT, t)
             # Read the predictions out of shared memory and convert them to values and move priors
-            values, move_priors = model.to_values_and_move_priors(game_state, choices, self.view.preds)
-            # print(f'Took {time.time() - t}s to get evaluation results')
-        new_node = Node.from_state(game_state, values, parent, move, move_priors)
+            t = metrics.start()
+            values, move_priors = model.to_values_and_move_priors(game_state, choices, self.view.preds[self.env_slot])
+            self.model_version = max(self.model_version, int(self.view.model_versions[self.env_slot]))
+            self.view.write_preds_clean(self.env_slot)
+            metrics.stop(Phase.DECODE, t)
+        new_node = Node.from_state(game_state, choices, values, parent, move, move_priors)
         # if parent is not None:
         #     parent.add_child(move, new_node)
         return new_node
@@ -222,21 +258,22 @@ class MCTSZeroAgent(Agent):
 
         for i in range(self.simulations_per_choice * len(choices)):
             logger.debug('STARTING AT THE ROOT')
+            metrics.increment(Counter.SIMULATIONS)
             node = root
-            while node.moves():
+            while node.num_moves():
                 if logger.isEnabledFor(logging.DEBUG):
                     logger.debug(f'Selecting a branch for {node.game_state.action_stack.first.__class__}')
-                move = self.select_branch(node)
+                move = select_branch(node, self.c)
                 if node.has_child(move):
                     node = node.children[move]
                 else:
                     break
 
             if node.game_state.is_over():
-                values_to_propagate = {faction_name: 1 if faction_name is game_state.winner else 0
+                values_to_propagate = {faction_name: 1 if faction_name is node.game_state.winner else 0
                                        for faction_name in game_state.player_idx_by_faction_name.keys()}
             else:
-                new_state = play.apply_move(node.game_state, move)
+                new_state = play.apply_move(node.game_state, node.choices[move])
                 legal_moves = new_state.legal_moves()
                 while not new_state.is_over() and (not legal_moves or len(legal_moves) == 1):
                     new_state = play.apply_move(new_state, None) if not legal_moves \
@@ -257,16 +294,13 @@ class MCTSZeroAgent(Agent):
                 node = node.parent
 
         logging.getLogger().setLevel(old_level)
-        legal_moves = root.moves()
-        move_visits = {move: root.visit_count(move) for move in legal_moves}
-        assert len(legal_moves) == len(move_visits)
-        self.experience_collectors[faction_name].record_move(game_state, move_visits)
-        total_moves = sum(move_visits.values())
-        probas = [mv / total_moves for mv in move_visits.values()]
+        move_visits = root.visit_counts.copy()
+        self.experience_collectors[faction_name].record_move(game_state, move_visits, self.model_version)
+        self.model_version = 0
+        probas = move_visits / move_visits.sum()
         if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f'Probability distribution for {legal_moves}: {probas}')
-        # Have to do this annoying thing because [legal_moves] might contain tuples
-        return legal_moves[np.random.choice(range(len(legal_moves)), p=probas)]
+            logger.debug(f'Probability distribution for {root.choices}: {probas}')
+        return root.choices[self.rng.choice(len(probas), p=probas)]
 
 
 @attr.s(slots=True)
@@ -283,9 +317,19 @@ class MCTSZeroAgentManual:
     old_logging_level = attr.ib(default=None)
     pending_game_state_and_choices_and_move = attr.ib(default=None)
     timestamp = attr.ib(default=None)
-
-    def begin_episode(self, faction_names):
+    model_ids_by_faction_name = attr.ib(default=None)
+    # The newest model version that contributed predictions to the current search
+    model_version = attr.ib(default=0)
+    # Visit counts of the root's moves for the last move selected
+    last_move_visits = attr.ib(default=None)
+    # For sampling the move to make from the visit counts
+    rng = attr.ib(factory=np.random.default_rng)
+
+    # [model_ids_by_faction_name] says which of the evaluator's models should be used when searching on behalf of
+    # each player. Leave it out when the evaluator is only serving one model.
+    def begin_episode(self, faction_names, model_ids_by_faction_name=None):
         self.experience_collectors = {faction_name: None for faction_name in faction_names}
+        self.model_ids_by_faction_name = model_ids_by_faction_name
         self.current_tree_node = None
         self.current_tree_root = None
         self.current_simulation = 0
@@ -294,23 +338,13 @@ class MCTSZeroAgentManual:
 
     def complete_episode(self, winner):
         for experience_collector in self.experience_collectors.values():
-            experience_collector.complete_episode(winner)
-        print(f'Worker {self.worker_id} finished a game in slot {self.env_slot} in {time.time() - self.timestamp}s')
-
-    def select_branch(self, node):
-        total_n = node.total_visit_count
-
-        def score_branch(move):
-            q = node.expected_value(move)
-            p = node.prior(move)
-            n = node.visit_count(move)
-            score = q + self.c * p * np.sqrt(total_n) / (n + 1)
-            # if logger.isEnabledFor(logging.DEBUG):
-            #     logger.debug(f'Evaluating move {move}')
-            #     logger.debug(f'EV: {q}; P: {p}; VC: {n}; Score: {score}')
-            return score
-
-        return max(node.moves(), key=score_branch)
+            # A player who never had a real choice to make won't have a collector
+            if experience_collector is not None:
+                experience_collector.complete_episode(winner)
+        metrics.increment(Counter.GAMES)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Worker {self.worker_id} finished a game in slot {self.env_slot} in '
+                         f'{time.time() - self.timestamp}s')
 
     class Result(Enum):
         PREDICTIONS_NEEDED = 0
@@ -318,16 +352,28 @@ class MCTSZeroAgentManual:
         GAME_OVER = 2
         NEXT_SIMULATION = 3
 
-    def send_encodings_to_evaluator(self, game_state):
+    def model_id(self, faction_name):
+        if self.model_ids_by_faction_name is None:
+            return 0
+        return self.model_ids_by_faction_name[faction_name]
+
+    def send_encodings_to_evaluator(self, game_state, model_id):
+        t = metrics.start()
         encoded_game_state = gs_enc.encode(game_state)
-        self.view.write_board(encoded_game_state.board, self.env_slot)
         encoded_data = encoded_game_state.encoded_data()
+        metrics.stop(Phase.ENCODE, t)
+        t = metrics.start()
+        self.view.write_model_id(model_id, self.env_slot)
+        self.view.write_board(encoded_game_state.board, self.env_slot)
         self.view.write_data(encoded_data, self.env_slot)
+        metrics.stop(Phase.SHM_WRITE, t)
 
     def handle_terminal_state(self):
         # We are at a terminal state, so just do propagation and move to the next simulation. There are
         # fancier things we can do later to prevent this state from being reached again.
+        t = metrics.start()
         self.current_tree_node.propagate_values()
+        metrics.stop(Phase.BACKUP, t)
         self.current_tree_node = self.current_tree_root
         return MCTSZeroAgentManual.Result.NEXT_SIMULATION, None
 
@@ -363,7 +409,7 @@ class MCTSZeroAgentManual:
 
             # Save these for the decoding step
             self.pending_game_state_and_choices_and_move = root_game_state, root_choices, None
-            self.send_encodings_to_evaluator(root_game_state)
+            self.send_encodings_to_evaluator(root_game_state, self.model_id(faction_name))
             return MCTSZeroAgentManual.Result.PREDICTIONS_NEEDED, None
 
         if self.current_simulation == self.simulations_per_choice:
@@ -371,51 +417,55 @@ class MCTSZeroAgentManual:
             # the probability distribution from the visits of each of the children of the root. At this point
             # we can also reinstall the initial logging level.
             logging.getLogger().setLevel(self.old_logging_level)
-            legal_moves = self.current_tree_root.moves()
-            move_visits = {move: self.current_tree_root.visit_count(move) for move in legal_moves}
-            self.experience_collectors[faction_name].record_move(root_game_state, move_visits)
-            total_moves = sum(move_visits.values())
-            probas = [move_visits[m] / total_moves for m in legal_moves]
+            legal_moves = self.current_tree_root.choices
+            move_visits = self.current_tree_root.visit_counts.copy()
+            self.experience_collectors[faction_name].record_move(root_game_state, move_visits, self.model_version)
+            self.last_move_visits = move_visits
+            self.model_version = 0
+            probas = move_visits / move_visits.sum()
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f'Finishing simulation for {self.current_tree_root.game_state.action_stack.first.__class__}')
                 logger.debug(f'Move visits: {move_visits}')
                 logger.debug(f'Probability distribution for {legal_moves}: {probas}')
             self.current_simulation = 0
             self.current_tree_root = self.current_tree_node = None
-            # Have to do this annoying thing because [legal_moves] might contain tuples
-            return MCTSZeroAgentManual.Result.MOVE_SELECTED, legal_moves[np.random.choice(range(len(legal_moves)),
-                                                                                          p=probas)]
+            return MCTSZeroAgentManual.Result.MOVE_SELECTED, legal_moves[self.rng.choice(len(legal_moves), p=probas)]
 
         # Perform the next simulation. Using [select_branch], find a node that's either terminal or needs exploration.
         self.current_simulation += 1
-        moves = self.current_tree_node.moves()
+        metrics.increment(Counter.SIMULATIONS)
+        t = metrics.start()
+        num_moves = self.current_tree_node.num_moves()
 
-        while moves:
+        while num_moves:
             # We know this has to run at least once, because we don't put any nodes in the tree unless they have
             # at least two move choices.
-            assert len(moves) > 1
+            assert num_moves > 1
             if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(f'Selecting a branch for {self.current_tree_node.game_state.action_stack.first.__class__} with moves {moves}')
-            move = self.select_branch(self.current_tree_node)
+                logger.debug(f'Selecting a branch for {self.current_tree_node.game_state.action_stack.first.__class__} with moves {self.current_tree_node.choices}')
+            move = select_branch(self.current_tree_node, self.c)
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f'Selected move {move}')
             if self.current_tree_node.has_child(move):
                 logger.debug(f'Child exists, so taking a step down the tree')
                 self.current_tree_node = self.current_tree_node.children[move]
-                moves = self.current_tree_node.moves()
+                num_moves = self.current_tree_node.num_moves()
             else:
                 break
+        metrics.stop(Phase.SELECTION, t)
 
         if not self.current_tree_node.game_state.is_over():
             # If we're not at a terminal state, apply the move from the last branch we selected and make a new node
             # from it. We're going to need to get predictions before we can finish creating the node, so save all
             # necessary state.
-            new_state = play.apply_move(self.current_tree_node.game_state, move)
+            t = metrics.start()
+            new_state = play.apply_move(self.current_tree_node.game_state, self.current_tree_node.choices[move])
             legal_moves = new_state.legal_moves()
             while not new_state.is_over() and (not legal_moves or len(legal_moves) == 1):
                 new_state = play.apply_move(new_state, None) if not legal_moves \
                     else play.apply_move(new_state, legal_moves[0])
                 legal_moves = new_state.legal_moves()
+            metrics.stop(Phase.EXPANSION, t)
             if new_state.is_over():
                 # Predictions give us a value and a pdf, but now we know the value and we don't need a pdf because
                 # there are no moves left. Create a new node, propagate terminal values and proceed to the next
@@ -423,12 +473,12 @@ class MCTSZeroAgentManual:
                 values = {
                     faction_name: 1 if faction_name is self.current_tree_node.game_state.winner else 0
                     for faction_name in self.current_tree_node.game_state.player_idx_by_faction_name.keys()}
-                self.current_tree_node = Node.from_state(new_state, values, parent=self.current_tree_node,
-                                                         last_move=move, priors={})
+                self.current_tree_node = Node.from_state(new_state, [], values, parent=self.current_tree_node,
+                                                         last_move=move, priors=np.zeros(0))
                 return self.handle_terminal_state()
             else:
                 self.pending_game_state_and_choices_and_move = new_state, legal_moves, move
-                self.send_encodings_to_evaluator(new_state)
+                self.send_encodings_to_evaluator(new_state, self.model_id(faction_name))
                 return MCTSZeroAgentManual.Result.PREDICTIONS_NEEDED, None
         else:
             return self.handle_terminal_state()
@@ -439,13 +489,18 @@ class MCTSZeroAgentManual:
         # to start the next simulation, so reset the current tree node to the root.
         assert self.pending_game_state_and_choices_and_move is not None
         game_state, choices, move = self.pending_game_state_and_choices_and_move
+        t = metrics.start()
         values, move_priors = model.to_values_and_move_priors(game_state, choices, self.view.preds[self.env_slot])
+        self.model_version = max(self.model_version, int(self.view.model_versions[self.env_slot]))
         self.view.write_preds_clean(self.env_slot)
-        self.current_tree_node = Node.from_state(game_state, values, parent=self.current_tree_node, last_move=move,
-                                                 priors=move_priors)
+        metrics.stop(Phase.DECODE, t)
+        self.current_tree_node = Node.from_state(game_state, choices, values, parent=self.current_tree_node,
+                                                 last_move=move, priors=move_priors)
         if self.current_tree_root is None:
             self.current_tree_root = self.current_tree_node
         else:
+            t = metrics.start()
             self.current_tree_node.propagate_values()
+            metrics.stop(Phase.BACKUP, t)
         self.pending_game_state_and_choices_and_move = None
         self.current_tree_node = self.current_tree_root
\ No newline at end of file
@@ -4,11 +4,13 @@ import numpy as np
 
 
 class RandomAgent(Agent):
-    def __init__(self):
+    # [rng] is a [numpy.random.Generator]
+    def __init__(self, rng=None):
         super().__init__()
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def select_move(self, game_state):
         choices = game_state.action_stack.first.choices(game_state)
         if not choices:
             return None
-        return choices[np.random.randint(len(choices))]
+        return choices[self.rng.integers(len(choices))]
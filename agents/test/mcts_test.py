@@ -0,0 +1,118 @@
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from agents import mcts
+from agents.mcts import MCTSAgent, MCTSNode
+from game.game_state import GameState
+
+NUM_ROUNDS = 10
+NUM_TREES = 3
+ROLLOUT_TURNS = 2
+
+
+def game_state_with_choices(seed):
+    game_state = GameState.from_num_players(2, seed=seed)
+    assert len(game_state.legal_moves()) > 1
+    return game_state
+
+
+def parallel_agent(game_state, seed, executor=None):
+    faction_names = list(game_state.player_idx_by_faction_name.keys())
+    return MCTSAgent(faction_names, temperature=0.8, num_rounds=NUM_ROUNDS, rng=np.random.default_rng(seed),
+                     rollout_turns=ROLLOUT_TURNS, num_trees=NUM_TREES, executor=executor)
+
+
+# Trees run in another process search exactly as they would here, and every round ends up in the merged counts
+def test_parallel_matches_serial():
+    game_state = game_state_with_choices(0)
+    choices = game_state.legal_moves()
+    serial_wins, serial_rollouts = parallel_agent(game_state, 1).search_in_parallel(game_state, choices)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        wins, rollouts = parallel_agent(game_state, 1, executor).search_in_parallel(game_state, choices)
+        move = parallel_agent(game_state, 2, executor).select_move(game_state)
+    assert rollouts.sum() == NUM_ROUNDS
+    assert (rollouts == serial_rollouts).all() and (wins == serial_wins).all()
+    assert move is parallel_agent(game_state, 2).select_move(game_state)
+
+
+# The first [NUM_ROUNDS % NUM_TREES] trees get the rounds left over
+def test_rounds_split_between_trees():
+    game_state = game_state_with_choices(0)
+    choices = game_state.legal_moves()
+    rounds = []
+
+    def fake_search_tree(pickled_game_state, players, temperature, rollout_turns, score_scale, num_rounds, seed):
+        rounds.append(num_rounds)
+        return np.zeros(len(choices)), np.full(len(choices), num_rounds)
+
+    search_tree = mcts._search_tree
+    mcts._search_tree = fake_search_tree
+    try:
+        _, rollouts = parallel_agent(game_state, 1).search_in_parallel(game_state, choices)
+    finally:
+        mcts._search_tree = search_tree
+    assert rounds == [4, 3, 3], rounds
+    assert (rollouts == NUM_ROUNDS).all()
+
+
+# Passes the moves through to [agent], remembering the turn each one was chosen on
+class TurnRecorder:
+    def __init__(self, agent):
+        self.agent = agent
+        self.turns = []
+
+    def select_move(self, game_state):
+        self.turns.append(game_state.num_turns)
+        return self.agent.select_move(game_state)
+
+
+def truncating_agent(game_state, seed):
+    faction_names = list(game_state.player_idx_by_faction_name.keys())
+    agent = MCTSAgent(faction_names, temperature=0.8, num_rounds=NUM_ROUNDS, rng=np.random.default_rng(seed),
+                      rollout_turns=ROLLOUT_TURNS)
+    agent.rollout_agent = TurnRecorder(agent.rollout_agent)
+    return agent
+
+
+def test_truncated_rollout():
+    game_state = game_state_with_choices(0)
+    agent = truncating_agent(game_state, 1)
+    wins = agent.simulate_random_game(game_state)
+    assert max(agent.rollout_agent.turns) == game_state.num_turns + ROLLOUT_TURNS - 1
+    assert set(wins) == set(game_state.player_idx_by_faction_name)
+    assert np.isclose(sum(wins.values()), 1)
+    assert all(0 < share < 1 for share in wins.values()), wins
+
+
+# Each rollout's shares are added to every node on its path, so win counts are fractional but still add up to the
+# number of rollouts
+def test_fractional_wins_along_path():
+    game_state = game_state_with_choices(0)
+    agent = truncating_agent(game_state, 1)
+    root = MCTSNode(game_state, agent.players)
+    child = root.add_random_child(agent.rng)
+    all_wins = [agent.simulate_random_game(child.game_state) for _ in range(3)]
+    for wins in all_wins:
+        node = child
+        while node is not None:
+            node.record_wins(wins)
+            node = node.parent
+    for node in (root, child):
+        assert node.num_rollouts == len(all_wins)
+        assert np.isclose(sum(node.win_counts.values()), len(all_wins))
+        for player in agent.players:
+            assert np.isclose(node.win_counts[player], sum(wins[player] for wins in all_wins))
+            assert np.isclose(node.winning_frac(player), node.win_counts[player] / len(all_wins))
+
+
+def run_tests():
+    test_parallel_matches_serial()
+    test_rounds_split_between_trees()
+    test_truncated_rollout()
+    test_fractional_wins_along_path()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import numpy as np
+import pickle
+import time
+
+from collections import defaultdict
+
+from agents import MCTSAgent, RandomAgent
+from encoders import game_state as gs_enc
+from game import movement, play, scoring, state_change as sc
+from game.actions import LoadCargo, MacroMoveOnePiece, MoveOnePiece
+from game.components import piece as gc_piece
+from game.game_state import GameState, Setup
+from training import decode, model
+from training.constants import Head
+
+# Positions are sampled from games rather than taking every one, so that a corpus covers many games at once
+SAMPLE_PROBABILITY = 0.2
+MCTS_ROUNDS = 10
+
+
+def play_and_record(game_state, agents, corpus, rng):
+    while not game_state.is_over():
+        if rng.random() < SAMPLE_PROBABILITY:
+            corpus.append(game_state)
+        agent = agents[game_state.current_player_idx]
+        game_state = play.apply_move(game_state, agent.select_move(game_state))
+    # Keep some finished games too so that [finalize] gets timed on realistic end states
+    corpus.append(game_state)
+
+
+def record_corpus(*, num_random_games, num_mcts_games, num_players=2, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(num_random_games):
+        game_state = GameState.from_setup(Setup.random(num_players, rng))
+        play_and_record(game_state, [RandomAgent(rng)] * num_players, corpus, rng)
+    for _ in range(num_mcts_games):
+        game_state = GameState.from_setup(Setup.random(num_players, rng))
+        faction_names = list(game_state.player_idx_by_faction_name.keys())
+        agents = [MCTSAgent(faction_names, temperature=0.8, num_rounds=MCTS_ROUNDS, rng=rng), RandomAgent(rng)]
+        play_and_record(game_state, agents, corpus, rng)
+    return corpus
+
+
+def save_corpus(corpus, path):
+    with open(path, 'wb') as f:
+        pickle.dump(corpus, f)
+
+
+def load_corpus(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def uniform_preds():
+    return [np.full(model.head_sizes[head], 1 / model.head_sizes[head]) for head in Head]
+
+
+# [game.movement] keeps what it works out on the game state, so it's forgotten first, or every repeat after the first
+# would just be a lookup
+def legal_moves(game_state):
+    movement.forget(game_state)
+    return game_state.legal_moves()
+
+
+def movable_pieces(game_state):
+    movement.forget(game_state)
+    return movement.movable_pieces(game_state)
+
+
+def apply_first_move(game_state):
+    choices = game_state.legal_moves()
+    return play.apply_move(game_state, choices[0] if choices else None)
+
+
+def effective_adjacent_space_coords_for_character(game_state):
+    faction_name = sc.get_current_player(game_state).faction_name()
+    return sc.effective_adjacent_space_coords(game_state, gc_piece.character_key(faction_name))
+
+
+def get_move_priors(game_state, preds=uniform_preds()):
+    return decode.get_move_priors(preds, game_state.action_stack.first.__class__, game_state.legal_moves())
+
+
+def can_decode(game_state):
+    top_action_class = game_state.action_stack.first.__class__
+    choices = game_state.legal_moves()
+    return choices is not None and len(choices) > 1 \
+        and (top_action_class in decode.decoders
+             or top_action_class in (MoveOnePiece, MacroMoveOnePiece, LoadCargo))
+
+
+# Each entry is the function to time and a predicate saying which positions it makes sense to call it on
+BENCHMARKS = {
+    'legal_moves': (legal_moves, lambda gs: not gs.is_over()),
+    'apply_move': (apply_first_move, lambda gs: not gs.is_over()),
+    'controlled_spaces': (lambda gs: sc.controlled_spaces(gs, sc.get_current_player(gs)), lambda gs: True),
+    'movable_pieces': (lambda gs: sc.movable_pieces(gs, sc.get_current_player(gs)), lambda gs: True),
+    'movement.movable_pieces': (movable_pieces, lambda gs: True),
+    'effective_adjacent_space_coords': (effective_adjacent_space_coords_for_character, lambda gs: True),
+    'Player.score': (lambda gs: sc.get_current_player(gs).score(gs), lambda gs: True),
+    'finalize': (play.finalize, lambda gs: True),
+    'scoring.scores': (scoring.scores, lambda gs: True),
+    'encode': (gs_enc.encode, lambda gs: not gs.is_over()),
+    'get_move_priors': (get_move_priors, lambda gs: not gs.is_over() and can_decode(gs)),
+}
+
+
+def action_class_name(game_state):
+    return game_state.action_stack.first.__class__.__name__ if game_state.action_stack else 'GameOver'
+
+
+# Times every benchmark on every applicable position, [repeats] times each, and groups the results by the class of
+# the action on top of the stack. Returns {function: {action class: {'calls': n, 'mean_us': t}}}.
+def run(corpus, *, repeats=5, only=None):
+    results = {}
+    for name, (fn, applies) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        totals = defaultdict(float)
+        calls = defaultdict(int)
+        for game_state in corpus:
+            if not applies(game_state):
+                continue
+            key = action_class_name(game_state)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                fn(game_state)
+            totals[key] += time.perf_counter() - start
+            calls[key] += repeats
+        results[name] = {key: {'calls': calls[key], 'mean_us': totals[key] / calls[key] * 1e6}
+                         for key in sorted(totals, key=totals.get, reverse=True)}
+    return results
+
+
+def print_results(results):
+    for name, by_action in results.items():
+        total_calls = sum(r['calls'] for r in by_action.values())
+        total_us = sum(r['calls'] * r['mean_us'] for r in by_action.values())
+        print(f'\n{name}: {total_us / max(total_calls, 1):.1f}us mean over {total_calls} calls')
+        for action, r in by_action.items():
+            print(f'  {action:<40} {r["mean_us"]:>10.1f}us {r["calls"]:>8}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the hot engine functions on a corpus of recorded positions')
+    parser.add_argument('--corpus', help='Load positions from this file instead of recording new ones')
+    parser.add_argument('--save-corpus', help='Save the recorded positions to this file')
+    parser.add_argument('--random-games', type=int, default=20)
+    parser.add_argument('--mcts-games', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Only run these benchmarks')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = record_corpus(num_random_games=args.random_games, num_mcts_games=args.mcts_games, seed=args.seed)
+        if args.save_corpus:
+            save_corpus(corpus, args.save_corpus)
+    print(f'{len(corpus)} positions')
+    results = run(corpus, repeats=args.repeats, only=args.only)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import time
+
+from benchmarks.stub_evaluator import stub_evaluator
+from game.game_state import GameOptions
+from training import metrics
+from training.metrics import COUNT, Counter, NUM_LEADING, Phase
+from training.shared_memory_manager import SharedMemoryManager
+from training.simulator import Simulator
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_evaluator(metrics_name, *args):
+    metrics.enable(metrics_name)
+    stub_evaluator(*args)
+
+
+# Plays [num_games] self-play games in this process against a stub evaluator running in another, so the numbers
+# reflect the cost of the engine, the search and the shared-memory round trip, but not of the network. Both processes
+# record [metrics], which is where the results come from.
+def run(*, num_games, slots_per_worker, num_envs, simulations_per_choice, c=0.8, num_players=2, random_preds=False,
+        seed=0, macro_moves=False, bucketed_cargo=False):
+    smm = SharedMemoryManager.init(num_workers=1, slots_per_worker=slots_per_worker, envs_per_worker=num_envs)
+    worker_name, evaluator_name = f'self-play-benchmark-{os.getpid()}', f'self-play-benchmark-{os.getpid()}-evaluator'
+    ev = mp.Process(target=run_evaluator, args=(evaluator_name, num_envs, slots_per_worker, random_preds, seed),
+                    daemon=True)
+    ev.start()
+    try:
+        metrics.enable(worker_name)
+        game_options = GameOptions(macro_moves=macro_moves, bucketed_cargo=bucketed_cargo)
+        sim = Simulator.init(worker_id=0, num_players=num_players, num_workers=1, slots_per_worker=slots_per_worker,
+                             envs=smm.envs, simulations_per_choice=simulations_per_choice, c=c, num_games=num_games,
+                             seed=seed, game_options=game_options)
+        start = time.perf_counter()
+        sim.run()
+        elapsed = time.perf_counter() - start
+        worker_phases, worker_counters = metrics.read(worker_name)
+        _, evaluator_counters = metrics.read(evaluator_name)
+    finally:
+        ev.kill()
+        ev.join()
+        smm.unlink()
+        metrics.unlink(worker_name)
+        metrics.unlink(evaluator_name)
+
+    games = worker_counters[Counter.GAMES.value]
+    requests = evaluator_counters[Counter.REQUESTS.value]
+    # The time each slot spent waiting for its predictions, to within a power of two
+    wait = worker_phases[Phase.WAIT.value]
+    return {
+        'commit': git_commit(),
+        'params': {'num_games': num_games, 'slots_per_worker': slots_per_worker, 'num_envs': num_envs,
+                   'simulations_per_choice': simulations_per_choice, 'c': c, 'num_players': num_players,
+                   'random_preds': random_preds, 'seed': seed, 'macro_moves': macro_moves,
+                   'bucketed_cargo': bucketed_cargo},
+        'seconds': elapsed,
+        'games_per_hour': int(games) * 3600 / elapsed,
+        'moves_per_second': int(worker_counters[Counter.MOVES.value]) / elapsed,
+        'simulations_per_second': int(worker_counters[Counter.SIMULATIONS.value]) / elapsed,
+        'evaluator_requests_per_second': int(requests) / elapsed,
+        'evaluator_requests_per_game': int(requests) / max(int(games), 1),
+        'wait_p50_ms': metrics.percentile_ns(wait[NUM_LEADING:], 50) / 1e6 if wait[COUNT] else None,
+        'wait_p99_ms': metrics.percentile_ns(wait[NUM_LEADING:], 99) / 1e6 if wait[COUNT] else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark self-play against a stub evaluator')
+    parser.add_argument('--num-games', type=int, default=4)
+    parser.add_argument('--slots-per-worker', type=int, default=4)
+    parser.add_argument('--num-envs', type=int, default=2)
+    parser.add_argument('--simulations-per-choice', type=int, default=10)
+    parser.add_argument('--random-preds', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--macro-moves', action='store_true', help='Search over whole piece moves')
+    parser.add_argument('--bucketed-cargo', action='store_true', help='Load cargo in one choice from a few amounts')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = run(num_games=args.num_games, slots_per_worker=args.slots_per_worker, num_envs=args.num_envs,
+                  simulations_per_choice=args.simulations_per_choice, random_preds=args.random_preds, seed=args.seed,
+                  macro_moves=args.macro_moves, bucketed_cargo=args.bucketed_cargo)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
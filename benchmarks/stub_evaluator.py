@@ -0,0 +1,36 @@
+import numpy as np
+
+from training import model
+from training.constants import Head
+from training.evaluator import evaluate_forever
+from training.shared_memory_manager import SharedMemoryManager, View
+
+
+# Stands in for a Keras model so that self-play can be measured without TensorFlow or a GPU. With [random] set, every
+# head gets a fresh softmax over seeded noise; otherwise every head is uniform. Either way the same seed produces the
+# same sequence of predictions.
+class StubModel:
+    def __init__(self, random=False, seed=0):
+        self.random = random
+        self.rng = np.random.RandomState(seed)
+
+    def predict(self, inputs, batch_size):
+        boards, _ = inputs
+        n = len(boards)
+        preds = []
+        for head in Head:
+            size = model.head_sizes[head]
+            if self.random:
+                logits = self.rng.standard_normal((n, size))
+                exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+                preds.append(exp / exp.sum(axis=1, keepdims=True))
+            else:
+                preds.append(np.full((n, size), 1 / size))
+        return preds
+
+
+def stub_evaluator(num_envs, num_slots, random=False, seed=0):
+    views = [View.for_evaluator(env=SharedMemoryManager.make_env(env_id), num_slots=num_slots)
+             for env_id in range(num_envs)]
+    nn = StubModel(random, seed)
+    evaluate_forever(views, lambda: (0, nn), num_slots)
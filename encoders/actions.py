@@ -46,10 +46,14 @@ action_constants = {
     TradeIfPaid: 42,
     MoveCubeToBottom: 43,
     Move: 44,
-    LoadAndMovePiece: 45
+    LoadAndMovePiece: 45,
+    # The same decision as [MoveOnePiece] as far as the model is concerned
+    MacroMoveOnePiece: 28,
+    # Likewise for [LoadResources]
+    LoadCargo: 24
 }
 
-choices_that_need_context = {Boolean, Optional, BottomAction, LoadResources, LoadWorkers, MaybePayCost,
+choices_that_need_context = {Boolean, Optional, BottomAction, LoadResources, LoadWorkers, LoadCargo, MaybePayCost,
                              MovePieceOneSpace, GetAttackerCombatCards, GetDefenderCombatCards}
 
-num_encodable_actions = len(action_constants)
+num_encodable_actions = max(action_constants.values()) + 1
@@ -1,6 +1,6 @@
 from game import constants
 from game.actions import Boolean, BottomAction, GetAttackerCombatCards, GetDefenderCombatCards, LoadResources
-from game.actions import LoadWorkers,  MaybePayCost, MovePieceOneSpace, Optional
+from game.actions import LoadCargo, LoadWorkers,  MaybePayCost, MovePieceOneSpace, Optional
 from game.types import Benefit, BottomActionType, FactionName, ResourceType, StarType, StructureType, TopActionType
 import game.state_change as sc
 import encoders.actions as encode_actions
@@ -349,6 +349,8 @@ def encode_context(game_state, actions_encoding, space_encoding, power_encoding)
         encode_piece_coords(space_encoding, game_state, top_action.piece_key)
     elif isinstance(top_action, LoadWorkers):
         encode_piece_coords(space_encoding, game_state, top_action.mech_key)
+    elif isinstance(top_action, LoadCargo):
+        encode_piece_coords(space_encoding, game_state, top_action.piece_key)
     elif isinstance(top_action, MovePieceOneSpace):
         encode_piece_coords(space_encoding, game_state, top_action.piece_key)
     elif isinstance(top_action, GetAttackerCombatCards):
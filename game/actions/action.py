@@ -5,14 +5,46 @@ import game.state_change as sc
 
 from abc import ABC, abstractmethod
 import attr
+import functools
 import logging
 
 from pyrsistent import pmap
 
 
-@attr.s(frozen=True, slots=True)
+# Actions are immutable, so every call to a [new] wrapped in this with the same arguments can share one instance. That
+# saves building the action and formatting its name each time it's pushed; the name is only formatted the first time.
+# The arguments must be hashable, and there can only be so many different ones, since the instances are kept for as
+# long as the process runs. Interned instances unpickle by calling [new] again with the same arguments, so they're
+# still shared in the process they end up in.
+def interned(new):
+    instances = {}
+
+    @functools.wraps(new)
+    def wrapper(cls, *args, **kwargs):
+        key = (cls, args, tuple(kwargs.items())) if kwargs else (cls, args)
+        ret = instances.get(key)
+        if ret is None:
+            ret = instances[key] = new(cls, *args, **kwargs)
+            _new_args_by_id[id(ret)] = (cls, args, kwargs)
+        return ret
+
+    return wrapper
+
+
+# id of an interned instance -> the arguments to [new] that made it. Interned instances are never freed, so their ids
+# are never reused.
+_new_args_by_id = {}
+
+
+def _new(cls, args, kwargs):
+    return cls.new(*args, **kwargs)
+
+
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Action(ABC):
     name = attr.ib()
+    # Whether this is a step of moving one of the current player's pieces (see [game.movement.carry_over])
+    steps_piece = False
 
     def __str__(self):
         return self.name
@@ -20,27 +52,33 @@ class Action(ABC):
     def __repr__(self):
         return self.name
 
+    def __reduce_ex__(self, protocol):
+        new_args = _new_args_by_id.get(id(self))
+        if new_args is None:
+            return super().__reduce_ex__(protocol)
+        return _new, new_args
 
-@attr.s(frozen=True, slots=True)
+
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class StateChange(Action, ABC):
     @abstractmethod
     def do(self, game_state):
         pass
 
     def apply(self, game_state):
-        if self.name:
+        if self.name and logging.getLogger().isEnabledFor(logging.DEBUG):
             logging.debug(self.name)
         return self.do(game_state)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Choice(Action, ABC):
     @abstractmethod
     def do(self, game_state, chosen):
         pass
 
     def apply(self, game_state, chosen):
-        if self.name:
+        if self.name and logging.getLogger().isEnabledFor(logging.DEBUG):
             logging.debug(self.name)
         return self.do(game_state, chosen)
 
@@ -49,12 +87,13 @@ class Choice(Action, ABC):
         pass
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Boolean(Choice):
     action1 = attr.ib()
     action2 = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, action1, action2):
         return cls(f'Choosing between {action1.name} and {action2.name}', action1, action2)
 
@@ -67,14 +106,19 @@ class Boolean(Choice):
         return [False, True]
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Optional(Choice):
     action = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, action):
         return cls(f'Optional: {action.name}', action)
 
+    @property
+    def steps_piece(self):
+        return self.action.steps_piece
+
     def do(self, game_state, chosen):
         if chosen:
             logging.debug('Lets do it!')
@@ -88,9 +132,10 @@ class Optional(Choice):
         return [False, True]
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class EndGame(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('End game')
 
@@ -98,7 +143,7 @@ class EndGame(StateChange):
         raise GameOver(game_state)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class MaybePayCost(Choice, ABC):
     if_paid = attr.ib()
 
@@ -130,12 +175,13 @@ class MaybePayCost(Choice, ABC):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class SpendAResource(Choice):
     player_id = attr.ib()
     resource_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, player_id, resource_typ):
         return cls(f'Choose {resource_typ} to spend', player_id, resource_typ)
 
@@ -155,11 +201,12 @@ class SpendAResource(Choice):
         return attr.evolve(game_state, board=board)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class CrimeaMaybeChooseResource(Choice):
     cost = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, cost):
         return cls('Crimea can choose to substitute a combat card for a resource', cost)
 
@@ -177,7 +224,7 @@ class CrimeaMaybeChooseResource(Choice):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Cost:
     power = attr.ib()
     popularity = attr.ib()
@@ -186,6 +233,7 @@ class Cost:
     resource_cost = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, power=0, popularity=0, coins=0, oil=0, metal=0, wood=0, food=0, combat_cards=0):
         return cls(power, popularity, combat_cards, coins,
                    pmap({ResourceType.METAL: metal, ResourceType.OIL: oil, ResourceType.WOOD: wood,
@@ -226,12 +274,13 @@ class Cost:
             and not self.popularity and not self.coins
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GiveEnlistBenefitsToNeighbors(StateChange):
     bottom_action_typ = attr.ib()
     enlist_benefit = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, bottom_action_typ, enlist_benefit):
         return cls(f'Give enlist benefits ({enlist_benefit}) to neighbors', bottom_action_typ, enlist_benefit)
 
@@ -247,7 +296,7 @@ class GiveEnlistBenefitsToNeighbors(StateChange):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class BottomActionIfPaid(StateChange):
     bottom_action_typ = attr.ib()
     coins_payoff = attr.ib()
@@ -256,6 +305,7 @@ class BottomActionIfPaid(StateChange):
     enlisted = attr.ib(default=False)
 
     @classmethod
+    @interned
     def new(cls, bottom_action_typ, coins_payoff, enlist_benefit, action_benefit):
         return cls(f'Attempting bottom action: {bottom_action_typ}', bottom_action_typ, coins_payoff, enlist_benefit,
                    action_benefit)
@@ -280,7 +330,7 @@ class BottomActionIfPaid(StateChange):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class BottomAction(MaybePayCost):
     current_cost = attr.ib()  # max cost
     mincost = attr.ib()
@@ -288,6 +338,7 @@ class BottomAction(MaybePayCost):
     bottom_action_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, bottom_action_typ, resource_typ, maxcost, mincost, coins_payoff, enlist_benefit,
             action_benefit):
         if_paid = BottomActionIfPaid.new(bottom_action_typ, coins_payoff, enlist_benefit, action_benefit)
@@ -304,12 +355,13 @@ class BottomAction(MaybePayCost):
         return attr.evolve(self, current_cost=self.current_cost - 1)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ReceiveBenefit(StateChange):
     typ = attr.ib()
     amt = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, typ, amt):
         return cls(f'Current player gets {amt} {typ}', typ, amt)
 
@@ -321,7 +373,7 @@ class ReceiveBenefit(StateChange):
         return Optional.new(ReceiveBenefit.new(typ, amt))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ReceiveResources(StateChange):
     typ = attr.ib()
     amt = attr.ib()
@@ -329,6 +381,7 @@ class ReceiveResources(StateChange):
     is_produce = attr.ib(default=False)
 
     @classmethod
+    @interned
     def new(cls, typ, amt, coords):
         return cls(f'Receive {amt} {typ} on space {coords}', typ, amt, coords)
 
@@ -340,12 +393,13 @@ class ReceiveResources(StateChange):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ReceiveWorkers(StateChange):
     amt = attr.ib()
     coords = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, amt, coords):
         return cls(f'Receive {amt} workers on space {coords}', amt, coords)
 
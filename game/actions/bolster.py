@@ -1,13 +1,14 @@
 import game.state_change as sc
-from game.actions import Boolean, Cost, MaybePayCost, ReceiveBenefit, StateChange
+from game.actions import Boolean, Cost, MaybePayCost, ReceiveBenefit, StateChange, interned
 from game.types import Benefit, TopActionType
 
 import attr
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GainPower(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Gain power')
 
@@ -20,9 +21,10 @@ class GainPower(StateChange):
         return sc.give_reward_to_player(game_state, current_player, Benefit.POWER, power)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GainCombatCards(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Gain combat cards')
 
@@ -35,11 +37,12 @@ class GainCombatCards(StateChange):
         return sc.give_reward_to_player(game_state, sc.get_current_player(game_state), Benefit.COMBAT_CARDS, cards)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class BolsterIfPaid(StateChange):
     _power_vs_cards = Boolean.new(GainPower.new(), GainCombatCards.new())
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Bolster')
 
@@ -50,11 +53,12 @@ class BolsterIfPaid(StateChange):
         return sc.push_action(game_state, BolsterIfPaid._power_vs_cards)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Bolster(MaybePayCost):
     _if_paid = BolsterIfPaid.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Bolster', Bolster._if_paid)
 
@@ -1,4 +1,4 @@
-from game.actions import BottomAction, Choice
+from game.actions import BottomAction, Choice, interned
 import game.state_change as sc
 from game.types import Benefit, BottomActionType, ResourceType, StructureType, TerrainType
 
@@ -6,11 +6,12 @@ import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseSpaceToBuildOn(Choice):
     structure_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, structure_typ):
         return cls('Choose space to build on', structure_typ)
 
@@ -25,9 +26,10 @@ class ChooseSpaceToBuildOn(Choice):
                                   self.structure_typ)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseStructureToBuild(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Choose structure to build')
 
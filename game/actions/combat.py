@@ -1,5 +1,5 @@
 import game.state_change as sc
-from game.actions import Choice, StateChange
+from game.actions import Choice, StateChange, interned
 from game.constants import MAX_COMBAT_POWER
 from game.types import FactionName, StarType
 
@@ -7,7 +7,7 @@ import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ResolveCombat(StateChange):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
@@ -16,6 +16,7 @@ class ResolveCombat(StateChange):
     defender_total_power = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name, attacker_total_power,
             defender_total_power):
         return cls('Resolve combat', board_coords, attacking_faction_name, defending_faction_name, attacker_total_power,
@@ -40,7 +41,7 @@ class ResolveCombat(StateChange):
         return sc.achieve(game_state, winning_player, StarType.COMBAT)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GetDefenderCombatCards(Choice):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
@@ -50,6 +51,7 @@ class GetDefenderCombatCards(Choice):
     num_combat_cards = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name, attacker_total_power,
             defender_total_power, num_combat_cards):
         return cls('Defender commits combat cards', board_coords, attacking_faction_name, defending_faction_name,
@@ -61,22 +63,26 @@ class GetDefenderCombatCards(Choice):
         return available_combat_cards
 
     def do(self, game_state, card):
+        defender_total_power = self.defender_total_power
         if card:
-            self = attr.evolve(self, defender_total_power=(self.defender_total_power + card))
+            defender_total_power += card
             defending_player = sc.get_player_by_faction_name(game_state, self.defending_faction_name)
             game_state = sc.discard_combat_card(game_state, defending_player, card)
-        self = attr.evolve(self, num_combat_cards=(self.num_combat_cards - 1))
-        if self.num_combat_cards:
-            return sc.push_action(game_state, self)
+        num_combat_cards = self.num_combat_cards - 1
+        if num_combat_cards:
+            return sc.push_action(game_state,
+                                  GetDefenderCombatCards.new(self.board_coords, self.attacking_faction_name,
+                                                             self.defending_faction_name, self.attacker_total_power,
+                                                             defender_total_power, num_combat_cards))
         else:
             return sc.push_action(game_state,
                                   ResolveCombat.new(self.board_coords, self.attacking_faction_name,
                                                     self.defending_faction_name,
                                                     attacker_total_power=self.attacker_total_power,
-                                                    defender_total_power=self.defender_total_power))
+                                                    defender_total_power=defender_total_power))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GetDefenderWheelPower(Choice):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
@@ -84,6 +90,7 @@ class GetDefenderWheelPower(Choice):
     attacker_total_power = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name, attacker_total_power):
         return cls('Defender commits wheel power', board_coords, attacking_faction_name, defending_faction_name,
                    attacker_total_power)
@@ -114,7 +121,7 @@ class GetDefenderWheelPower(Choice):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GetAttackerCombatCards(Choice):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
@@ -123,6 +130,7 @@ class GetAttackerCombatCards(Choice):
     num_combat_cards = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name, attacker_total_power,
             num_combat_cards):
         return cls('Attacker commits combat cards', board_coords, attacking_faction_name, defending_faction_name,
@@ -134,31 +142,36 @@ class GetAttackerCombatCards(Choice):
         return available
 
     def do(self, game_state, card):
+        attacker_total_power = self.attacker_total_power
         if card:
-            self = attr.evolve(self, attacker_total_power=(self.attacker_total_power + card))
+            attacker_total_power += card
             attacking_player = sc.get_player_by_faction_name(game_state, self.attacking_faction_name)
             game_state = sc.discard_combat_card(game_state, attacking_player, card)
-            self = attr.evolve(self, num_combat_cards=self.num_combat_cards - 1)
+            num_combat_cards = self.num_combat_cards - 1
         else:
-            self = attr.evolve(self, num_combat_cards=0)
+            num_combat_cards = 0
 
-        if self.num_combat_cards:
-            return sc.push_action(game_state, self)
+        if num_combat_cards:
+            return sc.push_action(game_state,
+                                  GetAttackerCombatCards.new(self.board_coords, self.attacking_faction_name,
+                                                             self.defending_faction_name, attacker_total_power,
+                                                             num_combat_cards))
         else:
             game_state = sc.change_turn(game_state, self.defending_faction_name)
             return sc.push_action(game_state,
                                   GetDefenderWheelPower.new(self.board_coords, self.attacking_faction_name,
                                                             self.defending_faction_name,
-                                                            attacker_total_power=self.attacker_total_power))
+                                                            attacker_total_power=attacker_total_power))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GetAttackerWheelPower(Choice):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
     defending_faction_name = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name):
         return cls('Attacker commits wheel power', board_coords, attacking_faction_name, defending_faction_name)
 
@@ -187,13 +200,14 @@ class GetAttackerWheelPower(Choice):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class NordicMaybeUseCombatPower(Choice):
     nordic_faction_name = attr.ib()
     not_nordic_faction_name = attr.ib()
     attacking_faction_name = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, nordic_faction_name, not_nordic_faction_name, attacking_faction_name):
         return cls('Nordic decides whether to use its combat power', attacking_faction_name, nordic_faction_name,
                    not_nordic_faction_name)
@@ -212,13 +226,14 @@ class NordicMaybeUseCombatPower(Choice):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Combat(StateChange):
     board_coords = attr.ib()
     attacking_faction_name = attr.ib()
     defending_faction_name = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, board_coords, attacking_faction_name, defending_faction_name):
         return cls(f'Combat between {attacking_faction_name} and {defending_faction_name}', board_coords,
                    attacking_faction_name, defending_faction_name)
@@ -236,7 +251,8 @@ class Combat(StateChange):
         if self.attacking_faction_name is FactionName.CRIMEA or self.defending_faction_name is FactionName.CRIMEA:
             crimea, not_crimea = (attacking_player, defending_player) \
                 if self.attacking_faction_name is FactionName.CRIMEA else (defending_player, attacking_player)
-            not_crimea, card = not_crimea.remove_random_combat_card()
+            game_state, rng = game_state.rng()
+            not_crimea, card = not_crimea.remove_random_combat_card(rng)
             if card:
                 game_state = sc.add_combat_cards(game_state, crimea, [card])
                 game_state = sc.set_player(game_state, crimea)
@@ -258,9 +274,10 @@ class Combat(StateChange):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class MaybeCombat(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Check for combat')
 
@@ -270,10 +287,15 @@ class MaybeCombat(StateChange):
     # - have each player choose an amount of power from 0 to min(7, power)
     #   as well as an optional combat card for each of their plastic pieces
     # - send the loser home and give the winner a star.
-    # TODO: we can cut this down to check only the spaces that were moved into this turn
+    # Only the spaces that were moved into this turn need checking.
     def do(self, game_state):
-        for board_coords in game_state.board.base_adjacencies.keys():
-            space = game_state.board.get_space(board_coords)
+        board = game_state.board
+        spaces_entered = game_state.spaces_entered_this_turn
+        if len(spaces_entered) > 1:
+            # Keep to the board's order so that multiple combats are resolved in the same order as always
+            spaces_entered = [board_coords for board_coords in board.base_adjacencies if board_coords in spaces_entered]
+        for board_coords in spaces_entered:
+            space = board.get_space(board_coords)
             combat_factions = space.combat_factions()
             if combat_factions:
                 faction1, faction2 = combat_factions
@@ -1,15 +1,16 @@
 import game.state_change as sc
-from game.actions import BottomAction, Choice
+from game.actions import BottomAction, Choice, interned
 from game.types import Benefit, BottomActionType, ResourceType
 
 import attr
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseDeploySpace(Choice):
     mech_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, mech_typ):
         return cls('Choose space to deploy mech to', mech_typ)
 
@@ -20,9 +21,10 @@ class ChooseDeploySpace(Choice):
         return sc.deploy_mech(game_state, sc.get_current_player(game_state), self.mech_typ, board_coords)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class DeployMech(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Choose mech type to deploy')
 
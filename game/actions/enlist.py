@@ -1,16 +1,17 @@
 import game.state_change as sc
-from game.actions import BottomAction, Choice
+from game.actions import BottomAction, Choice, interned
 from game.types import Benefit, BottomActionType, ResourceType
 
 import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseEnlistReward(Choice):
     bottom_action_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, bottom_action_typ):
         return cls('Choose enlist reward', bottom_action_typ)
 
@@ -29,9 +30,10 @@ class ChooseEnlistReward(Choice):
         return sc.give_reward_to_player(game_state, current_player, enlist_reward, 2)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseRecruitToEnlist(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Choose recruit to enlist')
 
@@ -1,43 +1,52 @@
 import game.constants as constants
+import game.movement as movement
 import game.state_change as sc
-from game.actions import Boolean, Choice, MaybeCombat, Optional, StateChange
+from game.actions import Boolean, Choice, MaybeCombat, Optional, StateChange, interned
 from game.types import Benefit, ResourceType, TopActionType
 
 import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class LoadResources(Choice):
+    steps_piece = True
     piece_key = attr.ib()
     resource_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, piece_key, resource_typ):
         return cls(f'Maybe load some {resource_typ} onto {piece_key}', piece_key, resource_typ)
 
     def choices(self, game_state):
         piece = game_state.pieces_by_key[self.piece_key]
-        # TODO: replace magic constant
-        amt = min(game_state.board.get_space(piece.board_coords).amount_of(self.resource_typ), 19)
+        amt = min(game_state.board.get_space(piece.board_coords).amount_of(self.resource_typ),
+                  constants.MAX_RESOURCES_LOADED)
         return list(range(amt+1))
 
     def do(self, game_state, amt):
-        if amt:
-            piece = game_state.pieces_by_key[self.piece_key]
-            carrying_resources = piece.carrying_resources
-            resource_amt = carrying_resources[self.resource_typ] + amt
-            carrying_resources = carrying_resources.set(self.resource_typ, resource_amt)
-            piece = attr.evolve(piece, carrying_resources=carrying_resources)
-            game_state = sc.set_piece(game_state, piece)
-        return game_state
+        return load_resources(game_state, self.piece_key, self.resource_typ, amt)
+
 
+def load_resources(game_state, piece_key, resource_typ, amt):
+    if amt:
+        piece = game_state.pieces_by_key[piece_key]
+        carrying_resources = piece.carrying_resources
+        resource_amt = carrying_resources[resource_typ] + amt
+        carrying_resources = carrying_resources.set(resource_typ, resource_amt)
+        piece = attr.evolve(piece, carrying_resources=carrying_resources)
+        game_state = sc.set_piece(game_state, piece)
+    return game_state
 
-@attr.s(frozen=True, slots=True)
+
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class LoadWorkers(Choice):
+    steps_piece = True
     mech_key = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, mech_key):
         return cls(f'Load workers onto {mech_key}', mech_key)
 
@@ -48,26 +57,66 @@ class LoadWorkers(Choice):
         return list(range(len(space.worker_keys)+1))
 
     def do(self, game_state, amt):
-        if not amt:
-            if logging.getLogger().isEnabledFor(logging.DEBUG):
-                logging.debug(f'Chose not to load any workers')
-            return game_state
-        added = 0
-        mech = game_state.pieces_by_key[self.mech_key]
-        board_space = game_state.board.get_space(mech.board_coords)
+        return load_workers(game_state, self.mech_key, amt)
+
+
+def load_workers(game_state, mech_key, amt):
+    if not amt:
         if logging.getLogger().isEnabledFor(logging.DEBUG):
-            logging.debug(f'Load {amt} workers from {board_space}')
-        for worker_key in board_space.worker_keys:
-            mech = attr.evolve(mech, carrying_worker_keys=mech.carrying_worker_keys.add(worker_key))
-            added += 1
-            if added == amt:
-                return sc.set_piece(game_state, mech)
-        assert False
+            logging.debug(f'Chose not to load any workers')
+        return game_state
+    added = 0
+    mech = game_state.pieces_by_key[mech_key]
+    board_space = game_state.board.get_space(mech.board_coords)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f'Load {amt} workers from {board_space}')
+    for worker_key in board_space.worker_keys:
+        mech = attr.evolve(mech, carrying_worker_keys=mech.carrying_worker_keys.add(worker_key))
+        added += 1
+        if added == amt:
+            return sc.set_piece(game_state, mech)
+    assert False
+
+
+# Everything a piece picks up before a step, chosen all at once from a few sensible amounts rather than one amount at
+# a time from every possible one. Used instead of [LoadResources] and [LoadWorkers] in games with
+# [GameOptions.bucketed_cargo]. Each choice is the amount of each resource type, in [ResourceType] order, followed by
+# the number of workers. The amounts of each resource are none, all of it, or what the player's bottom action for that
+# resource costs; a mech takes either none of the workers or all of them.
+@attr.s(frozen=True, slots=True, cache_hash=True)
+class LoadCargo(Choice):
+    steps_piece = True
+    piece_key = attr.ib()
+
+    @classmethod
+    @interned
+    def new(cls, piece_key):
+        return cls(f'Maybe load cargo onto {piece_key}', piece_key)
+
+    def choices(self, game_state):
+        piece = game_state.pieces_by_key[self.piece_key]
+        space = game_state.board.get_space(piece.board_coords)
+        costs = {}
+        for _, bottom_action in sc.get_current_player(game_state).player_mat.action_spaces:
+            costs[bottom_action.resource_typ] = bottom_action.current_cost
+        ret = [()]
+        for resource_typ in ResourceType:
+            amt = min(space.amount_of(resource_typ), constants.MAX_RESOURCES_LOADED)
+            amts = sorted({0, min(costs.get(resource_typ, 0), amt), amt})
+            ret = [cargo + (a,) for cargo in ret for a in amts]
+        num_workers = len(space.worker_keys) if piece.is_mech() else 0
+        return [cargo + (n,) for cargo in ret for n in sorted({0, num_workers})]
 
+    def do(self, game_state, cargo):
+        for resource_typ, amt in zip(ResourceType, cargo):
+            game_state = load_resources(game_state, self.piece_key, resource_typ, amt)
+        return load_workers(game_state, self.piece_key, cargo[-1])
 
-@attr.s(frozen=True, slots=True)
+
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Gain(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Gain coins')
 
@@ -80,12 +129,13 @@ class Gain(StateChange):
         return sc.give_reward_to_player(game_state, current_player, Benefit.COINS, coins_to_gain)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class MovePieceToSpaceAndDropCarryables(StateChange):
     piece_key = attr.ib()
     board_coords = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, piece_key, board_coords):
         return cls(f'Moving {piece_key} to {board_coords}', piece_key, board_coords)
 
@@ -144,19 +194,22 @@ class MovePieceToSpaceAndDropCarryables(StateChange):
         piece = attr.evolve(piece, moved_this_turn=True)
         piece = piece.drop_everything()
         game_state = sc.set_piece(game_state, piece)
+        # This also marks the space as entered this turn, so that [MaybeCombat] checks it
         return sc.move_piece(game_state, piece.key(), self.board_coords)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class MovePieceOneSpace(Choice):
+    steps_piece = True
     piece_key = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, piece_key):
         return cls(f'Move {piece_key} one space', piece_key)
 
     def choices(self, game_state):
-        ret = sc.effective_adjacent_space_coords(game_state, self.piece_key)
+        ret = movement.effective_adjacent_space_coords(game_state, self.piece_key)
         assert game_state.pieces_by_key[self.piece_key].board_coords not in ret
         return ret
 
@@ -166,11 +219,13 @@ class MovePieceOneSpace(Choice):
         return sc.push_action(game_state, MovePieceToSpaceAndDropCarryables.new(self.piece_key, board_coords))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class LoadAndMovePiece(StateChange):
+    steps_piece = True
     piece_key = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, piece_key):
         return cls(f'Load and move piece: {piece_key}', piece_key)
 
@@ -185,6 +240,10 @@ class LoadAndMovePiece(StateChange):
         assert piece.not_carrying_anything()
         assert not piece.moved_into_enemy_territory_this_turn
         game_state = sc.push_action(game_state, MovePieceOneSpace.new(self.piece_key))
+        if game_state.options.bucketed_cargo:
+            if any(cur_space.amount_of(r) for r in ResourceType) or (piece.is_mech() and cur_space.worker_keys):
+                game_state = sc.push_action(game_state, LoadCargo.new(self.piece_key))
+            return game_state
         for r in ResourceType:
             if cur_space.amount_of(r):
                 game_state = sc.push_action(game_state, LoadResources.new(self.piece_key, r))
@@ -202,9 +261,12 @@ class LoadAndMovePiece(StateChange):
 # 2c. Drop all your stuff
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class MoveOnePiece(Choice):
+    steps_piece = True
+
     @classmethod
+    @interned
     def new(cls):
         return cls('Move one piece')
 
@@ -213,14 +275,7 @@ class MoveOnePiece(Choice):
         # enemy territory this turn. That would get around the [moved_this_turn] check, so we explicitly
         # check to see that we're not starting in enemy territory. There would be no legal way for a mech
         # or character to start in enemy territory anyway.
-        current_player = sc.get_current_player(game_state)
-        ret = [board_coords_and_piece_typ
-               for board_coords_and_piece_typ in sc.movable_pieces(game_state, current_player)
-               if sc.controller(game_state, game_state.board.get_space(board_coords_and_piece_typ[0]))
-               is current_player.faction_name()]
-        if not ret:
-            return None
-        return ret
+        return movement.movable_pieces(game_state) or None
 
     def do(self, game_state, board_coords_and_piece_typ):
         if not board_coords_and_piece_typ:
@@ -234,12 +289,40 @@ class MoveOnePiece(Choice):
         return sc.push_action(game_state, LoadAndMovePiece.new(piece_key))
 
 
+# [MoveOnePiece] along with everything that's chosen while moving the piece, as one choice (see
+# [game.movement.macro_moves]). Used instead of [MoveOnePiece] in games with [GameOptions.macro_moves], so that a
+# search spends one decision on moving a piece rather than one on every step and every load.
+@attr.s(frozen=True, slots=True, cache_hash=True)
+class MacroMoveOnePiece(Choice):
+    steps_piece = True
+    _move_one_piece = MoveOnePiece.new()
+
+    @classmethod
+    @interned
+    def new(cls):
+        return cls('Move one piece all the way')
+
+    def choices(self, game_state):
+        return movement.macro_moves(game_state, MacroMoveOnePiece._move_one_piece)
+
+    def do(self, game_state, macro_move):
+        if not macro_move:
+            logging.debug('No movable pieces')
+            return game_state
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f'Chosen: {macro_move}')
+        return movement.play_macro_move(game_state, MacroMoveOnePiece._move_one_piece, macro_move)
+
+
 class Move(StateChange):
     _maybe_combat = MaybeCombat.new()
     _move_one_piece = MoveOnePiece.new()
     _optional_move = Optional.new(_move_one_piece)
+    _macro_move_one_piece = MacroMoveOnePiece.new()
+    _optional_macro_move = Optional.new(_macro_move_one_piece)
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Move')
 
@@ -248,10 +331,14 @@ class Move(StateChange):
         player_mat = sc.get_current_player(game_state).player_mat
         top_action_cubes_and_structure = \
             player_mat.top_action_cubes_and_structures_by_top_action_typ[TopActionType.MOVEGAIN]
+        if game_state.options.macro_moves:
+            move_one_piece, optional_move = Move._macro_move_one_piece, Move._optional_macro_move
+        else:
+            move_one_piece, optional_move = Move._move_one_piece, Move._optional_move
         if top_action_cubes_and_structure.cubes_upgraded[0]:
-            game_state = sc.push_action(game_state, Move._optional_move)
-        game_state = sc.push_action(game_state, Move._optional_move)
-        return sc.push_action(game_state, Move._move_one_piece)
+            game_state = sc.push_action(game_state, optional_move)
+        game_state = sc.push_action(game_state, optional_move)
+        return sc.push_action(game_state, move_one_piece)
 
 
 _move = Move.new()
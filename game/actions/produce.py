@@ -1,17 +1,18 @@
 import game.state_change as sc
-from game.actions import Choice, Cost, MaybePayCost, Optional, ReceiveWorkers, StateChange
+from game.actions import Choice, Cost, MaybePayCost, Optional, ReceiveWorkers, StateChange, interned
 from game.types import StructureType, TerrainType, TopActionType
 
 import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseNumWorkers(Choice):
     coords = attr.ib()
     max_workers = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, space, max_workers):
         return cls('Choose number of workers to receive', space, max_workers)
 
@@ -51,9 +52,10 @@ def produce_on_space(coords, game_state):
             return attr.evolve(game_state, board=game_state.board.set_space(space))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class OnOneHex(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Produce on a single hex')
 
@@ -73,9 +75,10 @@ class OnOneHex(Choice):
             return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class OnMillHex(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Produce on mill hex')
 
@@ -86,13 +89,14 @@ class OnMillHex(StateChange):
             return produce_on_space(space.coords, game_state)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ProduceIfPaid(StateChange):
     _on_one_hex = OnOneHex.new()
     _on_one_hex_opt = Optional.new(_on_one_hex)
     _on_mill_hex = OnMillHex.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Produce')
 
@@ -121,11 +125,12 @@ class ProduceIfPaid(StateChange):
         return game_state
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Produce(MaybePayCost):
     _if_paid = ProduceIfPaid.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Produce', Produce._if_paid)
 
@@ -1,15 +1,16 @@
 import game.state_change as sc
-from game.actions import Boolean, Choice, Cost, MaybePayCost, ReceiveBenefit, StateChange
+from game.actions import Boolean, Choice, Cost, MaybePayCost, ReceiveBenefit, StateChange, interned
 from game.types import Benefit, ResourceType, TopActionType
 
 import attr
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseBoardSpaceForResource(Choice):
     resource_typ = attr.ib()
 
     @classmethod
+    @interned
     def new(cls, chosen):
         return cls(f'Choose board space to receive {chosen}', chosen)
 
@@ -22,11 +23,12 @@ class ChooseBoardSpaceForResource(Choice):
         return attr.evolve(game_state, board=game_state.board.set_space(space))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class ChooseResourceType(Choice):
     __all_resource_types = [x for x in ResourceType]
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Choose resource type')
 
@@ -37,11 +39,12 @@ class ChooseResourceType(Choice):
         return sc.push_action(game_state, ChooseBoardSpaceForResource.new(chosen))
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GainResources(StateChange):
     _choose_resource_typ = ChooseResourceType.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Gain resources for trade action')
 
@@ -50,9 +53,10 @@ class GainResources(StateChange):
         return sc.push_action(game_state, GainResources._choose_resource_typ)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class GainPopularity(StateChange):
     @classmethod
+    @interned
     def new(cls):
         return cls('Gain popularity for Trade action')
 
@@ -65,12 +69,13 @@ class GainPopularity(StateChange):
         return sc.give_reward_to_player(game_state, current_player, Benefit.POPULARITY, popularity)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class TradeIfPaid(StateChange):
     gain_popularity = GainPopularity.new()
     resources_vs_popularity = Boolean.new(GainResources.new(), gain_popularity)
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Attempting Trade action')
 
@@ -83,11 +88,12 @@ class TradeIfPaid(StateChange):
             return sc.push_action(game_state, TradeIfPaid.gain_popularity)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class Trade(MaybePayCost):
     _if_paid = TradeIfPaid.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Trade', Trade._if_paid)
 
@@ -1,14 +1,15 @@
 import game.state_change as sc
-from game.actions import BottomAction, Choice, StateChange
+from game.actions import BottomAction, Choice, StateChange, interned
 from game.types import Benefit, BottomActionType, ResourceType
 
 import attr
 import logging
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class RemoveCubeFromAnyTopSpace(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Remove cube from top space')
 
@@ -22,9 +23,10 @@ class RemoveCubeFromAnyTopSpace(Choice):
         return sc.remove_upgrade_cube(game_state, sc.get_current_player(game_state), top_action_typ, pos)
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class PlaceCubeInAnyBottomSpace(Choice):
     @classmethod
+    @interned
     def new(cls):
         return cls('Place cube in bottom space')
 
@@ -42,6 +44,7 @@ class MoveCubeToBottom(StateChange):
     _remove_cube_from_any_top_space = RemoveCubeFromAnyTopSpace.new()
 
     @classmethod
+    @interned
     def new(cls):
         return cls('Move cube from top space to bottom space')
 
@@ -24,7 +24,7 @@ def blocked_by_river(from_coords, to_coords):
     by rivers) and tunnels. Adjacency structure should be owned by the player, not the board. '''
 
 
-@attr.s(slots=True, frozen=True)
+@attr.s(slots=True, frozen=True, hash=False)
 class BoardSpace:
     coords = attr.ib()
     terrain_typ = attr.ib()
@@ -38,6 +38,12 @@ class BoardSpace:
     encounter_used = attr.ib(default=False)
     produced_this_turn = attr.ib(default=False)
 
+    # Equal spaces are always on the same coordinates. Hashing only those is quicker than hashing every field, and
+    # doesn't depend on the hash of None, which changes from one process to the next and would change the order of
+    # every set of spaces with it.
+    def __hash__(self):
+        return hash(self.coords)
+
     def __str__(self):
         if self.coords:
             return f'{self.terrain_typ} : {self.coords}'
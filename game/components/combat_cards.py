@@ -1,31 +1,31 @@
 import attr
-import numpy as np
 
 from pyrsistent import pvector, thaw
 
 
-def build_deck():
+def build_deck(rng):
     deck = [2] * 16 + [3] * 12 + [4] * 8 + [5] * 6
-    np.random.shuffle(deck)
+    rng.shuffle(deck)
     return pvector(deck)
 
 
 # TODO: discard pile can be a map rather than a list
 @attr.s(frozen=True, slots=True)
 class CombatCards:
-    deck = attr.ib(factory=build_deck)
+    deck = attr.ib()
     discard_pile = attr.ib(factory=pvector)
 
     def discard(self, card):
         return attr.evolve(self, discard_pile=self.discard_pile.append(card))
 
-    def reshuffle(self):
+    def reshuffle(self, rng):
         assert not self.deck
         deck = thaw(self.discard_pile)
-        np.random.shuffle(deck)
+        rng.shuffle(deck)
         return CombatCards(pvector(deck), pvector())
 
-    def draw(self, amt):
+    # [rng] is only needed if the deck runs out and the discard pile has to be reshuffled
+    def draw(self, amt, rng=None):
         if amt > len(self.deck):
             to_draw = len(self.deck)
         else:
@@ -36,7 +36,7 @@ class CombatCards:
         if not remaining or not self.discard_pile:
             return attr.evolve(self, deck=new_deck), drawn
 
-        cc = attr.evolve(self, deck=pvector()).reshuffle()
+        cc = attr.evolve(self, deck=pvector()).reshuffle(rng)
         rest = min(remaining, len(cc.deck))
 
         drawn = thaw(drawn)
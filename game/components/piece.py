@@ -6,7 +6,7 @@ from pyrsistent import pmap, pset
 _no_resources = pmap({r: 0 for r in ResourceType})
 
 
-@attr.s(frozen=True, slots=True)
+@attr.s(frozen=True, slots=True, cache_hash=True)
 class PieceKey:
     piece_typ = attr.ib()
     faction_name = attr.ib()
@@ -15,6 +15,10 @@ class PieceKey:
     def __str__(self):
         return f'{self.faction_name} {self.piece_typ} {self.id}'
 
+    # Unpickles to the interned key (see [piece_key]) rather than to a copy of it
+    def __reduce__(self):
+        return piece_key, (self.piece_typ, self.faction_name, self.id)
+
 
 # TODO: dedup attributes between these two classes
 @attr.s(frozen=True, slots=True)
@@ -28,7 +32,7 @@ class _Piece:
         return f'{self.faction_name} {self.typ} {self.id} -- {self.board_coords}'
 
     def key(self):
-        return PieceKey(self.typ, self.faction_name, self.id)
+        return piece_key(self.typ, self.faction_name, self.id)
 
     def is_plastic(self):
         return self.typ is PieceType.CHARACTER or self.typ is PieceType.MECH
@@ -93,17 +97,30 @@ class Worker(_MovablePiece):
     typ = attr.ib(default=PieceType.WORKER)
 
 
+# Piece keys are looked up in [GameState.pieces_by_key] and the board's sets of keys all the time, so there is only ever
+# one of each, and it keeps its hash
+_piece_keys = {}
+
+
+def piece_key(piece_typ, faction_name, piece_id):
+    k = (piece_typ, faction_name, piece_id)
+    ret = _piece_keys.get(k)
+    if ret is None:
+        ret = _piece_keys[k] = PieceKey(piece_typ, faction_name, piece_id)
+    return ret
+
+
 def character_key(faction_name):
-    return PieceKey(PieceType.CHARACTER, faction_name, 0)
+    return piece_key(PieceType.CHARACTER, faction_name, 0)
 
 
 def worker_key(faction_name, piece_id):
-    return PieceKey(PieceType.WORKER, faction_name, piece_id)
+    return piece_key(PieceType.WORKER, faction_name, piece_id)
 
 
 def mech_key(faction_name, mech_id):
-    return PieceKey(PieceType.MECH, faction_name, mech_id)
+    return piece_key(PieceType.MECH, faction_name, mech_id)
 
 
 def structure_key(faction_name, structure_typ):
-    return PieceKey(PieceType.STRUCTURE, faction_name, structure_typ.value)
+    return piece_key(PieceType.STRUCTURE, faction_name, structure_typ.value)
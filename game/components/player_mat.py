@@ -10,7 +10,6 @@ from game.types import BottomActionType, PlayerMatName, StructureType, TopAction
 
 import attr
 import logging
-import numpy as np
 
 from pyrsistent import pmap, pset, pvector
 
@@ -110,8 +109,8 @@ class PlayerMat:
         return attr.evolve(self, last_action_spot_taken=i)
 
     @staticmethod
-    def choose(num):
-        return np.random.choice([pmn for pmn in PlayerMatName], num, replace=False)
+    def choose(num, rng):
+        return [PlayerMatName(v) for v in rng.choice(len(PlayerMatName), num, replace=False)]
 
     def cube_spaces_not_fully_upgraded(self):
         return [(t, i) for (t, s) in self.top_action_cubes_and_structures_by_top_action_typ.items()
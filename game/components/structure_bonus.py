@@ -1,11 +1,8 @@
 import game.components.board as bd
 import game.constants as constants
-from game.types import TerrainType
+from game.types import GameEnum, TerrainType
 
 from collections import defaultdict
-from enum import Enum
-
-import random
 
 
 def score_adjacent(board, coords, num_spaces_to_coins):
@@ -162,7 +159,7 @@ def score_farms_or_tundras_with_structures(board):
     return score_on_top_of(farms_and_tundras, num_spaces_to_coins)
 
 
-class StructureBonus(Enum):
+class StructureBonus(GameEnum):
     NEXT_TO_TUNNELS = 0
     NEXT_TO_LAKES = 1
     NEXT_TO_ENCOUNTERS = 2
@@ -171,8 +168,8 @@ class StructureBonus(Enum):
     FARMS_OR_TUNDRAS_WITH_STRUCTURES = 5
 
     @staticmethod
-    def random():
-        return StructureBonus(random.randint(0, constants.NUM_STRUCTURE_BONUSES - 1))
+    def random(rng):
+        return StructureBonus(int(rng.integers(constants.NUM_STRUCTURE_BONUSES)))
 
 
 score_functions = {StructureBonus.NEXT_TO_TUNNELS: score_next_to_tunnels,
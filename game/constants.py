@@ -6,6 +6,9 @@ MAX_COMBAT_POWER = 7
 
 MAX_POPULARITY = 18
 MAX_POWER = 18
+# The most of one resource a piece can load at once, so that every amount has an output in the model's
+# NUM_RESOURCES head
+MAX_RESOURCES_LOADED = 19
 
 MIN_PLAYERS = 2
 MAX_PLAYERS = 2
@@ -4,7 +4,6 @@ from game.types import FactionName, PieceType, TerrainType
 
 import attr
 import logging
-import numpy as np
 
 
 @attr.s(frozen=True, slots=True)
@@ -177,8 +176,16 @@ class Saxony(Faction):
         return ret
 
 
-def choose(num):
+def choose(num, rng):
     assert num == 2
     ret = [Rusviet.new(), Saxony.new()]
-    np.random.shuffle(ret)
+    rng.shuffle(ret)
     return ret
+
+
+_factions_by_name = {FactionName.NORDIC: Nordic, FactionName.RUSVIET: Rusviet, FactionName.POLANIA: Polania,
+                     FactionName.CRIMEA: Crimea, FactionName.SAXONY: Saxony}
+
+
+def from_name(name):
+    return _factions_by_name[name].new()
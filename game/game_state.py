@@ -6,14 +6,55 @@ import game.components.structure_bonus as gc_structure_bonus
 import game.state_change as sc
 from game.actions.action import Choice
 from game.actions.take_turn import TakeTurn
-from game.faction import choose as choose_faction
+from game.faction import choose as choose_faction, from_name as faction_from_name
 from game.player import Player
 from game.types import PieceType, StructureType
 
 import attr
+import numpy as np
 from pyrsistent import plist, pmap, pset, pvector
 
 
+# Variations on how the choices in a game are broken up and narrowed down
+@attr.s(slots=True, frozen=True)
+class GameOptions:
+    # Moving a piece is one choice of a whole sequence rather than one choice per step (see [MacroMoveOnePiece])
+    macro_moves = attr.ib(default=False)
+    # What a piece picks up is one choice from a few amounts of everything rather than one choice per resource type
+    # from every amount (see [LoadCargo]). Like every option it holds for both players, so a model trained with it
+    # can't yet play an arena match against one trained without it; that needs per-player options here and in the
+    # flags of [game.record].
+    bucketed_cargo = attr.ib(default=False)
+
+
+# Everything that's decided at random before the first move. A game is completely determined by its setup and the
+# moves made in it (see [game.record]).
+@attr.s(slots=True, frozen=True)
+class Setup:
+    # In player order
+    faction_names = attr.ib(converter=tuple)
+    player_mat_names = attr.ib(converter=tuple)
+    structure_bonus = attr.ib()
+    # The combat card deck before anyone draws their starting cards, top card first
+    combat_deck = attr.ib(converter=tuple)
+    # For whatever is random after setup (see [GameState.rng]). If None, a seed is picked when the game starts and the
+    # game can't be replayed exactly.
+    seed = attr.ib(default=None)
+    # Not random, but needed along with the setup to replay the moves of a game
+    options = attr.ib(default=GameOptions())
+
+    # [rng] is a [numpy.random.Generator]; given one with a fixed seed, the setup is always the same
+    @classmethod
+    def random(cls, num_players, rng=None, options=GameOptions()):
+        if rng is None:
+            rng = np.random.default_rng()
+        factions = choose_faction(num_players, rng)
+        player_mat_names = sorted(gc_player_mat.PlayerMat.choose(num_players, rng), key=lambda x: x.value)
+        return cls([faction.name for faction in factions], player_mat_names,
+                   gc_structure_bonus.StructureBonus.random(rng), gc_combat_cards.build_deck(rng),
+                   int(rng.integers(2 ** 63)), options)
+
+
 @attr.s(slots=True, frozen=True)
 class GameState:
     board = attr.ib()
@@ -25,16 +66,30 @@ class GameState:
     action_stack = attr.ib(default=plist([TakeTurn()]))
     current_player_idx = attr.ib(default=0)
     spaces_produced_this_turn = attr.ib(default=pset())
+    # Spaces a character or mech moved into this turn, which are the only places a combat can break out
+    spaces_entered_this_turn = attr.ib(default=pset())
     winner = attr.ib(default=None)
     player_scores = attr.ib(default=None)
     num_turns = attr.ib(default=0)
+    seed = attr.ib(default=0)
+    # The number of random events so far, i.e. how many times [rng] has been called
+    random_draws = attr.ib(default=0)
+    options = attr.ib(default=GameOptions())
+    # Filled in by [game.movement] when it's first needed. Not passed on by [attr.evolve].
+    movement = attr.ib(default=None, init=False, eq=False, repr=False)
 
+    # The same [seed] always gives the same game, as long as the players' choices are the same
     @classmethod
-    def from_num_players(cls, num_players):
-        factions = choose_faction(num_players)
-        player_mat_names = sorted(gc_player_mat.PlayerMat.choose(num_players), key=lambda x: x.value)
+    def from_num_players(cls, num_players, seed=None, options=GameOptions()):
+        return cls.from_setup(Setup.random(num_players, np.random.default_rng(seed), options))
+
+    @classmethod
+    def from_setup(cls, setup):
+        num_players = len(setup.faction_names)
+        factions = [faction_from_name(faction_name) for faction_name in setup.faction_names]
+        player_mat_names = setup.player_mat_names
         board = gc_board.Board.from_active_factions(factions)
-        combat_cards = gc_combat_cards.CombatCards()
+        combat_cards = gc_combat_cards.CombatCards(pvector(setup.combat_deck))
 
         pieces_by_key = {}
         for piece_typ in PieceType:
@@ -57,7 +112,7 @@ class GameState:
                 pieces_by_key[new_piece.key()] = new_piece
 
         def add_piece_for_player(player, board, piece_typ, piece_id, coords):
-            key = gc_piece.PieceKey(piece_typ, player.faction_name(), piece_id)
+            key = gc_piece.piece_key(piece_typ, player.faction_name(), piece_id)
             piece = pieces_by_key[key]
             pieces_by_key[key] = attr.evolve(piece, board_coords=coords)
             board = board.add_piece(key, coords)
@@ -75,8 +130,9 @@ class GameState:
 
         players_by_idx = pvector(players_by_idx)
         pieces_by_key = pmap(pieces_by_key)
-        game_state = cls(board, gc_structure_bonus.StructureBonus.random(), combat_cards, players_by_idx,
-                         player_idx_by_faction_name, pieces_by_key)
+        seed = setup.seed if setup.seed is not None else int(np.random.default_rng().integers(2 ** 63))
+        game_state = cls(board, setup.structure_bonus, combat_cards, players_by_idx, player_idx_by_faction_name,
+                         pieces_by_key, seed=seed, options=setup.options)
         for i in range(num_players):
             player = game_state.players_by_idx[i]
             spaces_adjacent_to_home_base = board.adjacencies_accounting_for_rivers_and_lakes[player.home_base]
@@ -90,6 +146,14 @@ class GameState:
     def is_over(self):
         return self.winner is not None
 
+    # A generator for one random event, along with the game state to carry on from. Rather than one generator that
+    # every event draws from, each event gets its own, seeded by the game's seed and the number of events before it.
+    # That way what happens depends only on the game state, which MCTS needs since it plays out many continuations of
+    # the same state, and which lets a [game.record.GameRecord] replay the game exactly.
+    def rng(self):
+        return attr.evolve(self, random_draws=self.random_draws + 1), np.random.default_rng((self.seed,
+                                                                                               self.random_draws))
+
     def legal_moves(self):
         if not self.action_stack:
             return []
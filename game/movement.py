@@ -0,0 +1,196 @@
+import game.components.piece as gc_piece
+import game.state_change as sc
+from game.actions.action import StateChange
+from game.types import MechType, PieceType, TerrainType
+
+import attr
+
+
+# Where pieces can move in one position, worked out the first time anyone asks and then kept on the [GameState]. The
+# same position gets asked about again and again: by [MoveOnePiece], by every expansion of it during search, and by
+# the encoders and decoders. Game states are immutable and each one gets its own [Movement], so nothing here ever
+# needs invalidating; the adjacencies that are sure to be the same are copied into the next one by [carry_over].
+@attr.s(slots=True)
+class Movement:
+    # (faction name, piece type, board coords) -> the spaces a piece of that type could move to from there. Every
+    # piece of a type that's on the same space can go to the same places.
+    adjacencies = attr.ib(factory=dict)
+    # The choices for [MoveOnePiece], once worked out
+    movable_pieces = attr.ib(default=None)
+    # The choices for [MacroMoveOnePiece], once worked out
+    macro_moves = attr.ib(default=None)
+
+
+def of(game_state):
+    movement = game_state.movement
+    if movement is None:
+        movement = Movement()
+        object.__setattr__(game_state, 'movement', movement)
+    return movement
+
+
+# Hands the adjacencies of the current player's pieces worked out for [old] on to [new], the position after one step of
+# moving a piece (see [Action.steps_piece]). A step only moves, loads and unloads the player's own pieces, apart from
+# scaring away enemy workers, which costs the player popularity. So as long as the players haven't changed, a piece can
+# still go to the same places from the same space; the exception is a plastic piece with [MechType.TELEPORT], which
+# might depend on who controls which spaces.
+def carry_over(old, new):
+    if old.movement is None or new.movement is not None or new.current_player_idx != old.current_player_idx \
+            or new.players_by_idx is not old.players_by_idx:
+        return
+    player = sc.get_current_player(new)
+    faction_name = player.faction_name()
+    teleports = MechType.TELEPORT.value in player.mech_ids
+    adjacencies = {key: coords for key, coords in old.movement.adjacencies.items()
+                   if key[0] is faction_name and (key[1] is PieceType.WORKER or not teleports)}
+    if adjacencies:
+        object.__setattr__(new, 'movement', Movement(adjacencies))
+
+
+# Throws away whatever has been worked out for [game_state], e.g. to time it from scratch
+def forget(game_state):
+    object.__setattr__(game_state, 'movement', None)
+
+
+# The cached equivalent of [sc.effective_adjacent_space_coords]. Callers mustn't change the list.
+def effective_adjacent_space_coords(game_state, piece_key):
+    piece = game_state.pieces_by_key[piece_key]
+    key = (piece.faction_name, piece.typ, piece.board_coords)
+    adjacencies = of(game_state).adjacencies
+    ret = adjacencies.get(key)
+    if ret is None:
+        ret = adjacencies[key] = sc.effective_adjacent_space_coords(game_state, piece_key)
+    return ret
+
+
+# The current player's pieces that can move, as (board coords, piece type), limited to the spaces the player controls.
+# This is [sc.movable_pieces] and the control check in one pass, with the worker adjacencies shared with
+# [effective_adjacent_space_coords] and the controller of each space worked out only once.
+def movable_pieces(game_state):
+    movement = of(game_state)
+    if movement.movable_pieces is None:
+        movement.movable_pieces = _movable_pieces(game_state)
+    return movement.movable_pieces
+
+
+def _movable_pieces(game_state):
+    player = sc.get_current_player(game_state)
+    faction_name = player.faction_name()
+    board = game_state.board
+    pieces_by_key = game_state.pieces_by_key
+    s = set()
+    for worker_id in player.worker_ids:
+        worker_key = gc_piece.worker_key(faction_name, worker_id)
+        worker = pieces_by_key[worker_key]
+        if (worker.board_coords, PieceType.WORKER) in s or worker.moved_this_turn:
+            continue
+        # A worker isn't plastic, so its effective adjacencies are just the neighbouring spaces without enemies
+        if board.get_space(worker.board_coords).terrain_typ is not TerrainType.LAKE \
+                and effective_adjacent_space_coords(game_state, worker_key):
+            s.add((worker.board_coords, PieceType.WORKER))
+    for mech_id in player.mech_ids:
+        mech = pieces_by_key[gc_piece.mech_key(faction_name, mech_id)]
+        if not mech.moved_this_turn:
+            s.add((mech.board_coords, PieceType.MECH))
+    character = pieces_by_key[gc_piece.character_key(faction_name)]
+    if not character.moved_this_turn:
+        s.add((character.board_coords, PieceType.CHARACTER))
+
+    controllers = {}
+    ret = []
+    for board_coords_and_piece_typ in s:
+        board_coords = board_coords_and_piece_typ[0]
+        if board_coords not in controllers:
+            controllers[board_coords] = sc.controller(game_state, board.get_space(board_coords))
+        if controllers[board_coords] is faction_name:
+            ret.append(board_coords_and_piece_typ)
+    return ret
+
+
+# Every way to move one piece, start to finish, as the sequence of choices that would otherwise be made one at a time:
+# first the piece (a choice for [move_one_piece]), then whatever is chosen for [LoadResources], [LoadWorkers],
+# [MovePieceOneSpace] and the [Optional] extra steps along the way. [game_state] has the choice to move a piece on top
+# of its stack. Sequences that leave the pieces and the board the same are only listed once. A piece that can carry so
+# much that there would be more than [MAX_POSITIONS_PER_PIECE] positions to look through only gets the sequence with
+# the choice of piece, leaving the rest to be chosen one at a time. None if there's nothing to move.
+def macro_moves(game_state, move_one_piece):
+    movement = of(game_state)
+    if movement.macro_moves is None:
+        movement.macro_moves = _macro_moves(game_state, move_one_piece)
+    return movement.macro_moves
+
+
+MAX_POSITIONS_PER_PIECE = 64
+
+
+class _TooManyPositions(Exception):
+    pass
+
+
+def _macro_moves(game_state, move_one_piece):
+    below = game_state.action_stack.rest
+    old, game_state = game_state, attr.evolve(game_state, action_stack=below.cons(move_one_piece))
+    carry_over(old, game_state)
+    if not move_one_piece.choices(game_state):
+        return None
+
+    # Only the spaces the piece has been on can have had anything picked up, dropped off or scared away, so they and
+    # the piece itself are enough to tell positions apart
+    def key(game_state, piece_key, visited):
+        board = game_state.board
+        return game_state.action_stack, game_state.pieces_by_key[piece_key], game_state.spaces_entered_this_turn, \
+            frozenset((coords, board.get_space(coords).resources, board.get_space(coords).worker_keys)
+                      for coords in visited)
+
+    def visit(game_state, moves, piece_key, visited, seen, ret):
+        for choice in game_state.action_stack.first.choices(game_state) or [None]:
+            next_state = step(game_state, choice, below)
+            next_visited = visited | {next_state.pieces_by_key[piece_key].board_coords}
+            k = key(next_state, piece_key, next_visited)
+            if k in seen:
+                continue
+            if len(seen) == MAX_POSITIONS_PER_PIECE:
+                raise _TooManyPositions()
+            seen.add(k)
+            if next_state.action_stack is below:
+                ret.append(moves + (choice,))
+            else:
+                visit(next_state, moves + (choice,), piece_key, next_visited, seen, ret)
+
+    ret = []
+    for board_coords_and_piece_typ in move_one_piece.choices(game_state):
+        piece_key = sc.get_piece_by_board_coords_and_piece_typ(game_state, *board_coords_and_piece_typ)
+        moves = (board_coords_and_piece_typ,)
+        for_piece = []
+        try:
+            visit(step(game_state, board_coords_and_piece_typ, below), moves, piece_key,
+                  frozenset([board_coords_and_piece_typ[0]]), set(), for_piece)
+        except _TooManyPositions:
+            for_piece = [moves]
+        ret.extend(for_piece)
+    return ret
+
+
+# Makes [choice] for the choice on top of [game_state]'s stack, then carries out everything that follows up to the next
+# choice or until the stack is down to [below]. Moving a piece never ends a turn or a game, so unlike
+# [game.play.apply_move] there's nothing else to look out for.
+def step(game_state, choice, below):
+    old = game_state
+    game_state, choice_action = sc.pop_action(game_state)
+    game_state = choice_action.apply(game_state, choice)
+    while game_state.action_stack is not below and isinstance(game_state.action_stack.first, StateChange):
+        game_state, action = sc.pop_action(game_state)
+        game_state = action.apply(game_state)
+    if choice_action.steps_piece:
+        carry_over(old, game_state)
+    return game_state
+
+
+# Plays one of the [macro_moves] of a position whose stack, with the choice to move a piece popped off, is [game_state]'s.
+# If the piece has anything left to choose, the choice for it is on top of the stack that's returned.
+def play_macro_move(game_state, move_one_piece, macro_move):
+    below = game_state.action_stack
+    game_state = sc.push_action(game_state, move_one_piece)
+    for choice in macro_move:
+        game_state = step(game_state, choice, below)
+    return game_state
@@ -2,27 +2,25 @@ from game.actions import Choice, MaybePayCost, StateChange
 from game.actions.take_turn import TakeTurn
 from game.exceptions import GameOver
 import game.constants as constants
+import game.movement as movement
+import game.scoring as scoring
 import game.state_change as sc
-import game.components.structure_bonus as gc_structure_bonus
 
 import attr
 import logging
 
 
+# Ties go to whoever comes first in turn order
 def finalize(game_state):
-    player_scores = {faction_name: game_state.players_by_idx[player_idx].score(game_state)
+    scores = scoring.scores(game_state)
+    player_scores = {faction_name: int(scores[player_idx])
                      for faction_name, player_idx in game_state.player_idx_by_faction_name.items()}
-    structure_bonus_scores = gc_structure_bonus.score(game_state.structure_bonus, game_state.board)
-    for faction_name in game_state.player_idx_by_faction_name.keys():
-        if faction_name not in structure_bonus_scores:
-            structure_bonus_scores[faction_name] = 0
     winning_score = 0
     winner = None
-    for faction_name, structure_bonus_score in structure_bonus_scores.items():
-        player_scores[faction_name] += structure_bonus_score
-        if player_scores[faction_name] > winning_score:
-            winning_score = player_scores[faction_name]
-            winner = faction_name
+    for player in game_state.players_by_idx:
+        if player_scores[player.faction_name()] > winning_score:
+            winning_score = player_scores[player.faction_name()]
+            winner = player.faction_name()
     game_state = attr.evolve(game_state, player_scores=player_scores, winner=winner)
     logging.debug(f'Returning game state with winner: {game_state.winner}')
     return game_state
@@ -33,9 +31,10 @@ _take_turn = TakeTurn()
 
 def apply_move(game_state, move):
     try:
-        game_state, next_action = sc.pop_action(game_state)
-        assert isinstance(next_action, Choice)
-        game_state = next_action.apply(game_state, move)
+        old = game_state
+        game_state, choice = sc.pop_action(game_state)
+        assert isinstance(choice, Choice)
+        game_state = choice.apply(game_state, move)
         while game_state.action_stack and isinstance(game_state.action_stack.first, StateChange):
             # get_current_player(game_state).invariant(game_state)
             game_state, next_action = sc.pop_action(game_state)
@@ -53,6 +52,8 @@ def apply_move(game_state, move):
                 logging.debug(f"Can't afford {game_state.action_stack.first.cost(game_state)} so skipping "
                               f"{game_state.action_stack.first}")
             return apply_move(game_state, False)
+        if choice.steps_piece:
+            movement.carry_over(old, game_state)
         return game_state
     except GameOver as e:
         game_state = sc.end_turn(e.game_state)
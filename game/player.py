@@ -6,7 +6,6 @@ from game.types import Benefit, BottomActionType, FactionName, MechType, PieceTy
 
 import attr
 import logging
-import numpy as np
 
 from pyrsistent import pmap, pset
 
@@ -137,7 +136,7 @@ class Player:
     def available_combat_cards(self):
         return [i for i in range(constants.MIN_COMBAT_CARD, constants.MAX_COMBAT_CARD + 1) if self.combat_cards[i]]
 
-    def random_combat_card(self, optional=False):
+    def random_combat_card(self, rng, optional=False):
         total = self.total_combat_cards()
         if not total:
             return None
@@ -148,16 +147,16 @@ class Player:
         if optional:
             all_combat_card_values.append(0)
             proportions.append(1/total)
-        return np.random.choice(all_combat_card_values, p=proportions)
+        return int(rng.choice(all_combat_card_values, p=proportions))
 
     ''' This is used when transferring a card from one player to another (Crimea's war power), so we don't discard
         the removed card. '''
-    def remove_random_combat_card(self):
+    def remove_random_combat_card(self, rng):
         if logging.getLogger().isEnabledFor(logging.DEBUG):
             logging.debug(f'{self} loses a random combat card')
-        card = self.random_combat_card()
+        card = self.random_combat_card(rng)
         if card:
-            attr.evolve(self, combat_cards=self.combat_cards.set(card, self.combat_cards.get(card)-1)), card
+            return attr.evolve(self, combat_cards=self.combat_cards.set(card, self.combat_cards.get(card)-1)), card
         else:
             return self, None
 
@@ -0,0 +1,145 @@
+from game.components.structure_bonus import StructureBonus
+from game.game_state import GameOptions, GameState, Setup
+from game.play import apply_move
+from game.types import FactionName, PlayerMatName
+
+import attr
+import numpy as np
+import struct
+
+# A finished game as its [Setup] and the index into [GameState.legal_moves] of every move with more than one option.
+# Moves with no options or only one aren't recorded, since replaying can make them on its own. Optionally the MCTS
+# visit counts behind each move are kept too, one per legal move, so that training targets can be rebuilt.
+#
+# Binary layout (little-endian):
+#   header     magic, version, flags (including the game's options), number of players, structure bonus, combat deck size, number of moves
+#   setup      faction and player mat of each player (one byte each), combat deck (one byte per card),
+#              seed (8 bytes, only if FLAG_SEED)
+#   moves      uint16 per move
+#   visits     only if FLAG_VISITS: number of legal moves (uint16) per move, then every visit count (uint32)
+#
+# A file of records is a sequence of records, each preceded by its length as a uint32.
+
+MAGIC = b'SCGR'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBBI')
+SEED = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+FLAG_SEED = 1
+FLAG_VISITS = 2
+FLAG_MACRO_MOVES = 4
+FLAG_BUCKETED_CARGO = 8
+
+
+@attr.s(slots=True)
+class GameRecord:
+    setup = attr.ib()
+    moves = attr.ib(factory=list)
+    # If not None, a list with an array of visit counts for each move
+    visits = attr.ib(default=None)
+
+    @classmethod
+    def new(cls, setup, with_visits=False):
+        return cls(setup, [], [] if with_visits else None)
+
+    # [move_visits] has the visit count of each of [choices], in the same order, as in [ExperienceCollector.move_visits]
+    def record_move(self, choices, move, move_visits=None):
+        self.moves.append(choices.index(move))
+        if self.visits is not None:
+            self.visits.append(np.array(move_visits, dtype=np.uint32))
+
+    def __len__(self):
+        return len(self.moves)
+
+    def to_bytes(self):
+        setup = self.setup
+        flags = (FLAG_SEED if setup.seed is not None else 0) | (FLAG_VISITS if self.visits is not None else 0) \
+            | (FLAG_MACRO_MOVES if setup.options.macro_moves else 0) \
+            | (FLAG_BUCKETED_CARGO if setup.options.bucketed_cargo else 0)
+        parts = [HEADER.pack(MAGIC, VERSION, flags, len(setup.faction_names), setup.structure_bonus.value,
+                             len(setup.combat_deck), len(self.moves)),
+                 bytes(faction_name.value for faction_name in setup.faction_names),
+                 bytes(player_mat_name.value for player_mat_name in setup.player_mat_names),
+                 bytes(setup.combat_deck)]
+        if setup.seed is not None:
+            parts.append(SEED.pack(setup.seed))
+        parts.append(np.array(self.moves, dtype='<u2').tobytes())
+        if self.visits is not None:
+            parts.append(np.array([len(v) for v in self.visits], dtype='<u2').tobytes())
+            parts.append(np.concatenate(self.visits).astype('<u4').tobytes() if self.visits else b'')
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, buf):
+        magic, version, flags, num_players, structure_bonus, deck_size, num_moves = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a version {VERSION} game record')
+        offset = HEADER.size
+
+        def take(n):
+            nonlocal offset
+            offset += n
+            return buf[offset - n:offset]
+
+        faction_names = [FactionName(v) for v in take(num_players)]
+        player_mat_names = [PlayerMatName(v) for v in take(num_players)]
+        combat_deck = list(take(deck_size))
+        seed = SEED.unpack(take(SEED.size))[0] if flags & FLAG_SEED else None
+        moves = np.frombuffer(take(2 * num_moves), dtype='<u2').tolist()
+        visits = None
+        if flags & FLAG_VISITS:
+            sizes = np.frombuffer(take(2 * num_moves), dtype='<u2')
+            counts = np.frombuffer(take(4 * int(sizes.sum())), dtype='<u4')
+            visits = np.split(counts, np.cumsum(sizes)[:-1]) if num_moves else []
+        options = GameOptions(macro_moves=bool(flags & FLAG_MACRO_MOVES),
+                              bucketed_cargo=bool(flags & FLAG_BUCKETED_CARGO))
+        setup = Setup(faction_names, player_mat_names, StructureBonus(structure_bonus), combat_deck, seed, options)
+        return cls(setup, moves, visits)
+
+
+# Replays [record] from the start, yielding every game state the game passed through along with the index in the
+# record of the move made from it, or None if there was nothing to choose
+def replay(record):
+    game_state = GameState.from_setup(record.setup)
+    i = 0
+    while not game_state.is_over():
+        choices = game_state.legal_moves()
+        if choices and len(choices) > 1:
+            yield game_state, i
+            move = choices[record.moves[i]]
+            i += 1
+        else:
+            yield game_state, None
+            move = choices[0] if choices else None
+        game_state = apply_move(game_state, move)
+    assert i == len(record.moves), f'Game ended after {i} of {len(record.moves)} recorded moves'
+    yield game_state, None
+
+
+# The positions where a move was chosen, which are the ones to encode for training. Because only the moves are
+# stored, a dataset can be re-encoded whenever [encoders.game_state] changes.
+def positions(record):
+    return ((game_state, i) for game_state, i in replay(record) if i is not None)
+
+
+def final_state(record):
+    for game_state, _ in replay(record):
+        pass
+    return game_state
+
+
+def append(path, record):
+    data = record.to_bytes()
+    with open(path, 'ab') as f:
+        f.write(LENGTH.pack(len(data)) + data)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        buf = f.read()
+    offset = 0
+    while offset < len(buf):
+        length, = LENGTH.unpack_from(buf, offset)
+        offset += LENGTH.size
+        yield GameRecord.from_bytes(buf[offset:offset + length])
+        offset += length
@@ -0,0 +1,135 @@
+import game.components.board as gc_board
+from game.components.structure_bonus import StructureBonus
+from game.constants import FACTORY_COORDS
+from game.types import PieceType, StructureType, TerrainType
+
+import attr
+import numpy as np
+
+
+# The parts of the board that scoring looks at, as arrays indexed by space. The layout of the board is the same in every
+# game, so these are worked out once.
+@attr.s(slots=True, frozen=True)
+class _Tables:
+    coords = attr.ib()
+    index_by_coords = attr.ib()
+    # For the bonuses that count structures on some spaces, 1 for each of those spaces. For the ones that count spaces
+    # next to a structure, a row for each of those spaces with a 1 for each space next to it.
+    masks_by_structure_bonus = attr.ib()
+    # Each row is a space followed by the spaces in a line from it, either up and to the right or down and to the
+    # right, as far as a row of one faction's structures could reach. [len(coords)] stands for off the board.
+    rows = attr.ib()
+
+    @classmethod
+    def from_board(cls, board):
+        coords = sorted(board.board_spaces_by_coords.keys())
+        index_by_coords = {c: i for i, c in enumerate(coords)}
+        spaces = [board.get_space(c) for c in coords]
+        masks_by_structure_bonus = {
+            StructureBonus.ON_TUNNELS: np.array([space._has_tunnel for space in spaces], dtype=np.int64),
+            StructureBonus.FARMS_OR_TUNDRAS_WITH_STRUCTURES:
+                np.array([space.terrain_typ in (TerrainType.FARM, TerrainType.TUNDRA) for space in spaces],
+                         dtype=np.int64)}
+        next_to = {StructureBonus.NEXT_TO_TUNNELS: lambda space: space.has_tunnel(),
+                   StructureBonus.NEXT_TO_LAKES: lambda space: space.terrain_typ is TerrainType.LAKE,
+                   StructureBonus.NEXT_TO_ENCOUNTERS: lambda space: space.has_encounter}
+        for structure_bonus, counts in next_to.items():
+            counted = [c for c, space in zip(coords, spaces) if counts(space)]
+            mask = np.zeros((len(counted), len(coords)), dtype=np.int64)
+            for row, c in enumerate(counted):
+                for other in board.base_adjacencies[c]:
+                    mask[row, index_by_coords[other]] = 1
+            masks_by_structure_bonus[structure_bonus] = mask
+        rows = []
+        for c, space in zip(coords, spaces):
+            if space.terrain_typ is TerrainType.HOME_BASE:
+                continue
+            for move in (gc_board.move_down_and_right, gc_board.move_up_and_right):
+                row, next_coords = [], c
+                while len(row) < len(StructureType):
+                    if next_coords is None:
+                        row.append(len(coords))
+                        continue
+                    row.append(index_by_coords[next_coords])
+                    next_coords = move(*next_coords)
+                    if not (gc_board.on_the_board(*next_coords) and next_coords in index_by_coords):
+                        next_coords = None
+                rows.append(row)
+        return cls(coords, index_by_coords, masks_by_structure_bonus, np.array(rows))
+
+
+_tables = _Tables.from_board(gc_board.Board.from_active_factions([]))
+
+# Coins for the number of spaces (or the length of the row) that counts for each structure bonus. Anything past the end
+# of a table gets the last entry.
+_coins_by_structure_bonus = {StructureBonus.NEXT_TO_TUNNELS: np.array([0, 2, 4, 4, 6, 6, 9]),
+                             StructureBonus.NEXT_TO_LAKES: np.array([0, 2, 4, 4, 6, 6, 9]),
+                             StructureBonus.NEXT_TO_ENCOUNTERS: np.array([0, 2, 4, 4, 6, 6, 9]),
+                             StructureBonus.ON_TUNNELS: np.array([0, 2, 4, 6]),
+                             StructureBonus.LONGEST_ROW_OF_STRUCTURES: np.array([0, 2, 4, 6, 9]),
+                             StructureBonus.FARMS_OR_TUNDRAS_WITH_STRUCTURES: np.array([0, 2, 4, 6, 9])}
+
+
+# [structures] has a row for each space plus a row of zeros for off the board, and a column for each player
+def structure_bonus_scores(structure_bonus, structures):
+    if structure_bonus is StructureBonus.LONGEST_ROW_OF_STRUCTURES:
+        counts = np.cumprod(structures[_tables.rows], axis=1).sum(axis=1).max(axis=0)
+    elif structure_bonus in (StructureBonus.ON_TUNNELS, StructureBonus.FARMS_OR_TUNDRAS_WITH_STRUCTURES):
+        counts = _tables.masks_by_structure_bonus[structure_bonus] @ structures[:-1]
+    else:
+        counts = (_tables.masks_by_structure_bonus[structure_bonus] @ structures[:-1] > 0).sum(axis=0)
+    coins = _coins_by_structure_bonus[structure_bonus]
+    return coins[np.minimum(counts, len(coins) - 1)]
+
+
+# Every player's score, in player order: what [Player.score] and [structure_bonus.score] add up to at the end of the
+# game. Cheap enough to use before then as an estimate of how the game is going.
+def scores(game_state):
+    num_spaces = len(_tables.coords)
+    num_players = len(game_state.players_by_idx)
+    player_idx_by_faction_name = game_state.player_idx_by_faction_name
+    index_by_coords = _tables.index_by_coords
+    plastic = np.zeros((num_spaces, num_players), dtype=np.int64)
+    workers = np.zeros((num_spaces, num_players), dtype=np.int64)
+    structures = np.zeros((num_spaces + 1, num_players), dtype=np.int64)
+    for piece in game_state.pieces_by_key.values():
+        if piece.board_coords is None:
+            continue
+        i, player_idx = index_by_coords[piece.board_coords], player_idx_by_faction_name[piece.faction_name]
+        if piece.typ is PieceType.STRUCTURE:
+            structures[i, player_idx] = 1
+        elif piece.typ is PieceType.WORKER:
+            workers[i, player_idx] = 1
+        elif not piece.moved_into_enemy_territory_this_turn:
+            plastic[i, player_idx] = 1
+
+    # The same rules as [sc.controller]: characters and mechs first, and on a space with two players' the current
+    # player loses out; then workers; then structures
+    num_plastic = plastic.sum(axis=1)
+    plastic[num_plastic > 1, game_state.current_player_idx] = 0
+    controlled = np.where(num_plastic[:, None] > 0, plastic,
+                          np.where(workers.any(axis=1)[:, None], workers, structures[:-1]))
+    players = game_state.players_by_idx
+    for player_idx, player in enumerate(players):
+        controlled[index_by_coords[player.home_base], player_idx] = 0
+    territories = controlled.sum(axis=0) + 2 * controlled[index_by_coords[FACTORY_COORDS]]
+    resources = np.zeros(num_spaces, dtype=np.int64)
+    for i in np.flatnonzero(controlled.any(axis=1)):
+        resources[i] = sum(game_state.board.get_space(_tables.coords[i]).resources.values())
+    resource_pairs = resources @ controlled // 2
+
+    popularity = np.array([player.popularity for player in players])
+    multipliers = (popularity > 6).astype(np.int64) + (popularity > 12)
+    return (3 + multipliers) * np.array([player.stars.count for player in players]) \
+        + (2 + multipliers) * territories + (1 + multipliers) * resource_pairs \
+        + np.array([player.coins for player in players]) \
+        + structure_bonus_scores(game_state.structure_bonus, structures)
+
+
+# How likely each player is to win, in player order, going by the scores now: a softmax of the scores over [scale],
+# which for two players is the logistic function of the difference between them. A player [scale] coins ahead of the
+# other is given about a 73% chance.
+def win_probabilities(game_state, scale):
+    scaled = scores(game_state) / scale
+    exp = np.exp(scaled - scaled.max())
+    return exp / exp.sum()
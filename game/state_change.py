@@ -79,7 +79,7 @@ def _board_coords_with_piece_typ(game_state, player, piece_typ):
     faction_name = player.faction_name()
     ret = set()
     for piece_id in id_set:
-        piece = game_state.pieces_by_key[gc_piece.PieceKey(piece_typ, faction_name, piece_id)]
+        piece = game_state.pieces_by_key[gc_piece.piece_key(piece_typ, faction_name, piece_id)]
         ret.add(piece.board_coords)
     ret.discard(player.home_base)
     return ret
@@ -308,7 +308,10 @@ def give_reward_to_player(game_state, player, benefit, amt):
     elif benefit is Benefit.POWER:
         return add_power(game_state, player, amt)
     elif benefit is Benefit.COMBAT_CARDS:
-        combat_cards, new_cards = game_state.combat_cards.draw(amt)
+        rng = None
+        if amt > len(game_state.combat_cards.deck):
+            game_state, rng = game_state.rng()
+        combat_cards, new_cards = game_state.combat_cards.draw(amt, rng)
         game_state = attr.evolve(game_state, combat_cards=combat_cards)
         return add_combat_cards(game_state, player, new_cards)
 
@@ -649,7 +652,8 @@ def end_turn(game_state):
     if next_player_idx == len(game_state.players_by_idx):
         next_player_idx = 0
     game_state = attr.evolve(game_state, board=board, current_player_idx=next_player_idx,
-                             spaces_produced_this_turn=pset(), num_turns=game_state.num_turns+1)
+                             spaces_produced_this_turn=pset(), spaces_entered_this_turn=pset(),
+                             num_turns=game_state.num_turns+1)
     return game_state
 
 
@@ -663,8 +667,10 @@ def move_piece(game_state, piece_key, to_coords):
     piece = attr.evolve(piece, board_coords=to_coords)
     board = board.set_space(old_space).set_space(new_space)
     game_state = set_piece(game_state, piece)
-    game_state = attr.evolve(game_state, board=board)
-    return game_state
+    if piece.is_plastic():
+        return attr.evolve(game_state, board=board,
+                           spaces_entered_this_turn=game_state.spaces_entered_this_turn.add(to_coords))
+    return attr.evolve(game_state, board=board)
 
 
 def get_piece_by_board_coords_and_piece_typ(game_state, board_coords, piece_typ):
@@ -0,0 +1,70 @@
+import numpy as np
+
+import game.components.piece as gc_piece
+import game.state_change as sc
+from agents import RandomAgent
+from game.actions import LoadCargo, LoadResources, LoadWorkers
+from game.game_state import GameOptions, GameState, Setup
+from game.play import apply_move
+from game.record import GameRecord, replay
+from game.types import MechType, ResourceType
+
+
+def test_load_cargo_choices():
+    game_state = GameState.from_num_players(2, seed=5, options=GameOptions(bucketed_cargo=True))
+    player = sc.get_current_player(game_state)
+    coords = min(sc.board_coords_with_workers(game_state, player))
+    game_state = sc.deploy_mech(game_state, player, MechType.RIVERWALK, coords)
+    game_state = sc.add_resources_to_space(game_state, coords, ResourceType.WOOD, 7)
+    game_state = sc.add_resources_to_space(game_state, coords, ResourceType.OIL, 2)
+    mech_key = gc_piece.mech_key(player.faction_name(), MechType.RIVERWALK.value)
+    costs = {bottom_action.resource_typ: bottom_action.current_cost
+             for _, bottom_action in player.player_mat.action_spaces}
+
+    choices = LoadCargo.new(mech_key).choices(game_state)
+    wood = sorted({0, costs[ResourceType.WOOD], 7})
+    oil = sorted({0, min(costs[ResourceType.OIL], 2), 2})
+    expected = [tuple(w if r is ResourceType.WOOD else o if r is ResourceType.OIL else 0 for r in ResourceType) + (n,)
+                for w in wood for o in oil for n in (0, 1)]
+    assert sorted(choices) == sorted(expected)
+
+    cargo = choices[-1]
+    mech = LoadCargo.new(mech_key).do(game_state, cargo).pieces_by_key[mech_key]
+    assert [mech.carrying_resources[r] for r in ResourceType] == list(cargo[:-1])
+    assert len(mech.carrying_worker_keys) == cargo[-1] == 1
+
+
+def play(seed, options):
+    setup = Setup.random(2, np.random.default_rng(seed), options)
+    game_state = GameState.from_setup(setup)
+    agent = RandomAgent(np.random.default_rng(seed))
+    record = GameRecord.new(setup)
+    while not game_state.is_over():
+        assert not isinstance(game_state.action_stack.first, (LoadResources, LoadWorkers))
+        choices = game_state.legal_moves()
+        move = agent.select_move(game_state)
+        if choices and len(choices) > 1:
+            record.record_move(choices, move)
+        game_state = apply_move(game_state, move)
+    return record, game_state
+
+
+def test_games_with_bucketed_cargo():
+    for options in (GameOptions(bucketed_cargo=True), GameOptions(macro_moves=True, bucketed_cargo=True)):
+        for seed in range(3):
+            record, game_state = play(seed, options)
+            record = GameRecord.from_bytes(record.to_bytes())
+            assert record.setup.options == options
+            for replayed_state, _ in replay(record):
+                pass
+            assert replayed_state.player_scores == game_state.player_scores
+
+
+def run_tests():
+    test_load_cargo_choices()
+    test_games_with_bucketed_cargo()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
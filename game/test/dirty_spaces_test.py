@@ -0,0 +1,82 @@
+import numpy as np
+
+from agents import RandomAgent
+from game import state_change as sc
+from game.actions import MaybeCombat
+from game.actions.combat import Combat
+from game.components import piece as gc_piece
+from game.game_state import GameState
+from game.play import apply_move
+
+NUM_GAMES = 20
+
+
+# The combats that checking every space on the board would start, in the order they'd be pushed
+def combats_from_full_scan(game_state):
+    combats = []
+    current_player_faction = sc.get_current_player(game_state).faction_name()
+    for board_coords in game_state.board.base_adjacencies.keys():
+        combat_factions = game_state.board.get_space(board_coords).combat_factions()
+        if combat_factions:
+            faction1, faction2 = combat_factions
+            attacker, defender = (faction1, faction2) \
+                if current_player_faction is faction1 else (faction2, faction1)
+            combats.append(Combat.new(board_coords, attacker, defender))
+    return combats
+
+
+def combats_pushed(game_state):
+    before = len(game_state.action_stack)
+    after = MaybeCombat.new().do(game_state).action_stack
+    return list(after)[:len(after) - before][::-1]
+
+
+def plastic_keys(game_state, player):
+    return [gc_piece.character_key(player.faction_name())] + \
+           [gc_piece.mech_key(player.faction_name(), mech_id) for mech_id in player.mech_ids]
+
+
+# Pieces hardly ever get into a fight in random games, since they can't cross rivers early on. So at the start of a
+# turn we send some of the current player's characters and mechs straight to other spaces, mostly ones with enemy
+# pieces in them, the same way that moving them would.
+def invade(game_state, rng):
+    current_player = sc.get_current_player(game_state)
+    board = game_state.board
+    enemy_spaces = [coords for coords in board.base_adjacencies
+                    if not board.get_space(coords).contains_no_enemy_plastic(current_player.faction_name())]
+    all_spaces = list(board.base_adjacencies)
+    for piece_key in plastic_keys(game_state, current_player):
+        if rng.random() < 0.5:
+            continue
+        spaces = enemy_spaces if enemy_spaces and rng.random() < 0.8 else all_spaces
+        to_coords = spaces[rng.integers(len(spaces))]
+        if to_coords != game_state.pieces_by_key[piece_key].board_coords:
+            game_state = sc.move_piece(game_state, piece_key, to_coords)
+    return game_state
+
+
+def test_matches_full_scan():
+    combats = 0
+    for seed in range(NUM_GAMES):
+        game_state = GameState.from_num_players(2, seed=seed)
+        rng = np.random.default_rng(seed)
+        agent = RandomAgent(rng)
+        while not game_state.is_over():
+            expected = combats_from_full_scan(game_state)
+            assert combats_pushed(game_state) == expected
+            if not game_state.spaces_entered_this_turn:
+                invaded = invade(game_state, rng)
+                expected = combats_from_full_scan(invaded)
+                assert combats_pushed(invaded) == expected
+                combats += len(expected)
+            game_state = apply_move(game_state, agent.select_move(game_state))
+    assert combats, 'No combats happened, so nothing was tested'
+
+
+def run_tests():
+    test_matches_full_scan()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
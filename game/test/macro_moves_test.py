@@ -0,0 +1,118 @@
+import attr
+import numpy as np
+
+import game.movement as movement
+from agents import RandomAgent
+from game.actions import MacroMoveOnePiece, MoveOnePiece
+from game.game_state import GameOptions, GameState, Setup
+from game.play import apply_move
+from game.record import GameRecord, replay
+
+
+def positions_to_move_from(num_games, options=GameOptions()):
+    for seed in range(num_games):
+        game_state = GameState.from_num_players(2, seed=seed, options=options)
+        agent = RandomAgent(np.random.default_rng(seed))
+        while not game_state.is_over():
+            if isinstance(game_state.action_stack.first, (MoveOnePiece, MacroMoveOnePiece)):
+                yield game_state
+            game_state = apply_move(game_state, agent.select_move(game_state))
+
+
+# Every position reachable by moving one piece a choice at a time, up to the point where the piece is done
+def micro_outcomes(game_state):
+    below = game_state.action_stack.rest
+    outcomes = []
+
+    def visit(game_state):
+        for choice in game_state.action_stack.first.choices(game_state) or [None]:
+            next_state = movement.step(game_state, choice, below)
+            if next_state.action_stack is below:
+                outcomes.append(next_state)
+            else:
+                visit(next_state)
+
+    visit(game_state)
+    return outcomes
+
+
+def same_position(a, b):
+    return a.pieces_by_key == b.pieces_by_key and a.board == b.board and a.players_by_idx == b.players_by_idx \
+        and a.spaces_entered_this_turn == b.spaces_entered_this_turn
+
+
+def test_same_outcomes_as_moving_step_by_step():
+    checked = 0
+    for game_state in positions_to_move_from(6):
+        macro_moves = movement.macro_moves(game_state, game_state.action_stack.first)
+        if len(macro_moves) > 40 or any(len(macro_move) == 1 for macro_move in macro_moves):
+            continue
+        below = game_state.action_stack.rest
+        macro_outcomes = [movement.play_macro_move(attr.evolve(game_state, action_stack=below),
+                                                   game_state.action_stack.first, macro_move)
+                          for macro_move in macro_moves]
+        outcomes = micro_outcomes(game_state)
+        assert len(outcomes) >= len(macro_outcomes)
+        for outcome in outcomes:
+            assert any(same_position(outcome, macro_outcome) for macro_outcome in macro_outcomes)
+        for i, macro_outcome in enumerate(macro_outcomes):
+            assert not any(same_position(macro_outcome, other) for other in macro_outcomes[i + 1:])
+        checked += 1
+    assert checked > 20
+
+
+# Making a macro move is the same as making its choices one at a time
+def test_macro_move_is_its_choices():
+    options = GameOptions(macro_moves=True)
+    checked = 0
+    for game_state in positions_to_move_from(4, options):
+        choices = game_state.legal_moves()
+        if not choices:
+            continue
+        macro_move = choices[len(choices) // 2]
+        step_by_step = attr.evolve(game_state, action_stack=game_state.action_stack.rest.cons(MoveOnePiece.new()))
+        for choice in macro_move:
+            step_by_step = apply_move(step_by_step, choice)
+        assert apply_move(game_state, macro_move) == step_by_step
+        checked += 1
+    assert checked > 10
+
+
+def play(seed, options):
+    setup = Setup.random(2, np.random.default_rng(seed), options)
+    game_state = GameState.from_setup(setup)
+    agent = RandomAgent(np.random.default_rng(seed))
+    record = GameRecord.new(setup)
+    while not game_state.is_over():
+        choices = game_state.legal_moves()
+        move = agent.select_move(game_state)
+        if choices and len(choices) > 1:
+            record.record_move(choices, move)
+        game_state = apply_move(game_state, move)
+    return record, game_state
+
+
+def test_games_with_macro_moves():
+    options = GameOptions(macro_moves=True)
+    decisions = {}
+    for seed in range(4):
+        record, game_state = play(seed, options)
+        decisions[seed] = len(record), len(play(seed, GameOptions())[0])
+        record = GameRecord.from_bytes(record.to_bytes())
+        assert record.setup.options == options
+        for replayed_state, _ in replay(record):
+            pass
+        assert replayed_state.winner == game_state.winner
+        assert replayed_state.player_scores == game_state.player_scores
+    assert sum(macro for macro, _ in decisions.values()) < sum(micro for _, micro in decisions.values())
+
+
+def run_tests():
+    test_same_outcomes_as_moving_step_by_step()
+    test_macro_move_is_its_choices()
+    test_games_with_macro_moves()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
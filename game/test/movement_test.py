@@ -0,0 +1,100 @@
+import attr
+import numpy as np
+
+from agents import RandomAgent
+from game import movement, state_change as sc
+from game.components import piece as gc_piece
+from game.game_state import GameState
+from game.play import apply_move
+
+NUM_GAMES = 10
+
+
+# What [MoveOnePiece] offered before [game.movement]
+def movable_pieces_uncached(game_state):
+    current_player = sc.get_current_player(game_state)
+    return [board_coords_and_piece_typ
+            for board_coords_and_piece_typ in sc.movable_pieces(game_state, current_player)
+            if sc.controller(game_state, game_state.board.get_space(board_coords_and_piece_typ[0]))
+            is current_player.faction_name()]
+
+
+def piece_keys(game_state, player):
+    faction_name = player.faction_name()
+    return [gc_piece.character_key(faction_name)] + \
+           [gc_piece.mech_key(faction_name, mech_id) for mech_id in player.mech_ids] + \
+           [gc_piece.worker_key(faction_name, worker_id) for worker_id in player.worker_ids]
+
+
+def test_matches_uncached():
+    for seed in range(NUM_GAMES):
+        game_state = GameState.from_num_players(2, seed=seed)
+        agent = RandomAgent(np.random.default_rng(seed))
+        while not game_state.is_over():
+            expected = movable_pieces_uncached(game_state)
+            assert movement.movable_pieces(game_state) == expected
+            # The second time comes from the cache
+            assert movement.movable_pieces(game_state) == expected
+            for player in game_state.players_by_idx:
+                for piece_key in piece_keys(game_state, player):
+                    assert movement.effective_adjacent_space_coords(game_state, piece_key) == \
+                        sc.effective_adjacent_space_coords(game_state, piece_key)
+            game_state = apply_move(game_state, agent.select_move(game_state))
+
+
+# Plays [NUM_GAMES] random games, looking up where each of the current player's pieces can go in every position that's
+# partway through moving a piece, and returns the number of times that was worked out from scratch
+def count_adjacency_lookups():
+    uncached = sc.effective_adjacent_space_coords
+    count = 0
+
+    def counting(game_state, piece_key):
+        nonlocal count
+        count += 1
+        return uncached(game_state, piece_key)
+
+    sc.effective_adjacent_space_coords = counting
+    try:
+        for seed in range(NUM_GAMES):
+            game_state = GameState.from_num_players(2, seed=seed)
+            agent = RandomAgent(np.random.default_rng(seed))
+            while not game_state.is_over():
+                if game_state.action_stack.first.steps_piece:
+                    for piece_key in piece_keys(game_state, sc.get_current_player(game_state)):
+                        movement.effective_adjacent_space_coords(game_state, piece_key)
+                game_state = apply_move(game_state, agent.select_move(game_state))
+    finally:
+        sc.effective_adjacent_space_coords = uncached
+    return count
+
+
+# Pieces that stay where they are during a multi-step move don't have their adjacencies worked out again at each step
+def test_carried_over():
+    carried = count_adjacency_lookups()
+    carry_over = movement.carry_over
+    movement.carry_over = lambda old, new: None
+    try:
+        not_carried = count_adjacency_lookups()
+    finally:
+        movement.carry_over = carry_over
+    assert carried < not_carried / 2, (carried, not_carried)
+
+
+def test_not_passed_on():
+    game_state = GameState.from_num_players(2, seed=0)
+    movement.movable_pieces(game_state)
+    assert game_state.movement is not None
+    assert attr.evolve(game_state).movement is None
+    movement.forget(game_state)
+    assert game_state.movement is None
+
+
+def run_tests():
+    test_matches_uncached()
+    test_carried_over()
+    test_not_passed_on()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,58 @@
+import pickle
+
+import numpy as np
+
+from agents import RandomAgent
+from game.actions import Optional
+from game.actions.action import _new_args_by_id
+from game.actions.movegain import LoadAndMovePiece, MoveOnePiece
+from game.components import piece as gc_piece
+from game.game_state import GameState
+from game.play import apply_move
+from game.types import FactionName
+
+NUM_GAMES = 3
+
+
+def round_trip(x):
+    return pickle.loads(pickle.dumps(x))
+
+
+def test_piece_keys_stay_interned():
+    key = gc_piece.worker_key(FactionName.RUSVIET, 3)
+    assert round_trip(key) is key
+    assert round_trip(gc_piece.character_key(FactionName.SAXONY)) is gc_piece.character_key(FactionName.SAXONY)
+
+
+def test_actions_stay_interned():
+    action = Optional.new(LoadAndMovePiece.new(gc_piece.worker_key(FactionName.RUSVIET, 3)))
+    assert round_trip(action) is action
+    assert round_trip(MoveOnePiece.new()) is MoveOnePiece.new()
+
+
+def test_game_states():
+    for seed in range(NUM_GAMES):
+        game_state = GameState.from_num_players(2, seed=seed)
+        agent = RandomAgent(np.random.default_rng(seed))
+        while not game_state.is_over():
+            unpickled = round_trip(game_state)
+            assert unpickled == game_state
+            for piece_key in unpickled.pieces_by_key:
+                assert piece_key is gc_piece.piece_key(piece_key.piece_typ, piece_key.faction_name, piece_key.id)
+            for action, unpickled_action in zip(game_state.action_stack, unpickled.action_stack):
+                # Actions that weren't made by an [interned] [new], like ones that have been through [attr.evolve],
+                # come back as equal copies
+                if id(action) in _new_args_by_id:
+                    assert unpickled_action is action
+            game_state = apply_move(game_state, agent.select_move(game_state))
+
+
+def run_tests():
+    test_piece_keys_stay_interned()
+    test_actions_stay_interned()
+    test_game_states()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
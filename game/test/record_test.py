@@ -0,0 +1,82 @@
+import numpy as np
+import os
+import tempfile
+
+from agents.mcts_zero import experience_collectors_from_record
+from game import record
+from game.game_state import GameState, Setup
+from game.play import apply_move
+
+NUM_GAMES = 3
+
+
+# Plays a game with uniformly random moves, recording it as it goes along with made-up visit counts
+def play_and_record(rng):
+    setup = Setup.random(2, rng)
+    game_state = GameState.from_setup(setup)
+    game_record = record.GameRecord.new(setup, with_visits=True)
+    states = []
+    while not game_state.is_over():
+        choices = game_state.legal_moves()
+        if not choices:
+            move = None
+        elif len(choices) == 1:
+            move = choices[0]
+        else:
+            states.append(game_state)
+            move = choices[rng.integers(len(choices))]
+            game_record.record_move(choices, move, rng.integers(5, size=len(choices)))
+        game_state = apply_move(game_state, move)
+    return game_record, states, game_state
+
+
+def test_round_trip():
+    rng = np.random.default_rng(0)
+    games = [play_and_record(rng) for _ in range(NUM_GAMES)]
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'games')
+        for game_record, _, _ in games:
+            record.append(path, game_record)
+        records = list(record.read(path))
+
+    assert len(records) == NUM_GAMES
+    for (game_record, states, final_state), read_back in zip(games, records):
+        assert read_back.setup == game_record.setup
+        assert read_back.moves == game_record.moves
+        for visits, read_visits in zip(game_record.visits, read_back.visits):
+            assert (visits == read_visits).all()
+        replayed = [game_state for game_state, _ in record.positions(read_back)]
+        assert replayed == states
+        replayed_final_state = record.final_state(read_back)
+        assert replayed_final_state == final_state
+        assert replayed_final_state.winner is final_state.winner
+
+
+def test_experience_from_record():
+    game_record, states, final_state = play_and_record(np.random.default_rng(1))
+    experience_collectors = experience_collectors_from_record(game_record)
+    assert sum(len(c.game_states) for c in experience_collectors.values()) == len(states)
+    for experience_collector in experience_collectors.values():
+        assert experience_collector.winner is final_state.winner
+        experience_collector.to_sparse()
+
+
+def test_without_visits():
+    setup = Setup.random(2)
+    game_record = record.GameRecord.new(setup)
+    game_record.moves = [1, 0, 2]
+    read_back = record.GameRecord.from_bytes(game_record.to_bytes())
+    assert read_back.visits is None
+    assert read_back.moves == [1, 0, 2]
+    assert read_back.setup == setup
+
+
+def run_tests():
+    test_round_trip()
+    test_experience_from_record()
+    test_without_visits()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,79 @@
+import attr
+import numpy as np
+
+import game.components.structure_bonus as gc_structure_bonus
+import game.state_change as sc
+from agents import RandomAgent
+from game import scoring
+from game.game_state import GameState
+from game.play import apply_move
+from game.types import StructureType, TerrainType
+
+
+# What [play.finalize] added up before [game.scoring]
+def slow_scores(game_state):
+    structure_bonus_scores = gc_structure_bonus.score(game_state.structure_bonus, game_state.board)
+    return [player.score(game_state) + structure_bonus_scores.get(player.faction_name(), 0)
+            for player in game_state.players_by_idx]
+
+
+def positions(num_games):
+    for seed in range(num_games):
+        game_state = GameState.from_num_players(2, seed=seed)
+        agent = RandomAgent(np.random.default_rng(seed))
+        while not game_state.is_over():
+            yield game_state
+            game_state = apply_move(game_state, agent.select_move(game_state))
+        yield game_state
+
+
+# Random play hardly ever builds anything, so put structures down at random to give the structure bonuses something to
+# count
+def with_random_structures(game_state, rng):
+    spaces = [space.coords for space in game_state.board.board_spaces_by_coords.values()
+              if space.terrain_typ not in (TerrainType.HOME_BASE, TerrainType.LAKE) and not space.has_structure()]
+    spaces = [spaces[i] for i in rng.permutation(len(spaces))]
+    for player_idx in range(len(game_state.players_by_idx)):
+        for structure_typ in StructureType:
+            player = game_state.players_by_idx[player_idx]
+            if structure_typ in player.structures or rng.random() < 0.3:
+                continue
+            game_state = sc.build_structure(game_state, player, spaces.pop(), structure_typ)
+    return game_state
+
+
+def test_same_scores():
+    for game_state in positions(4):
+        assert scoring.scores(game_state).tolist() == slow_scores(game_state)
+
+
+def test_same_structure_bonus_scores():
+    rng = np.random.default_rng(0)
+    for i, game_state in enumerate(positions(2)):
+        if i % 20:
+            continue
+        game_state = with_random_structures(game_state, rng)
+        for structure_bonus in gc_structure_bonus.StructureBonus:
+            game_state = attr.evolve(game_state, structure_bonus=structure_bonus)
+            assert scoring.scores(game_state).tolist() == slow_scores(game_state)
+
+
+def test_win_probabilities():
+    for i, game_state in enumerate(positions(1)):
+        if i % 50:
+            continue
+        scores = scoring.scores(game_state)
+        probabilities = scoring.win_probabilities(game_state, 10)
+        assert np.isclose(probabilities.sum(), 1)
+        assert np.isclose(probabilities[0], 1 / (1 + np.exp((scores[1] - scores[0]) / 10)))
+
+
+def run_tests():
+    test_same_scores()
+    test_same_structure_bonus_scores()
+    test_win_probabilities()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
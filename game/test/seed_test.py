@@ -0,0 +1,73 @@
+import attr
+import numpy as np
+import os
+import subprocess
+import sys
+
+from agents import RandomAgent
+from game import state_change as sc
+from game.components.combat_cards import CombatCards
+from game.game_state import GameState
+from game.play import apply_move
+from game.types import Benefit
+
+from pyrsistent import pvector
+
+
+def play(seed):
+    game_state = GameState.from_num_players(2, seed=seed)
+    agent = RandomAgent(np.random.default_rng(seed))
+    moves = []
+    while not game_state.is_over():
+        move = agent.select_move(game_state)
+        moves.append(move)
+        game_state = apply_move(game_state, move)
+    return moves, game_state
+
+
+def test_same_seed_same_game():
+    moves, final_state = play(7)
+    same_moves, same_final_state = play(7)
+    assert moves == same_moves
+    assert final_state == same_final_state
+    assert GameState.from_num_players(2, seed=7) != GameState.from_num_players(2, seed=8)
+
+
+# Nothing about a game may depend on the process it's played in, e.g. through the iteration order of a set of objects
+# whose hashes differ between processes
+def test_same_game_in_every_process():
+    def moves_in_subprocess(hash_seed):
+        env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+        return subprocess.run([sys.executable, '-c', 'from game.test.seed_test import play; print(play(11)[0])'],
+                              env=env, capture_output=True, text=True, check=True).stdout
+    assert moves_in_subprocess(1) == moves_in_subprocess(2)
+
+
+# Drawing from an empty deck reshuffles the discard pile, which has to come out the same from the same game state no
+# matter what else has been drawn from the game's randomness in the meantime
+def test_reshuffle_depends_only_on_game_state():
+    game_state = GameState.from_num_players(2, seed=3)
+    game_state = attr.evolve(game_state, combat_cards=CombatCards(pvector(), pvector([2, 3, 4, 5] * 4)))
+    player = sc.get_current_player(game_state)
+
+    def draw():
+        after = sc.give_reward_to_player(game_state, player, Benefit.COMBAT_CARDS, 5)
+        return after.combat_cards, after.random_draws
+
+    first = draw()
+    assert first[1] == game_state.random_draws + 1
+    assert len(first[0].deck) == 11
+    for _ in range(3):
+        assert draw() == first
+    assert game_state.rng()[1].random() == game_state.rng()[1].random()
+
+
+def run_tests():
+    test_same_seed_same_game()
+    test_same_game_in_every_process()
+    test_reshuffle_depends_only_on_game_state()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -3,7 +3,15 @@ import game.constants as constants
 from enum import Enum
 
 
-class Benefit(Enum):
+# Enum members hash by name, and string hashes change from one process to the next, so iterating over a set or map
+# keyed by them would give a different order in every process. Hashing by value keeps a seeded game the same wherever
+# it's played or replayed. [_value_] is what the [value] property returns, without going through the property.
+class GameEnum(Enum):
+    def __hash__(self):
+        return hash(self._value_)
+
+
+class Benefit(GameEnum):
     POWER = 0
     POPULARITY = 1
     COMBAT_CARDS = 2
@@ -22,7 +30,7 @@ class Benefit(Enum):
         assert False
 
 
-class BottomActionType(Enum):
+class BottomActionType(GameEnum):
     UPGRADE = 0
     DEPLOY = 1
     BUILD = 2
@@ -41,14 +49,14 @@ class BottomActionType(Enum):
         assert False
 
 
-class TopActionType(Enum):
+class TopActionType(GameEnum):
     MOVEGAIN = 0
     BOLSTER = 1
     PRODUCE = 2
     TRADE = 3
 
 
-class FactionName(Enum):
+class FactionName(GameEnum):
     RUSVIET = 0
     CRIMEA = 1
     NORDIC = 2
@@ -70,7 +78,7 @@ class FactionName(Enum):
         assert False
 
 
-class PieceType(Enum):
+class PieceType(GameEnum):
     WORKER = 0
     MECH = 1
     CHARACTER = 2
@@ -101,14 +109,14 @@ class PieceType(Enum):
         assert False
 
 
-class MechType(Enum):
+class MechType(GameEnum):
     RIVERWALK = 0
     TELEPORT = 1
     COMBAT = 2
     SPEED = 3
 
 
-class StructureType(Enum):
+class StructureType(GameEnum):
     MILL = 0
     MONUMENT = 1
     MINE = 2
@@ -152,7 +160,7 @@ class StructureType(Enum):
         assert False
 
 
-class PlayerMatName(Enum):
+class PlayerMatName(GameEnum):
     INDUSTRIAL = 0
     ENGINEERING = 1
     PATRIOTIC = 2
@@ -174,7 +182,7 @@ class PlayerMatName(Enum):
         assert False
 
 
-class ResourceType(Enum):
+class ResourceType(GameEnum):
     WOOD = 0
     METAL = 1
     OIL = 2
@@ -193,7 +201,7 @@ class ResourceType(Enum):
         assert False
 
 
-class StarType(Enum):
+class StarType(GameEnum):
     UPGRADE = 0
     MECH = 1
     STRUCTURE = 2
@@ -230,7 +238,7 @@ class StarType(Enum):
         return self.__str__()
 
 
-class TerrainType(Enum):
+class TerrainType(GameEnum):
     MOUNTAIN = 0
     TUNDRA = 1
     FARM = 2
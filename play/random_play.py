@@ -0,0 +1,175 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import game.record as record_io
+from game.game_state import GameOptions, GameState, Setup
+from game.play import apply_move
+from game.record import GameRecord
+
+
+# Uniform random numbers drawn from a numpy [Generator] a block at a time. Asking the generator for one number per move
+# costs several microseconds, more than some of the moves themselves.
+class BufferedUniform:
+    BLOCK_SIZE = 4096
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.block = []
+        self.i = 0
+
+    def random(self):
+        if self.i == len(self.block):
+            self.block = self.rng.random(self.BLOCK_SIZE).tolist()
+            self.i = 0
+        self.i += 1
+        return self.block[self.i - 1]
+
+    # An index into a sequence of length [n]
+    def index(self, n):
+        return int(self.random() * n)
+
+
+def check_invariants(game_state):
+    game_state.board.invariant(game_state)
+    for player in game_state.players_by_idx:
+        player.invariant(game_state)
+
+
+# Plays one game with every player choosing uniformly at random. The chosen indices are exactly what a [GameRecord]
+# stores, so the record is kept as the game goes rather than by looking each move up again afterwards. Positions are
+# checked against [Board.invariant] and [Player.invariant] with probability [invariant_rate], drawn from [checks] so
+# that checking doesn't change the games that are played. If a check or the engine fails, the exception is raised with
+# the record of the game up to that point as [e.record].
+def play_random_game(setup, uniform, invariant_rate=0.0, checks=None):
+    game_state = GameState.from_setup(setup)
+    record = GameRecord.new(setup)
+    try:
+        while not game_state.is_over():
+            if invariant_rate and checks.random() < invariant_rate:
+                check_invariants(game_state)
+            choices = game_state.action_stack.first.choices(game_state)
+            if not choices:
+                move = None
+            elif len(choices) == 1:
+                move = choices[0]
+            else:
+                i = uniform.index(len(choices))
+                record.moves.append(i)
+                move = choices[i]
+            game_state = apply_move(game_state, move)
+        if invariant_rate:
+            check_invariants(game_state)
+    except Exception as e:
+        e.record = record
+        raise
+    return record, game_state
+
+
+# Where a worker's games go: the records of finished games, the records of failed ones, and the failures' tracebacks
+def output_paths(output_dir, worker_id):
+    return (os.path.join(output_dir, f'random-{worker_id}.rec'), os.path.join(output_dir, f'failures-{worker_id}.rec'),
+            os.path.join(output_dir, f'failures-{worker_id}.txt'))
+
+
+def describe(e):
+    return f'{type(e).__name__}: {e}'
+
+
+# Plays [num_games] games in this process, streaming each record to [output_dir] (if given) as soon as the game ends.
+# Games that fail are logged and go to separate files, with the moves up to the failure and the traceback, and play
+# carries on with the next one. The results count each distinct error.
+def run_worker(worker_id, *, num_games, num_players=2, seed=0, invariant_rate=0.0, output_dir=None,
+               options=GameOptions()):
+    rng = np.random.default_rng([seed, worker_id])
+    uniform = BufferedUniform(rng)
+    checks = BufferedUniform(np.random.default_rng([seed, worker_id, 1]))
+    records_path, failures_path, tracebacks_path = output_paths(output_dir, worker_id) if output_dir \
+        else (None, None, None)
+    games = turns = failures = failed_records = 0
+    errors = collections.Counter()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for game_num in range(num_games):
+        setup = Setup.random(num_players, rng, options)
+        try:
+            record, game_state = play_random_game(setup, uniform, invariant_rate, checks)
+        except Exception as e:
+            logging.exception(f'Worker {worker_id} failed in game {game_num}')
+            failures += 1
+            errors[describe(e)] += 1
+            if failures_path:
+                if hasattr(e, 'record'):
+                    record_io.append(failures_path, e.record)
+                    failed_records += 1
+                    where = f'record {failed_records - 1} of {os.path.basename(failures_path)}'
+                else:
+                    where = 'no record'
+                with open(tracebacks_path, 'a') as f:
+                    f.write(f'Game {game_num} of worker {worker_id} ({where}):\n{traceback.format_exc()}\n')
+            continue
+        games += 1
+        turns += game_state.num_turns
+        if records_path:
+            record_io.append(records_path, record)
+    return {'games': games, 'failures': failures, 'errors': dict(errors), 'turns': turns,
+            'seconds': time.perf_counter() - start, 'cpu_seconds': time.process_time() - cpu_start}
+
+
+# Splits [num_games] between [num_workers] processes. Games per second per core is worked out from the CPU time the
+# workers actually got, so it stays comparable when there are more workers than cores.
+def run(*, num_games, num_workers, num_players=2, seed=0, invariant_rate=0.0, output_dir=None, options=GameOptions()):
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    games_per_worker = [num_games // num_workers + (i < num_games % num_workers) for i in range(num_workers)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(run_worker, worker_id, num_games=n, num_players=num_players, seed=seed,
+                                   invariant_rate=invariant_rate, output_dir=output_dir, options=options)
+                   for worker_id, n in enumerate(games_per_worker)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    games = sum(r['games'] for r in results)
+    cpu_seconds = sum(r['cpu_seconds'] for r in results)
+    return {
+        'params': {'num_games': num_games, 'num_workers': num_workers, 'num_players': num_players, 'seed': seed,
+                   'invariant_rate': invariant_rate, 'macro_moves': options.macro_moves,
+                   'bucketed_cargo': options.bucketed_cargo},
+        'seconds': elapsed,
+        'games': games,
+        'failures': sum(r['failures'] for r in results),
+        'errors': dict(sum((collections.Counter(r['errors']) for r in results), collections.Counter())),
+        'games_per_second': games / elapsed,
+        'games_per_second_per_core': games / max(cpu_seconds, 1e-9),
+        'turns_per_game': sum(r['turns'] for r in results) / max(games, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play random games across a process pool, to fuzz the rules and to '
+                                                 'generate bootstrap data')
+    parser.add_argument('--num-games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--num-players', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--invariant-rate', type=float, default=0.0,
+                        help='Fraction of positions to check against the board and player invariants')
+    parser.add_argument('--output-dir', help='Append the game records to files in this directory, one per worker')
+    parser.add_argument('--macro-moves', action='store_true')
+    parser.add_argument('--bucketed-cargo', action='store_true')
+    args = parser.parse_args(argv)
+    results = run(num_games=args.num_games, num_workers=args.workers, num_players=args.num_players, seed=args.seed,
+                  invariant_rate=args.invariant_rate, output_dir=args.output_dir,
+                  options=GameOptions(macro_moves=args.macro_moves, bucketed_cargo=args.bucketed_cargo))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
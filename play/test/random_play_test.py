@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import numpy as np
+
+import game.record as record_io
+from game.game_state import GameOptions, Setup
+from play import random_play
+
+
+def test_records_replay():
+    rng = np.random.default_rng(0)
+    uniform = random_play.BufferedUniform(rng)
+    checks = random_play.BufferedUniform(np.random.default_rng(1))
+    for options in (GameOptions(), GameOptions(macro_moves=True, bucketed_cargo=True)):
+        for _ in range(3):
+            record, game_state = random_play.play_random_game(Setup.random(2, rng, options), uniform, 0.1, checks)
+            record = record_io.GameRecord.from_bytes(record.to_bytes())
+            assert record_io.final_state(record).player_scores == game_state.player_scores
+
+
+def test_worker_streams_records():
+    with tempfile.TemporaryDirectory() as output_dir:
+        result = random_play.run_worker(3, num_games=4, seed=1, invariant_rate=0.05, output_dir=output_dir)
+        assert result['games'] == 4 and result['failures'] == 0
+        records_path, failures_path, tracebacks_path = random_play.output_paths(output_dir, 3)
+        records = list(record_io.read(records_path))
+        assert not os.path.exists(failures_path) and not os.path.exists(tracebacks_path)
+        # The same seed and worker id play the same games, whether or not they're checked
+        random_play.run_worker(3, num_games=4, seed=1, output_dir=output_dir)
+        again = list(record_io.read(records_path))[len(records):]
+        assert [r.to_bytes() for r in again] == [r.to_bytes() for r in records]
+
+
+def broken_invariant(game_state):
+    if game_state.num_turns >= 3:
+        raise AssertionError('broken invariant')
+
+
+# Every game fails a few turns in; each failure should leave its record, its traceback and its error behind
+def test_worker_keeps_failures():
+    check_invariants = random_play.check_invariants
+    random_play.check_invariants = broken_invariant
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = random_play.run_worker(0, num_games=2, invariant_rate=1.0, output_dir=output_dir)
+            assert result['games'] == 0 and result['failures'] == 2
+            assert result['errors'] == {'AssertionError: broken invariant': 2}
+            _, failures_path, tracebacks_path = random_play.output_paths(output_dir, 0)
+            assert all(record.moves for record in record_io.read(failures_path))
+            assert len(list(record_io.read(failures_path))) == 2
+            with open(tracebacks_path) as f:
+                tracebacks = f.read()
+            assert tracebacks.count('AssertionError: broken invariant') == 2
+            assert 'Game 1 of worker 0 (record 1 of failures-0.rec)' in tracebacks
+    finally:
+        random_play.check_invariants = check_invariants
+
+
+def run_tests():
+    test_records_replay()
+    test_worker_streams_records()
+    test_worker_keeps_failures()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -3,6 +3,8 @@ import encoders.game_state as enc_gs
 import game.constants as constants
 from training.constants import Head
 
+import numpy as np
+
 
 def decode_boolean(choice):
     return 1 if choice else 0
@@ -91,7 +93,7 @@ model_head_by_action_class = {
     LoadResources: Head.NUM_RESOURCES_HEAD,
     LoadWorkers: Head.NUM_WORKERS_HEAD,
     MovePieceOneSpace: Head.BOARD_COORDS_HEAD,
-    # MoveOnePiece not included, since it combines two heads
+    # MoveOnePiece and MacroMoveOnePiece not included, since they combine two heads, nor LoadCargo, which has none
     ChooseNumWorkers: Head.NUM_WORKERS_HEAD,
     OnOneHex: Head.BOARD_COORDS_HEAD,
     Produce: Head.MAYBE_PAY_COST_HEAD,
@@ -104,25 +106,52 @@ model_head_by_action_class = {
 }
 
 
+# Where each of [choices] goes in the output head for [top_action_class], as an array in the same order
+def head_indices(top_action_class, choices):
+    decoder = decoders[top_action_class]
+    return np.fromiter((decoder(choice) for choice in choices), dtype=np.int64, count=len(choices))
+
+
+def board_coords_and_piece_typ_indices(choices):
+    board_coords_indices = np.fromiter((decode_board_space(board_coords) for board_coords, _ in choices),
+                                       dtype=np.int64, count=len(choices))
+    piece_typ_indices = np.fromiter((piece_typ.value for _, piece_typ in choices), dtype=np.int64, count=len(choices))
+    return board_coords_indices, piece_typ_indices
+
+
+# Move priors are arrays in the same order as the choices they're for, so that a move can be referred to by its index
+# in [GameState.legal_moves] (as [game.record] already does) and only turned back into a choice when it's played
 def get_board_coords_and_piece_typ_priors(choices, board_coord_preds, piece_typ_preds):
-    move_priors = {}
-    for board_coords, piece_typ in choices:
-        move_priors[(board_coords, piece_typ)] = board_coord_preds[decode_board_space(board_coords)]\
-            * piece_typ_preds[piece_typ.value]
-    return move_priors
+    board_coords_indices, piece_typ_indices = board_coords_and_piece_typ_indices(choices)
+    return board_coord_preds[board_coords_indices] * piece_typ_preds[piece_typ_indices]
+
+
+# There's no head for a whole sequence of moves, so each piece gets its prior as for [MoveOnePiece] and that's split
+# evenly between the ways of moving it
+def get_macro_move_priors(choices, board_coord_preds, piece_typ_preds):
+    pieces = {}
+    piece_indices = np.fromiter((pieces.setdefault(macro_move[0], len(pieces)) for macro_move in choices),
+                                dtype=np.int64, count=len(choices))
+    piece_priors = get_board_coords_and_piece_typ_priors(list(pieces), board_coord_preds, piece_typ_preds)
+    return (piece_priors / np.bincount(piece_indices))[piece_indices]
 
 
 def get_move_priors(preds, top_action_class, choices):
     if top_action_class is MoveOnePiece:
         return get_board_coords_and_piece_typ_priors(choices, preds[Head.BOARD_COORDS_HEAD.value],
                                                      preds[Head.PIECE_TYP_HEAD.value])
+    elif top_action_class is MacroMoveOnePiece:
+        return get_macro_move_priors(choices, preds[Head.BOARD_COORDS_HEAD.value], preds[Head.PIECE_TYP_HEAD.value])
+    elif top_action_class is LoadCargo:
+        # No head says anything about a combination of amounts, so the search starts out with no preference
+        return np.full(len(choices), 1 / len(choices))
     else:
         head = preds[model_head_by_action_class[top_action_class].value]
-        decoder = decoders[top_action_class]
+        indices = head_indices(top_action_class, choices)
         try:
-            return {choice: head[decoder(choice)] for choice in choices}
+            return head[indices]
         except IndexError:
             print(f'IndexError from {top_action_class}')
-            for choice in choices:
-                print(f'Choice: {choice}; Decoded: {decoder(choice)}')
+            for choice, index in zip(choices, indices):
+                print(f'Choice: {choice}; Decoded: {index}')
             assert False
@@ -1,88 +1,207 @@
 import asyncio
+import attr
 import cProfile
-import os
-import uvloop
+import numpy as np
+import threading
 
-from training.model import load as load_model
+from training import metrics
+from training.metrics import Counter, Phase
+from training.model import load as load_model, version as model_version
+from training.constants import Head
 from training.shared_memory_manager import SharedMemoryManager, View, DataType, get_boards_shape, get_data_shape, get_preds_shape
-from training.worker_env_conn import WorkerEnvConn
 
 
-def set_up_evaluator(num_envs, num_slots, model_base_path, in_test=False):
-    if not in_test:
-        os.nice(-20)
-    # if not in_test:
-    #     param = os.sched_param(os.sched_get_priority_max(os.SCHED_FIFO))
-    #     os.sched_setscheduler(0, os.SCHED_FIFO, param)
+MODEL_POLL_SECONDS = 10
+
+
+# Keeps the newest weights from [model_base_path] available to the evaluator. A background thread polls the model
+# file, but the loading happens in [current], which the evaluator calls once per batch: with eager execution off,
+# TensorFlow's default graph belongs to the thread, so a model loaded anywhere else couldn't predict. A batch is never
+# split across two models.
+@attr.s(slots=True)
+class ModelWatcher:
+    model_base_path = attr.ib()
+    nn = attr.ib()
+    version = attr.ib()
+    poll_seconds = attr.ib(default=MODEL_POLL_SECONDS)
+    # Takes [model_base_path] and returns the model saved there
+    load = attr.ib(default=load_model)
+    # The newest version the polling thread has seen
+    latest_version = attr.ib(default=None)
+    stopped = attr.ib(factory=threading.Event)
+
+    @classmethod
+    def start(cls, model_base_path, poll_seconds=MODEL_POLL_SECONDS, load=load_model):
+        version = model_version(model_base_path)
+        watcher = cls(model_base_path, load(model_base_path), version, poll_seconds, load, version)
+        threading.Thread(target=watcher.watch, daemon=True).start()
+        return watcher
+
+    def current(self):
+        latest_version = self.latest_version
+        if latest_version != self.version:
+            try:
+                self.nn = self.load(self.model_base_path)
+            except (OSError, ValueError) as e:
+                print(f'Evaluator failed to load new weights from {self.model_base_path}: {e}')
+                # Try again after the next poll rather than on every batch
+                self.latest_version = self.version
+            else:
+                self.version = latest_version
+                print(f'Evaluator loaded model version {latest_version} from {self.model_base_path}')
+        return self.version, self.nn
+
+    def stop(self):
+        self.stopped.set()
+
+    def watch(self):
+        while not self.stopped.wait(self.poll_seconds):
+            self.latest_version = model_version(self.model_base_path)
+
+
+def set_up_evaluator(num_envs, num_slots, model_base_path):
+    views, watchers = set_up_multi_model_evaluator(num_envs, num_slots, [model_base_path])
+    return views, watchers[0]
+
+
+# Scheduling priority and CPU affinity are set by the orchestrator, which knows where everything else is running
+def set_up_multi_model_evaluator(num_envs, num_slots, model_base_paths):
     # An environment is a group of workers and a single index. Each worker will be simulating multiple
     # games sequentially; it will put game states from game N into environment N.
-    from training import model
-    import tensorflow as tf
-    # import time
-    physical_devices = tf.config.list_physical_devices('GPU')
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
-    tf.compat.v1.disable_eager_execution()
     # Set up shared memory buffers. Each contains all of the memory for one data type in a single environment.
     # Each element of preds will be a list of arrays corresponding to each model head.
     views = [View.for_evaluator(env=SharedMemoryManager.make_env(env_id), num_slots=num_slots) for env_id in range(num_envs)]
     for view in views:
         assert view.boards.shape == get_boards_shape(num_slots)
         assert view.data.shape == get_data_shape(num_slots)
-    nn = load_model(model_base_path)
-    return views, nn
+    return views, start_watchers(model_base_paths)
+
 
+def start_watchers(model_base_paths):
+    import tensorflow as tf
+    for physical_device in tf.config.list_physical_devices('GPU'):
+        tf.config.experimental.set_memory_growth(physical_device, True)
+    tf.compat.v1.disable_eager_execution()
+    return [ModelWatcher.start(model_base_path) for model_base_path in model_base_paths]
 
-def evaluator(num_envs, num_slots, model_base_path, in_test=False):
-    views, nn = set_up_evaluator(num_envs, num_slots, model_base_path, in_test)
+
+def evaluator(num_envs, num_slots, model_base_path):
+    views, watcher = set_up_evaluator(num_envs, num_slots, model_base_path)
+    evaluate_forever(views, watcher.current, num_slots)
+
+
+# [current_model] returns the version and the model to use for the next batch. Anything with a Keras-style [predict]
+# will do, which is how the benchmarks run without TensorFlow.
+def evaluate_forever(views, current_model, num_slots):
     while True:
         for env_id, view in enumerate(views):
+            t = metrics.start()
             view.wait_for_boards()
             view.wait_for_data()
-            predictions = nn.predict([view.boards, view.data], batch_size=num_slots)
+            metrics.stop(Phase.BATCH_WAIT, t)
+            evaluate(view, current_model, num_slots)
+
+
+# The number of [slots] that wrote a request for this batch. Slots that have retired still go through the model, but
+# nobody asked for their predictions.
+def num_requests(view, slots=slice(None)):
+    return int(np.count_nonzero(view.dirty[slots, DataType.BOARDS.value]))
+
+
+# Runs a full batch of requests through the model and publishes the predictions
+def evaluate(view, current_model, num_slots):
+    t = metrics.start()
+    version, nn = current_model()
+    predictions = nn.predict([view.boards, view.data], batch_size=num_slots)
+    metrics.stop(Phase.PREDICT, t)
+    metrics.increment(Counter.REQUESTS, num_requests(view))
+    view.write_boards_clean()
+    view.write_data_clean()
+    for slot in range(num_slots):
+        assert view.dirty[slot, DataType.PREDS.value] == 0
+    view.write_preds(predictions, version)
+
+
+# Serves several models out of the same environments, e.g. for arena matches between the current model and a
+# candidate. Each slot tells us which model it wants through [view.model_ids]; we run one batch per model over
+# just the slots that asked for it and then publish all of the predictions at once, so the workers see exactly
+# the same protocol as they do with a single model.
+def multi_model_evaluator(num_envs, num_slots, model_base_paths):
+    views, watchers = set_up_multi_model_evaluator(num_envs, num_slots, model_base_paths)
+    preds = empty_preds(num_slots)
+    versions = np.zeros(num_slots, dtype=np.int64)
+    while True:
+        for env_id, view in enumerate(views):
+            t = metrics.start()
+            view.wait_for_boards()
+            view.wait_for_data()
+            metrics.stop(Phase.BATCH_WAIT, t)
+            for model_id, watcher in enumerate(watchers):
+                slots = np.flatnonzero(view.model_ids == model_id)
+                if not len(slots):
+                    continue
+                versions[slots], nn = watcher.current()
+                t = metrics.start()
+                predictions = nn.predict([view.boards[slots], view.data[slots]], batch_size=len(slots))
+                metrics.stop(Phase.PREDICT, t)
+                metrics.increment(Counter.REQUESTS, num_requests(view, slots))
+                for head, head_preds in zip(preds, predictions):
+                    head[slots] = head_preds
             view.write_boards_clean()
             view.write_data_clean()
             for slot in range(num_slots):
                 assert view.dirty[slot, DataType.PREDS.value] == 0
-            view.write_preds(predictions)
-
+            view.write_preds(preds, versions)
 
-def profile_evaluator(num_envs, num_slots, model_base_path):
-    cProfile.runctx('evaluator(num_envs, num_slots, model_base_path)', globals(), locals(), sort='tottime')
 
+def empty_preds(num_slots):
+    return [np.zeros(get_preds_shape(num_slots, head), dtype=np.float64) for head in Head]
 
-def async_evaluator(num_envs, num_workers, model_base_path):
-    views, nn = set_up_evaluator(num_envs, num_workers, model_base_path)
-    print(f'Evaluator got shared memory and loaded model. Starting {num_envs} threads.')
 
-    async def env_loop(env_id, worker_env_conns):
-        while True:
-            # Block until every worker has sent in a sample for evaluation in
-            # this environment
-            # print(f'Evaluator {env_id} waiting for workers')
-            await asyncio.wait([worker_env_conn.env_get_woken_up() for worker_env_conn in worker_env_conns])
+def profile_evaluator(num_envs, num_slots, model_base_path):
+    cProfile.runctx('evaluator(num_envs, num_slots, model_base_path)', globals(), locals(), sort='tottime')
 
-            # print(f'Evaluator {env_id} got a batch, making predictions')
-            predictions = nn.predict([views[env_id].board, views[env_id].data], batch_size=num_workers)
-            views[env_id].write_preds(predictions, num_workers)
 
-            # Notify the workers that their predictions are ready
+# The evaluator for workers running [async_worker]. Rather than spinning on the dirty flags, each environment's loop
+# sleeps until every worker has signalled through its [WorkerEnvConn] that its whole batch is written.
+# [worker_env_conns_by_env] holds the connection for each worker in each environment.
+def async_evaluator(num_envs, num_slots, model_base_path, worker_env_conns_by_env):
+    views, watcher = set_up_evaluator(num_envs, num_slots, model_base_path)
+    async_evaluate_forever(views, watcher.current, num_slots, worker_env_conns_by_env)
+
+
+def async_evaluate_forever(views, current_model, num_slots, worker_env_conns_by_env):
+    # A worker that has retired all of its slots is dropped, or the others would wait for it forever. Nobody reads
+    # the predictions still written to its slots, so they're cleared here. Once every worker has retired there's
+    # nothing left to evaluate for the environment.
+    async def env_loop(view, worker_env_conns):
+        retired = []
+        while worker_env_conns:
+            t = metrics.start()
+            await asyncio.gather(*[worker_env_conn.env_get_woken_up() for worker_env_conn in worker_env_conns])
+            metrics.stop(Phase.BATCH_WAIT, t)
+            retired += [c for c in worker_env_conns if c.worker_retired()]
+            worker_env_conns = [c for c in worker_env_conns if not c.worker_retired()]
+            evaluate(view, current_model, num_slots)
+            for worker_env_conn in retired:
+                start_slot = worker_env_conn.worker_id * worker_env_conn.num_slots
+                view.dirty[start_slot:start_slot + worker_env_conn.num_slots, DataType.PREDS.value] = 0
             for worker_env_conn in worker_env_conns:
                 worker_env_conn.wake_up_worker()
-            # print(f'Evaluator {env_id} woke up all its workers')
 
-    uvloop.install()
-    worker_env_conns = [[WorkerEnvConn.for_env(env_id, worker_id) for worker_id in range(num_workers)]
-                        for env_id in range(num_envs)]
+    async def run_all():
+        await asyncio.gather(*[env_loop(view, worker_env_conns)
+                               for view, worker_env_conns in zip(views, worker_env_conns_by_env)])
 
-    # def on_kill(_signum, _stack_frame):
-    #     for l in worker_env_conns:
-    #         for worker_env_conn in l:
-    #             worker_env_conn.clean_up()
-    #
-    # signal.signal(signal.SIGKILL, on_kill)
-    asyncio.run(asyncio.wait([env_loop(env_id, worker_env_conns[env_id]) for env_id in range(num_envs)]))
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(run_all())
 
 
-def profile_async_evaluator(num_envs, num_workers, model_base_path):
-    cProfile.runctx('async_evaluator(num_envs, num_workers, model_base_path)', globals(), locals(), sort='cumtime')
+def profile_async_evaluator(num_envs, num_slots, model_base_path, worker_env_conns_by_env):
+    cProfile.runctx('async_evaluator(num_envs, num_slots, model_base_path, worker_env_conns_by_env)', globals(),
+                    locals(), sort='cumtime')
 
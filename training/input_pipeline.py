@@ -0,0 +1,72 @@
+import numpy as np
+import tensorflow as tf
+
+from encoders import game_state as gs_enc
+from training import model, replay_buffer as rb
+from training.constants import Head
+
+# Number of generators sampling from the replay buffer at once. Each runs on its own tf.data thread, so batch assembly
+# (reading from the memmaps) happens in parallel with training.
+NUM_PARALLEL_SAMPLERS = 4
+
+POLICY_HEADS = [head for head in Head if head is not Head.VALUE_HEAD]
+# Where each head's targets start in a row of all the policy heads side by side, indexed by [Head.value]
+_policy_head_starts = np.zeros(len(Head), dtype=np.int32)
+_policy_head_starts[[head.value for head in POLICY_HEADS]] = \
+    np.cumsum([0] + [model.head_sizes[head] for head in POLICY_HEADS[:-1]])
+POLICY_WIDTH = sum(model.head_sizes[head] for head in POLICY_HEADS)
+
+
+# An endless stream of training batches drawn uniformly at random from [replay_buffer], with the policy targets still
+# sparse: the values, then the row, head, index and probability of every entry (see [ReplayBuffer.sample]).
+# [augment_fn], if provided, takes and returns a sampled batch and can be used to add transformed copies of it. Nothing
+# is plugged in by default: the Scythe board has no reflections or rotations that preserve the game, since every
+# faction has a fixed home base.
+def batches(replay_buffer, batch_size, augment_fn=None, seed=None):
+    rng = np.random.default_rng(seed)
+    while True:
+        batch = replay_buffer.sample(batch_size, rng=rng)
+        if augment_fn:
+            batch = augment_fn(batch)
+        yield (batch['boards'], batch['data']), \
+            (batch['values'], batch[rb.ENTRY_ROWS], batch['policy_heads'], batch['policy_indices'],
+             batch['policy_probs'])
+
+
+def output_signature():
+    x = (tf.TensorSpec((None, *gs_enc.EncodedGameState.board_shape), dtype=tf.float32),
+         tf.TensorSpec((None, *gs_enc.EncodedGameState.data_shape), dtype=tf.float32))
+    y = (tf.TensorSpec((None, model.head_sizes[Head.VALUE_HEAD]), dtype=tf.float32),
+         tf.TensorSpec((None,), dtype=tf.int32),
+         tf.TensorSpec((None,), dtype=tf.int8),
+         tf.TensorSpec((None,), dtype=tf.int16),
+         tf.TensorSpec((None,), dtype=tf.float32))
+    return x, y
+
+
+# Scatters the sparse policy targets of a batch from [batches] into the dense targets the model trains on, one per head
+def to_dense_targets(x, sparse_targets):
+    values, rows, heads, indices, probs = sparse_targets
+    columns = tf.gather(_policy_head_starts, tf.cast(heads, tf.int32)) + tf.cast(indices, tf.int32)
+    policies = tf.scatter_nd(tf.stack([rows, columns], axis=1), probs, tf.stack([tf.shape(values)[0], POLICY_WIDTH]))
+    y = dict(zip(POLICY_HEADS, tf.split(policies, [model.head_sizes[head] for head in POLICY_HEADS], axis=1)))
+    y[Head.VALUE_HEAD] = values
+    return x, tuple(y[head] for head in Head)
+
+
+# The samplers hand over only the sparse targets, and with a GPU they're only made dense once they've been copied to it,
+# so the host-to-device transfer is the size of the sparse batch
+def dataset(replay_buffer, batch_size, augment_fn=None, num_parallel_samplers=NUM_PARALLEL_SAMPLERS):
+    def sampler(seed):
+        return tf.data.Dataset.from_generator(lambda s: batches(replay_buffer, batch_size, augment_fn, int(s)),
+                                              args=(seed,), output_signature=output_signature())
+
+    seeds = tf.data.Dataset.from_tensor_slices(np.random.randint(0, 2 ** 31, size=num_parallel_samplers))
+    ds = seeds.interleave(sampler, cycle_length=num_parallel_samplers, num_parallel_calls=tf.data.AUTOTUNE,
+                          deterministic=False)
+    gpus = tf.config.list_logical_devices('GPU')
+    if not gpus:
+        return ds.map(to_dense_targets).prefetch(tf.data.AUTOTUNE)
+    ds = ds.apply(tf.data.experimental.copy_to_device(gpus[0].name))
+    with tf.device(gpus[0].name):
+        return ds.map(to_dense_targets).prefetch(tf.data.AUTOTUNE)
@@ -1,10 +1,10 @@
 '''
 Stuff I want to do here:
  - Receive samples of data points
-   - Each batch will go into a queue
-   - If the queue is long enough, evict the current batch immediately
+   - Workers append finished games to the replay buffer
+   - Once the buffer is full, the oldest samples are evicted
  - Train a model, continuously
-   - Shuffle the current batch and go through it once
+   - Sample uniformly from the replay buffer, prefetching batches in the background
  - Periodically checkpoint the model
    - Save to disk somewhere, timestamped
    - Update the h5 group
@@ -12,48 +12,49 @@ Stuff I want to do here:
     - If necessary, update the self-play model
 '''
 import attr
-import h5py
-import logging
-import os
-import numpy as np
+import sys
+import tensorflow as tf
+import time
 
-from training import model, constants as model_const
+from training import input_pipeline, model, replay_buffer as rb
+
+BATCH_SIZE = 256
+# Don't start training until there's enough in the buffer to make a batch out of more than a couple of games
+MIN_SAMPLES = 4096
+BATCHES_PER_SAVE = 100
 
 
 @attr.s
 class Learner:
     model_base_path = attr.ib()
     model = attr.ib()
-    training_queue = attr.ib()
-    current_data = attr.ib(factory=list)
+    replay_buffer = attr.ib()
 
     @classmethod
-    def from_file(cls, model_base_path, training_queue):
-        return cls(model_base_path, model.load(model_base_path), training_queue)
-
-    def start(self):
-        while True:
-            boards, data = [], []
-            ys = [[] for _ in range(len(model_const.Head))]
-            logging.debug('Waiting for samples')
-            print('Learner waiting for samples')
-            b, d, y = self.training_queue.get()
-            boards.append(b)
-            data.append(d)
-            for i, h in enumerate(y):
-                ys[i].append(h)
-
-            logging.debug('Emptying queue')
-            print('Learner emptying queue')
-            while not self.training_queue.empty():
-                b, d, y = self.training_queue.get()
-                boards.append(b)
-                data.append(d)
-                for i, h in enumerate(y):
-                    ys[i].append(h)
-            boards_np = np.vstack(boards)
-            data_np = np.vstack(data)
-            y = [np.vstack(h) for h in ys]
-            print(f'Learner training on {len(boards_np)} samples')
-            logging.debug(f'Training on {len(boards_np)} samples')
-            self.model.fit([boards_np, data_np], y, epochs=1, verbose=1)
+    def from_file(cls, model_base_path, replay_buffer):
+        return cls(model_base_path, model.load(model_base_path), replay_buffer)
+
+    def start(self, batch_size=BATCH_SIZE, min_samples=MIN_SAMPLES, batches_per_save=BATCHES_PER_SAVE, augment_fn=None):
+        print('Learner waiting for samples')
+        while len(self.replay_buffer) < min_samples:
+            time.sleep(1)
+
+        # Batches are sampled and prefetched in the background, so training never waits on the replay buffer. Every
+        # "epoch" is just [batches_per_save] batches, after which we checkpoint.
+        ds = input_pipeline.dataset(self.replay_buffer, batch_size, augment_fn)
+        checkpoint = tf.keras.callbacks.LambdaCallback(
+            on_epoch_end=lambda epoch, _logs: self.checkpoint(epoch, batches_per_save))
+        self.model.fit(ds, steps_per_epoch=batches_per_save, epochs=sys.maxsize, callbacks=[checkpoint], verbose=0)
+
+    def checkpoint(self, epoch, batches_per_save):
+        print(f'Learner trained on {(epoch + 1) * batches_per_save} batches; '
+              f'buffer has {len(self.replay_buffer)} samples')
+        # The evaluator is watching this path and will pick the new weights up between batches
+        model.save(self.model, self.model_base_path)
+
+
+def learner(model_base_path, replay_buffer_path, replay_buffer_lock):
+    for physical_device in tf.config.list_physical_devices('GPU'):
+        tf.config.experimental.set_memory_growth(physical_device, True)
+    tf.compat.v1.disable_eager_execution()
+    Learner.from_file(model_base_path, rb.ReplayBuffer.open(replay_buffer_path, lock=replay_buffer_lock)).start()
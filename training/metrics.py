@@ -0,0 +1,167 @@
+import argparse
+import atexit
+import glob
+import numpy as np
+import os
+import time
+
+from enum import Enum
+from multiprocessing import shared_memory
+
+SEGMENT_PREFIX = 'metrics-'
+SHM_DIR = '/dev/shm'
+# Histogram bucket i counts durations of [2^(i-1), 2^i) nanoseconds
+NUM_BUCKETS = 40
+# Leading columns of each phase's row, before the histogram buckets
+COUNT = 0
+TOTAL_NS = 1
+NUM_LEADING = 2
+
+
+class Phase(Enum):
+    SELECTION = 0
+    EXPANSION = 1
+    ENCODE = 2
+    SHM_WRITE = 3
+    WAIT = 4
+    DECODE = 5
+    BACKUP = 6
+    # The evaluator's side: waiting for every slot's request, then running the batch through the model
+    BATCH_WAIT = 7
+    PREDICT = 8
+
+
+class Counter(Enum):
+    GAMES = 0
+    MOVES = 1
+    SIMULATIONS = 2
+    # Slots that asked for predictions, summed over the evaluator's batches
+    REQUESTS = 3
+
+
+def segment_size():
+    return (len(Phase) * (NUM_LEADING + NUM_BUCKETS) + len(Counter)) * np.dtype(np.int64).itemsize
+
+
+def split(buf):
+    flat = np.ndarray((segment_size() // np.dtype(np.int64).itemsize,), dtype=np.int64, buffer=buf)
+    phases = flat[:len(Phase) * (NUM_LEADING + NUM_BUCKETS)].reshape(len(Phase), NUM_LEADING + NUM_BUCKETS)
+    counters = flat[len(Phase) * (NUM_LEADING + NUM_BUCKETS):]
+    return phases, counters
+
+
+# Metrics are off unless a process calls [enable]. Until then [start] and [stop] return immediately, so the
+# instrumented code pays for two function calls per phase and nothing else.
+ENABLED = False
+_segment = None
+_phases = None
+_counters = None
+
+
+# Creates this process's segment. It's removed again when the process exits normally; the orchestrator [unlink]s the
+# segments of processes it had to kill.
+def enable(process_name):
+    global ENABLED, _segment, _phases, _counters
+    try:
+        _segment = shared_memory.SharedMemory(name=SEGMENT_PREFIX + process_name, create=True, size=segment_size())
+    except FileExistsError:
+        # Left behind by an earlier process with the same name that crashed
+        _segment = shared_memory.SharedMemory(name=SEGMENT_PREFIX + process_name)
+    _phases, _counters = split(_segment.buf)
+    _phases[:] = 0
+    _counters[:] = 0
+    ENABLED = True
+    atexit.register(unlink, process_name)
+
+
+def unlink(process_name):
+    try:
+        segment = shared_memory.SharedMemory(name=SEGMENT_PREFIX + process_name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def start():
+    return time.perf_counter_ns() if ENABLED else 0
+
+
+def stop(phase, started):
+    if not ENABLED:
+        return
+    elapsed = time.perf_counter_ns() - started
+    row = _phases[phase.value]
+    row[COUNT] += 1
+    row[TOTAL_NS] += elapsed
+    row[NUM_LEADING + min(elapsed.bit_length(), NUM_BUCKETS - 1)] += 1
+
+
+def increment(counter, amt=1):
+    if ENABLED:
+        _counters[counter.value] += amt
+
+
+# Approximate percentile from a log2 histogram: the upper bound of the bucket containing it
+def percentile_ns(buckets, q):
+    total = buckets.sum()
+    if not total:
+        return 0
+    bucket = int(np.searchsorted(np.cumsum(buckets), q / 100 * total))
+    return 2 ** bucket
+
+
+# Reads every live process's metrics straight from /dev/shm, without attaching through [shared_memory] (whose resource
+# tracker would unlink the segments when this process exits).
+def read_all():
+    metrics = {}
+    for path in sorted(glob.glob(os.path.join(SHM_DIR, SEGMENT_PREFIX + '*'))):
+        process_metrics = read_path(path)
+        if process_metrics is not None:
+            metrics[os.path.basename(path)[len(SEGMENT_PREFIX):]] = process_metrics
+    return metrics
+
+
+# A copy of one process's phases and counters, or None if it doesn't have a segment
+def read(process_name):
+    return read_path(os.path.join(SHM_DIR, SEGMENT_PREFIX + process_name))
+
+
+def read_path(path):
+    try:
+        with open(path, 'rb') as f:
+            buf = bytearray(f.read(segment_size()))
+    except FileNotFoundError:
+        return None
+    return split(buf) if len(buf) == segment_size() else None
+
+
+def format_metrics(metrics):
+    lines = []
+    for process_name, (phases, counters) in metrics.items():
+        lines.append(f'{process_name}: ' + ', '.join(f'{c.name.lower()}={counters[c.value]}' for c in Counter))
+        for phase in Phase:
+            row = phases[phase.value]
+            if not row[COUNT]:
+                continue
+            buckets = row[NUM_LEADING:]
+            lines.append(f'  {phase.name.lower():<10} n={row[COUNT]:<10} total={row[TOTAL_NS] / 1e9:>9.2f}s '
+                         f'mean={row[TOTAL_NS] / row[COUNT] / 1e3:>9.1f}us '
+                         f'p50<{percentile_ns(buckets, 50) / 1e3:.1f}us p99<{percentile_ns(buckets, 99) / 1e3:.1f}us')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the metrics of every running process that has them enabled')
+    parser.add_argument('--watch', type=float, help='Keep printing every this many seconds')
+    args = parser.parse_args(argv)
+    while True:
+        print(format_metrics(read_all()))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+        print()
+
+
+if __name__ == '__main__':
+    main()
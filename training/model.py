@@ -1,11 +1,6 @@
-from tensorflow.keras.activations import relu
-from tensorflow.keras.layers import Activation, BatchNormalization, Concatenate, Conv2D, Dense, Flatten, Input
-from tensorflow.keras.models import load_model, Model
-from tensorflow.keras.regularizers import l2
-
 from game import constants, game_state as gs
 from encoders import game_state as gs_enc
-from training import decode, utils
+from training import decode
 from training.constants import Head
 
 import numpy as np
@@ -32,12 +27,15 @@ head_sizes = {
     Head.OPTIONAL_COMBAT_CARD_HEAD: constants.NUM_COMBAT_CARD_VALUES + 1,
     Head.WHEEL_POWER_HEAD: constants.MAX_COMBAT_POWER + 1,
     Head.NUM_WORKERS_HEAD: constants.NUM_WORKERS,
-    Head.NUM_RESOURCES_HEAD: gs_enc.BOARD_ENCODING__THEORETICAL_MAX_RESOURCES_PER_SPACE,
+    Head.NUM_RESOURCES_HEAD: constants.MAX_RESOURCES_LOADED + 1,
     Head.CHOOSE_ACTION_SPACE_HEAD: constants.NUM_PLAYER_MAT_ACTION_SPACES
 }
 
 
+# TensorFlow is only imported by the functions that build or load a network. Workers, the replay buffer and the
+# benchmarks use [head_sizes] and the decoding helpers here without needing TensorFlow at all.
 def resnet(board, num_residual_blocks):
+    from training import utils
     base = utils.conv_block(board)
     for _ in range(num_residual_blocks):
         base = utils.res_block(base)
@@ -45,6 +43,9 @@ def resnet(board, num_residual_blocks):
 
 
 def head(x, num_choices):
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.regularizers import l2
+    from training import utils
     # x = utils.hidden_layer(128)(x)
     # x = utils.hidden_layer(64)(x)
     x = Dense(num_choices, activation='softmax', kernel_regularizer=l2(utils.REGULARIZATION_FACTOR))(x)
@@ -52,6 +53,12 @@ def head(x, num_choices):
 
 
 def network():
+    from tensorflow.keras.activations import relu
+    from tensorflow.keras.layers import Activation, BatchNormalization, Concatenate, Conv2D, Dense, Flatten, Input
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.regularizers import l2
+    from training import utils
+
     board_input = Input(gs_enc.EncodedGameState.board_shape, name="board")
     data_input = Input(gs_enc.EncodedGameState.data_shape, name="data")
 
@@ -135,7 +142,22 @@ def empty_heads(len):
     return [np.zeros((len, head_sizes[h])) for h in Head]
 
 
+# Scatters a batch of sparse policy targets (see [ExperienceCollector.to_sparse]) into one dense array per head.
+# [rows] is the sample that each (head, index, probability) entry belongs to. Training does the same on the device (see
+# [input_pipeline.to_dense_targets]); this is for looking at targets outside of TensorFlow.
+def sparse_to_dense(values, rows, heads, indices, probs):
+    dense = empty_heads(len(values))
+    dense[Head.VALUE_HEAD.value][:] = values
+    for h in Head:
+        if h is Head.VALUE_HEAD:
+            continue
+        mask = heads == h.value
+        dense[h.value][rows[mask], indices[mask]] = probs[mask]
+    return dense
+
+
 def load(model_base_path):
+    from tensorflow.keras.models import load_model
     model_file = os.path.join(model_base_path, MODEL_FILE_NAME)
     if os.path.exists(model_file):
         nn = load_model(model_file)
@@ -145,6 +167,24 @@ def load(model_base_path):
     return nn
 
 
+# Identifies the weights currently on disk. We use the file's modification time so that versions keep increasing
+# across evaluator restarts; 0 means that there are no saved weights yet and [load] will build a fresh network.
+def version(model_base_path):
+    model_file = os.path.join(model_base_path, MODEL_FILE_NAME)
+    try:
+        return os.stat(model_file).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+# Anyone watching [model_base_path] must never see a partially written file, so write next to it and swap it in.
+def save(nn, model_base_path):
+    model_file = os.path.join(model_base_path, MODEL_FILE_NAME)
+    tmp_file = model_file + '.tmp'
+    nn.save(tmp_file, save_format='h5')
+    os.replace(tmp_file, model_file)
+
+
 if __name__ == '__main__':
     import tensorflow as tf
     # import keras.backend as K
@@ -0,0 +1,298 @@
+import argparse
+import attr
+import json
+import multiprocessing as mp
+import os
+import signal
+import time
+
+from game.game_state import GameOptions
+from training import metrics, profiler
+from training.evaluator import async_evaluator, evaluator
+from training.learner import learner
+from training.replay_buffer import ReplayBuffer
+from training.shared_memory_manager import SharedMemoryManager, View
+from training.simulator import async_worker, manual_worker
+from training.socket_transport import DEFAULT_PORT, socket_evaluator
+from training.worker_env_conn import WorkerEnvConn
+
+POLL_SECONDS = 1
+TRANSPORTS = ('shm', 'eventfd', 'socket')
+
+
+@attr.s(frozen=True, slots=True)
+class Config:
+    model_base_path = attr.ib(default='data')
+    replay_buffer_path = attr.ib(default='replay')
+    num_players = attr.ib(default=2)
+    # Defaults to one worker per core that isn't used by the evaluator or learner
+    num_workers = attr.ib(default=None, type=int)
+    slots_per_worker = attr.ib(default=6)
+    num_envs = attr.ib(default=2)
+    simulations_per_choice = attr.ib(default=10)
+    c = attr.ib(default=0.8)
+    # Games per worker before it exits. None means play forever.
+    num_games = attr.ib(default=None, type=int)
+    run_learner = attr.ib(default=True)
+    shard_size = attr.ib(default=2 ** 14)
+    num_shards = attr.ib(default=32)
+    # Scheduling priority for the evaluator and workers. Negative values need privileges; we carry on without.
+    niceness = attr.ib(default=-20)
+    max_restarts = attr.ib(default=5)
+    # Publish per-phase timings from every process; read them with `python -m training.metrics`
+    metrics = attr.ib(default=False)
+    # If set, workers run under the sampling profiler and write collapsed stacks per action type under this directory
+    profile_dir = attr.ib(default=None, type=str)
+    # How workers reach the evaluator: 'shm' for shared memory; 'eventfd' for shared memory with workers that run
+    # every slot as a coroutine and sleep until their predictions are ready; or 'socket' to connect to
+    # [evaluator_host] and [evaluator_port], which may be on another machine
+    transport = attr.ib(default='shm', validator=attr.validators.in_(TRANSPORTS))
+    evaluator_host = attr.ib(default='localhost')
+    evaluator_port = attr.ib(default=DEFAULT_PORT)
+    # Turn off on machines that only run workers for an evaluator elsewhere
+    run_evaluator = attr.ib(default=True)
+    # If set, each worker appends its finished games to a file of game records in this directory (see [game.record])
+    game_log_dir = attr.ib(default=None, type=str)
+    # Whether the game records include the MCTS visit counts for every move
+    log_visits = attr.ib(default=False)
+    # If set, every worker's games are determined by this and the worker's id, e.g. for comparing runs
+    seed = attr.ib(default=None, type=int)
+    # Search over whole piece moves rather than each step of one (see [GameOptions.macro_moves])
+    macro_moves = attr.ib(default=False)
+    # Load cargo in one choice from a few amounts (see [GameOptions.bucketed_cargo])
+    bucketed_cargo = attr.ib(default=False)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    # Any field can be given on the command line. Values from [--config] are used for anything that isn't.
+    @classmethod
+    def from_args(cls, argv=None):
+        parser = argparse.ArgumentParser(description='Run self-play and training')
+        parser.add_argument('--config', help='JSON file with any of the options below')
+        for field in attr.fields(cls):
+            parser.add_argument(f'--{field.name.replace("_", "-")}', dest=field.name, type=arg_type(field))
+        args = vars(parser.parse_args(argv))
+        config = cls.from_file(args.pop('config')) if args['config'] else cls()
+        return attr.evolve(config, **{k: v for k, v in args.items() if v is not None})
+
+    def to_file(self, path):
+        with open(path, 'w') as f:
+            json.dump(attr.asdict(self), f, indent=2)
+
+
+# Fields that default to None say what they hold with [type]; for the rest it's the type of the default
+def arg_type(field):
+    typ = field.type if field.type else type(field.default)
+    if typ is bool:
+        return lambda s: s.lower() in ('1', 'true', 'yes')
+    return typ
+
+
+# The evaluator gets a core to itself, as does the learner if there is one. Every worker gets one of the remaining cores,
+# so by default there are as many workers as there are cores left over.
+def assign_cores(config, cores):
+    cores = sorted(cores)
+    reserved = int(config.run_evaluator) + int(config.run_learner)
+    assert len(cores) > reserved, f'Need more than {reserved} cores; have {len(cores)}'
+    evaluator_core = cores[0] if config.run_evaluator else None
+    learner_core = cores[reserved - 1] if config.run_learner else None
+    worker_cores = cores[reserved:]
+    num_workers = config.num_workers if config.num_workers else len(worker_cores)
+    return evaluator_core, learner_core, [worker_cores[i % len(worker_cores)] for i in range(num_workers)]
+
+
+def run_pinned(name, core, niceness, enable_metrics, profile_dir, target, *args):
+    if enable_metrics:
+        metrics.enable(name)
+    os.sched_setaffinity(0, {core})
+    if niceness:
+        try:
+            os.nice(niceness)
+        except PermissionError:
+            print(f'Process {os.getpid()} not permitted to set niceness to {niceness}')
+    if profile_dir:
+        profiler.profiled(os.path.join(profile_dir, name), target, *args)
+    else:
+        target(*args)
+
+
+@attr.s(slots=True)
+class ManagedProcess:
+    name = attr.ib()
+    core = attr.ib()
+    niceness = attr.ib()
+    enable_metrics = attr.ib()
+    profile_dir = attr.ib()
+    target = attr.ib()
+    args = attr.ib()
+    # Called before restarting the process, to undo anything it may have left half finished
+    on_restart = attr.ib(default=None)
+    process = attr.ib(default=None)
+    restarts = attr.ib(default=0)
+
+    def start(self):
+        self.process = mp.Process(target=run_pinned, args=(self.name, self.core, self.niceness, self.enable_metrics,
+                                                           self.profile_dir, self.target, *self.args),
+                                  name=self.name, daemon=True)
+        self.process.start()
+        print(f'Started {self.name} (pid {self.process.pid}) on core {self.core}')
+
+    def restart(self):
+        self.restarts += 1
+        if self.on_restart:
+            self.on_restart()
+        self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+
+@attr.s(slots=True)
+class Orchestrator:
+    config = attr.ib()
+    smm = attr.ib()
+    workers = attr.ib()
+    services = attr.ib()
+
+    @classmethod
+    def init(cls, config):
+        evaluator_core, learner_core, worker_cores = assign_cores(config, os.sched_getaffinity(0))
+        num_workers = len(worker_cores)
+        if config.transport == 'socket':
+            smm = None
+            evaluator_address = (config.evaluator_host, config.evaluator_port)
+        else:
+            assert config.run_evaluator, 'Workers using shared memory need an evaluator on the same machine'
+            smm = SharedMemoryManager.init(num_workers=num_workers, slots_per_worker=config.slots_per_worker,
+                                           envs_per_worker=config.num_envs)
+            evaluator_address = None
+        replay_buffer_lock = mp.Lock()
+        if config.run_learner:
+            ReplayBuffer.open_or_create(config.replay_buffer_path, shard_size=config.shard_size,
+                                        num_shards=config.num_shards, lock=replay_buffer_lock)
+        replay_buffer_path = config.replay_buffer_path if config.run_learner else None
+        if config.game_log_dir:
+            os.makedirs(config.game_log_dir, exist_ok=True)
+        # Made here so that the workers and the evaluator inherit the eventfds
+        worker_env_conns_by_env = [[WorkerEnvConn.init(env_id=env_id, worker_id=worker_id,
+                                                       num_slots=config.slots_per_worker)
+                                    for worker_id in range(num_workers)] for env_id in range(config.num_envs)] \
+            if config.transport == 'eventfd' else None
+
+        def clear_slots(worker_id):
+            def clear():
+                for env in smm.envs:
+                    view = View.for_evaluator(env=env, num_slots=num_workers * config.slots_per_worker)
+                    start = worker_id * config.slots_per_worker
+                    view.dirty[start:start + config.slots_per_worker, :] = 0
+                if worker_env_conns_by_env:
+                    for worker_env_conns in worker_env_conns_by_env:
+                        worker_env_conns[worker_id].drain_worker()
+            return clear
+
+        def worker_target(worker_id):
+            seed = None if config.seed is None else [config.seed, worker_id]
+            game_options = GameOptions(macro_moves=config.macro_moves, bucketed_cargo=config.bucketed_cargo)
+            if worker_env_conns_by_env:
+                return async_worker, (worker_id, config.num_players, num_workers, config.slots_per_worker,
+                                      config.num_envs, config.simulations_per_choice, config.c,
+                                      [worker_env_conns[worker_id] for worker_env_conns in worker_env_conns_by_env],
+                                      config.num_games, replay_buffer_path, replay_buffer_lock, seed, game_options)
+            return manual_worker, (worker_id, config.num_players, num_workers, config.slots_per_worker,
+                                   config.num_envs, config.simulations_per_choice, config.c, config.num_games, 1,
+                                   replay_buffer_path, replay_buffer_lock, evaluator_address,
+                                   os.path.join(config.game_log_dir, f'worker-{worker_id}.games')
+                                   if config.game_log_dir else None, config.log_visits, seed, game_options)
+
+        workers = [ManagedProcess(f'worker-{worker_id}', core, config.niceness, config.metrics, config.profile_dir,
+                                  *worker_target(worker_id),
+                                  # Over sockets there's nothing to clear: a restarted worker reconnects, and the
+                                  # evaluator drops the connection it replaces
+                                  on_restart=clear_slots(worker_id) if smm else None)
+                   for worker_id, core in enumerate(worker_cores)]
+        services = []
+        num_slots = num_workers * config.slots_per_worker
+        if config.run_evaluator and config.transport == 'shm':
+            services.append(ManagedProcess('evaluator', evaluator_core, config.niceness, config.metrics, None,
+                                           evaluator, (config.num_envs, num_slots, config.model_base_path)))
+        elif config.run_evaluator and config.transport == 'eventfd':
+            services.append(ManagedProcess('evaluator', evaluator_core, config.niceness, config.metrics, None,
+                                           async_evaluator, (config.num_envs, num_slots, config.model_base_path,
+                                                             worker_env_conns_by_env)))
+        elif config.run_evaluator:
+            services.append(ManagedProcess('evaluator', evaluator_core, config.niceness, config.metrics, None,
+                                           socket_evaluator, (config.num_envs, evaluator_address,
+                                                              [config.model_base_path])))
+        if config.run_learner:
+            services.append(ManagedProcess('learner', learner_core, 0, config.metrics, None, learner,
+                                           (config.model_base_path, config.replay_buffer_path, replay_buffer_lock)))
+        return cls(config, smm, workers, services)
+
+    # Restart anything that crashed. Returns False once every worker has played all of its games, at which point the
+    # services have nothing left to do: an evaluator whose workers have all retired exits by itself, and restarting
+    # it would leave it waiting for workers that will never come.
+    def supervise(self):
+        workers_running = False
+        for managed in self.workers:
+            workers_running = self.restart_if_crashed(managed) or workers_running
+        if not workers_running:
+            return False
+        for managed in self.services:
+            self.restart_if_crashed(managed)
+        return True
+
+    # Returns whether [managed] is still running, after restarting it if need be
+    def restart_if_crashed(self, managed):
+        exitcode = managed.process.exitcode
+        if exitcode is None:
+            return True
+        if exitcode == 0:
+            return False
+        if managed.restarts >= self.config.max_restarts:
+            raise RuntimeError(f'{managed.name} exited with code {exitcode} too many times')
+        print(f'{managed.name} exited with code {exitcode}; restarting')
+        managed.restart()
+        return True
+
+    def run(self):
+        def on_signal(signum, _stack_frame):
+            raise KeyboardInterrupt(f'Received signal {signum}')
+
+        signal.signal(signal.SIGTERM, on_signal)
+        try:
+            self.start()
+            while self.supervise():
+                time.sleep(POLL_SECONDS)
+        except KeyboardInterrupt:
+            print('Shutting down')
+        finally:
+            self.shut_down()
+
+    def start(self):
+        for managed in self.services + self.workers:
+            managed.start()
+
+    # Processes stopped here don't get to run their exit handlers, so their metrics segments are removed for them
+    def shut_down(self):
+        for managed in self.workers + self.services:
+            managed.stop()
+            if managed.enable_metrics:
+                metrics.unlink(managed.name)
+        if self.smm:
+            self.smm.unlink()
+
+
+def main(argv=None):
+    Orchestrator.init(Config.from_args(argv)).run()
+
+
+if __name__ == '__main__':
+    main()
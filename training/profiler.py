@@ -0,0 +1,139 @@
+import argparse
+import os
+import signal
+
+from collections import Counter, defaultdict
+
+from game.actions.action import Action
+
+SAMPLE_INTERVAL_SECONDS = 0.001
+# Only this many of the innermost frames are written out for each sample. The phase and the action are still worked
+# out from the whole stack.
+MAX_STACK_DEPTH = 64
+
+# The functions that mark the start of each MCTS phase (see [metrics.Phase]). A sample belongs to the phase of the
+# outermost of these on its stack.
+PHASE_BY_FUNCTION = {
+    'select_branch': 'selection',
+    'apply_move': 'expansion',
+    'encode': 'encode',
+    'encoded_data': 'encode',
+    'write_model_id': 'shm_write',
+    'write_board': 'shm_write',
+    'write_data': 'shm_write',
+    'wait_for_preds': 'wait',
+    'to_values_and_move_priors': 'decode',
+    'propagate_values': 'backup',
+}
+SEARCH_FUNCTION = 'advance_until_predictions_needed_or_move_selected_or_game_over'
+
+
+def frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+def phase_of(frames):
+    in_search = False
+    for frame in frames:
+        name = frame.f_code.co_name
+        in_search = in_search or name == SEARCH_FUNCTION
+        if name in PHASE_BY_FUNCTION:
+            # Moves applied outside of a search are the moves actually being played
+            if name == 'apply_move' and not in_search:
+                return 'play'
+            return PHASE_BY_FUNCTION[name]
+    return 'other'
+
+
+def action_of(frames):
+    for frame in reversed(frames):
+        if isinstance(frame.f_locals.get('self'), Action):
+            return frame.f_locals['self'].__class__.__name__
+    return 'none'
+
+
+# A statistical profiler that interrupts the process every [interval] seconds of CPU time and records the stack,
+# tagged with the rules [Action] being executed (the innermost frame whose [self] is an Action) and the MCTS phase.
+# Unlike cProfile, the cost doesn't grow with the number of function calls, so the move distribution it sees is the
+# one real self-play produces.
+class SamplingProfiler:
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks_by_action = defaultdict(Counter)
+
+    def sample(self, _signum, frame):
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        stack = ';'.join([phase_of(frames)] + [frame_name(f) for f in frames[-MAX_STACK_DEPTH:]])
+        self.stacks_by_action[action_of(frames)][stack] += 1
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    # Writes one file of collapsed stacks per action class, plus all.collapsed with the action as the root frame.
+    # Any flame graph tool that reads the collapsed format (flamegraph.pl, speedscope, inferno) can render them.
+    def write_collapsed(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, 'all.collapsed'), 'w') as all_file:
+            for action, stacks in self.stacks_by_action.items():
+                with open(os.path.join(output_dir, f'{action}.collapsed'), 'w') as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f'{stack} {count}\n')
+                        all_file.write(f'{action};{stack} {count}\n')
+
+    def summary(self):
+        total = sum(sum(stacks.values()) for stacks in self.stacks_by_action.values())
+        by_action = sorted(((sum(stacks.values()), action) for action, stacks in self.stacks_by_action.items()),
+                           reverse=True)
+        return '\n'.join(f'{action:<45} {count:>8} {100 * count / total:>6.1f}%' for count, action in by_action)
+
+
+def exit_on_sigterm(_signum, _stack_frame):
+    raise SystemExit(0)
+
+
+# Runs [target] under the sampling profiler, writing the results to [output_dir] when it finishes or is terminated
+def profiled(output_dir, target, *args, interval=SAMPLE_INTERVAL_SECONDS):
+    profiler = SamplingProfiler(interval)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    profiler.start()
+    try:
+        return target(*args)
+    finally:
+        profiler.stop()
+        profiler.write_collapsed(output_dir)
+
+
+def main(argv=None):
+    from benchmarks import self_play
+
+    parser = argparse.ArgumentParser(description='Profile self-play against a stub evaluator by action type')
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--num-games', type=int, default=2)
+    parser.add_argument('--slots-per-worker', type=int, default=4)
+    parser.add_argument('--num-envs', type=int, default=1)
+    parser.add_argument('--simulations-per-choice', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+
+    profiler = SamplingProfiler(args.interval)
+    profiler.start()
+    try:
+        self_play.run(num_games=args.num_games, slots_per_worker=args.slots_per_worker, num_envs=args.num_envs,
+                      simulations_per_choice=args.simulations_per_choice)
+    finally:
+        profiler.stop()
+    profiler.write_collapsed(args.output_dir)
+    print(profiler.summary())
+
+
+if __name__ == '__main__':
+    main()
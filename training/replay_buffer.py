@@ -0,0 +1,233 @@
+import attr
+import json
+import numpy as np
+import os
+
+from encoders import game_state as gs_enc
+from training import model, constants as model_const
+
+SPEC_FILE_NAME = 'spec.json'
+HEADER_FILE_NAME = 'header'
+# Fields in the header memmap
+CURSOR = 0
+COUNT = 1
+# The number of entries appended since the buffer was created (see [ReplayBuffer.entry_fields])
+ENTRIES_WRITTEN = 2
+HEADER_SIZE = 3
+# Room in the entry ring for this many entries per sample. Self-play has a little over two policy targets per sample on
+# average; samples whose entries get overwritten anyway are evicted early.
+ENTRIES_PER_SAMPLE = 4
+# Per-sample fields kept for buffers with entry fields: where each sample's entries start, counting from the first entry
+# ever appended, and how many there are
+ENTRY_OFFSETS = 'entry_offsets'
+ENTRY_LENGTHS = 'entry_lengths'
+# In a sampled batch, the row of the batch that each entry belongs to
+ENTRY_ROWS = 'entry_rows'
+
+
+# Fixed-size fields, one row per sample. Each value is the shape of a single sample and the dtype used to store it.
+def default_fields():
+    return {'boards': (gs_enc.EncodedGameState.board_shape, 'float32'),
+            'data': (gs_enc.EncodedGameState.data_shape, 'float32'),
+            'values': ((model.head_sizes[model_const.Head.VALUE_HEAD],), 'float32'),
+            'model_versions': ((), 'int64')}
+
+
+# Variable-length fields: each sample has its own number of policy targets (see [ExperienceCollector.to_sparse])
+def default_entry_fields():
+    return {'policy_heads': 'int8', 'policy_indices': 'int16', 'policy_probs': 'float32'}
+
+
+def experience_to_fields(boards, data, values, lengths, heads, indices, probs, model_versions):
+    return {'boards': boards, 'data': data, 'values': values, ENTRY_LENGTHS: lengths, 'policy_heads': heads,
+            'policy_indices': indices, 'policy_probs': probs, 'model_versions': model_versions}
+
+
+# What's written to the buffer's spec file, exactly as it reads back from JSON. Without [fields], the buffer holds the
+# default fields and entry fields.
+def make_spec(shard_size, num_shards, fields=None, entry_fields=None, entries_per_sample=ENTRIES_PER_SAMPLE):
+    if fields is None:
+        fields, entry_fields = default_fields(), default_entry_fields()
+    entry_fields = entry_fields or {}
+    if entry_fields:
+        fields = {**fields, ENTRY_OFFSETS: ((), 'int64'), ENTRY_LENGTHS: ((), 'int16')}
+    return {'shard_size': shard_size, 'num_shards': num_shards,
+            'fields': {name: [list(shape), dtype] for name, (shape, dtype) in fields.items()},
+            'entry_capacity': shard_size * num_shards * entries_per_sample if entry_fields else 0,
+            'entry_fields': dict(entry_fields)}
+
+
+def shard_path(path, shard, field):
+    return os.path.join(path, f'shard-{shard}-{field}')
+
+
+def entries_path(path, field):
+    return os.path.join(path, f'entries-{field}')
+
+
+# A fixed-capacity ring of samples, stored on disk as [num_shards] memmapped shards per field. Any number of processes
+# can open the same buffer: workers append finished games and the learner samples from it. Nothing is pickled on the
+# way in and the learner only ever touches the rows it samples, so its memory stays flat however large the buffer is.
+#
+# Variable-length fields, like the sparse policy targets, go in a second ring of [entry_capacity] entries shared by all
+# the samples, and each sample keeps the offset and number of its entries. If the entries of the oldest samples get
+# overwritten before the samples themselves do, those samples are evicted with them.
+#
+# The write cursor, the number of valid samples and the number of entries written live in a small memmapped header so
+# that every process sees the same values. Appends and samples are serialized with [lock], which must be a
+# multiprocessing lock shared by everyone using the buffer, so that a sample never sees a row that's halfway through
+# being overwritten.
+@attr.s(slots=True)
+class ReplayBuffer:
+    path = attr.ib()
+    shard_size = attr.ib()
+    num_shards = attr.ib()
+    fields = attr.ib()
+    shards = attr.ib()
+    entry_capacity = attr.ib()
+    entry_fields = attr.ib()
+    entries = attr.ib()
+    header = attr.ib()
+    lock = attr.ib()
+
+    @property
+    def capacity(self):
+        return self.shard_size * self.num_shards
+
+    # Without [fields], the buffer holds self-play experience (see [default_fields] and [default_entry_fields])
+    @classmethod
+    def create(cls, path, *, shard_size, num_shards, lock, fields=None, entry_fields=None,
+               entries_per_sample=ENTRIES_PER_SAMPLE):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, SPEC_FILE_NAME), 'w') as f:
+            json.dump(make_spec(shard_size, num_shards, fields, entry_fields, entries_per_sample), f)
+        header = np.memmap(os.path.join(path, HEADER_FILE_NAME), dtype=np.int64, mode='w+', shape=(HEADER_SIZE,))
+        header[:] = 0
+        header.flush()
+        return cls.open(path, lock=lock, mode='w+')
+
+    # Picks up where an earlier run left off if the buffer at [path] was made with the same arguments, and starts
+    # afresh otherwise
+    @classmethod
+    def open_or_create(cls, path, *, shard_size, num_shards, lock, fields=None, entry_fields=None,
+                       entries_per_sample=ENTRIES_PER_SAMPLE):
+        try:
+            with open(os.path.join(path, SPEC_FILE_NAME)) as f:
+                spec = json.load(f)
+        except FileNotFoundError:
+            spec = None
+        if spec == make_spec(shard_size, num_shards, fields, entry_fields, entries_per_sample):
+            return cls.open(path, lock=lock)
+        return cls.create(path, shard_size=shard_size, num_shards=num_shards, lock=lock, fields=fields,
+                          entry_fields=entry_fields, entries_per_sample=entries_per_sample)
+
+    @classmethod
+    def open(cls, path, *, lock, mode='r+'):
+        with open(os.path.join(path, SPEC_FILE_NAME)) as f:
+            spec = json.load(f)
+        fields = {name: (tuple(shape), dtype) for name, (shape, dtype) in spec['fields'].items()}
+        shard_size, num_shards = spec['shard_size'], spec['num_shards']
+        shards = [{name: np.memmap(shard_path(path, shard, name), dtype=dtype, mode=mode, shape=(shard_size, *shape))
+                   for name, (shape, dtype) in fields.items()}
+                  for shard in range(num_shards)]
+        entry_capacity, entry_fields = spec['entry_capacity'], spec['entry_fields']
+        entries = {name: np.memmap(entries_path(path, name), dtype=dtype, mode=mode, shape=(entry_capacity,))
+                   for name, dtype in entry_fields.items()}
+        header = np.memmap(os.path.join(path, HEADER_FILE_NAME), dtype=np.int64, mode='r+', shape=(HEADER_SIZE,))
+        return cls(path, shard_size, num_shards, fields, shards, entry_capacity, entry_fields, entries, header, lock)
+
+    def __len__(self):
+        return int(self.header[COUNT])
+
+    # [samples] maps each field name to an array with one row per sample. With entry fields, it also has
+    # [ENTRY_LENGTHS] and, for each entry field, one flat array of the entries of all the samples in order. Once the
+    # buffer is full, the oldest samples are overwritten first.
+    def append(self, samples):
+        assert samples.keys() == (self.fields.keys() - {ENTRY_OFFSETS}) | self.entry_fields.keys()
+        n = len(samples['boards'])
+        with self.lock:
+            if self.entry_fields:
+                samples = self._append_entries(samples)
+            assert all(len(samples[name]) == n for name in self.fields)
+            cursor = int(self.header[CURSOR])
+            written = 0
+            while written < n:
+                shard, offset = divmod(cursor, self.shard_size)
+                amt = min(n - written, self.shard_size - offset)
+                for name, arr in self.shards[shard].items():
+                    arr[offset:offset + amt] = samples[name][written:written + amt]
+                written += amt
+                cursor = (cursor + amt) % self.capacity
+            self.header[CURSOR] = cursor
+            self.header[COUNT] = min(self.capacity, int(self.header[COUNT]) + n)
+            if self.entry_fields:
+                self._evict_overwritten()
+
+    def _append_entries(self, samples):
+        lengths = np.asarray(samples[ENTRY_LENGTHS])
+        num_entries = int(lengths.sum())
+        assert num_entries <= self.entry_capacity
+        assert all(len(samples[name]) == num_entries for name in self.entry_fields)
+        start = int(self.header[ENTRIES_WRITTEN])
+        positions = (start + np.arange(num_entries)) % self.entry_capacity
+        for name, arr in self.entries.items():
+            arr[positions] = samples[name]
+        self.header[ENTRIES_WRITTEN] = start + num_entries
+        return {**samples, ENTRY_OFFSETS: start + np.cumsum(lengths) - lengths}
+
+    # Drops the oldest samples for as long as their entries have been overwritten
+    def _evict_overwritten(self):
+        oldest_kept = int(self.header[ENTRIES_WRITTEN]) - self.entry_capacity
+        count = int(self.header[COUNT])
+        row = (int(self.header[CURSOR]) - count) % self.capacity
+        while count:
+            shard, offset = divmod(row, self.shard_size)
+            if self.shards[shard][ENTRY_OFFSETS][offset] >= oldest_kept:
+                break
+            count -= 1
+            row = (row + 1) % self.capacity
+        self.header[COUNT] = count
+
+    def append_experience(self, experience):
+        self.append(experience_to_fields(*experience))
+
+    # Uniformly samples [batch_size] rows (with replacement) from everything currently in the buffer. Rows are copied
+    # straight out of the memmapped shards, one shard at a time. [rng] is a [numpy.random.Generator].
+    #
+    # With entry fields, the batch has each field's entries for all the sampled rows in one flat array, and
+    # [ENTRY_ROWS] says which row each one belongs to.
+    def sample(self, batch_size, rng=None):
+        if rng is None:
+            rng = np.random.default_rng()
+        batch = {name: np.empty((batch_size, *shape), dtype=dtype) for name, (shape, dtype) in self.fields.items()}
+        with self.lock:
+            count = len(self)
+            assert count > 0
+            oldest = int(self.header[CURSOR]) - count
+            positions = np.sort((oldest + rng.integers(count, size=batch_size)) % self.capacity)
+            shards, offsets = np.divmod(positions, self.shard_size)
+            for shard in np.unique(shards):
+                rows = shards == shard
+                for name, arr in self.shards[shard].items():
+                    batch[name][rows] = arr[offsets[rows]]
+            if self.entry_fields:
+                batch.update(self._sample_entries(batch.pop(ENTRY_OFFSETS), batch[ENTRY_LENGTHS]))
+        return batch
+
+    def _sample_entries(self, offsets, lengths):
+        lengths = lengths.astype(np.int64)
+        starts = np.cumsum(lengths) - lengths
+        # The position of each entry within its sample's entries
+        within = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+        positions = (np.repeat(offsets, lengths) + within) % self.entry_capacity
+        entries = {name: arr[positions] for name, arr in self.entries.items()}
+        entries[ENTRY_ROWS] = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        return entries
+
+    def flush(self):
+        for shard in self.shards:
+            for arr in shard.values():
+                arr.flush()
+        for arr in self.entries.values():
+            arr.flush()
+        self.header.flush()
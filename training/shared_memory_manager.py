@@ -22,6 +22,8 @@ class DataType(Enum):
     DATA = 1
     PREDS = 2
     DIRTY = 3
+    MODEL_IDS = 4
+    MODEL_VERSIONS = 5
 
 
 def get_boards_shape(num_slots):
@@ -43,6 +45,8 @@ class Env:
     data_shared = attr.ib()
     preds_shared = attr.ib()
     dirty_shared = attr.ib()
+    model_ids_shared = attr.ib()
+    model_versions_shared = attr.ib()
 
     @classmethod
     def init(cls, *, num_slots, env_id):
@@ -59,6 +63,7 @@ class Env:
 
         dirty_shape = (num_slots, 3)
         dirty_dummy = np.ndarray(dirty_shape, dtype=np.float64)
+        model_ids_dummy = np.ndarray((num_slots,), dtype=np.int64)
         boards_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.BOARDS), create=True,
                                                    size=boards_dummy.nbytes)
         data_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.DATA), create=True,
@@ -68,7 +73,12 @@ class Env:
                         for head in model_const.Head]
         dirty_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.DIRTY), create=True,
                                                   size=dirty_dummy.nbytes)
-        return cls(env_id, boards_shared, data_shared, preds_shared, dirty_shared)
+        model_ids_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.MODEL_IDS), create=True,
+                                                      size=model_ids_dummy.nbytes)
+        model_versions_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.MODEL_VERSIONS),
+                                                           create=True, size=model_ids_dummy.nbytes)
+        return cls(env_id, boards_shared, data_shared, preds_shared, dirty_shared, model_ids_shared,
+                   model_versions_shared)
 
 
 @attr.s(slots=True)
@@ -81,6 +91,10 @@ class View:
     data = attr.ib()
     preds = attr.ib()
     dirty = attr.ib()
+    # Index of the model that should evaluate each slot's request. Always 0 unless several models are being served.
+    model_ids = attr.ib()
+    # Version of the model that produced each slot's current predictions
+    model_versions = attr.ib()
 
     @classmethod
     def for_evaluator(cls, *, env, num_slots):
@@ -93,7 +107,9 @@ class View:
         preds = [np.ndarray(preds_shapes[i], dtype=np.float64, buffer=env.preds_shared[i].buf)
                  for i in range(len(preds_shapes))]
         dirty = np.ndarray(dirty_shape, dtype=np.float64, buffer=env.dirty_shared.buf)
-        return cls(env, num_slots, board, data, preds, dirty)
+        model_ids = np.ndarray((num_slots,), dtype=np.int64, buffer=env.model_ids_shared.buf)
+        model_versions = np.ndarray((num_slots,), dtype=np.int64, buffer=env.model_versions_shared.buf)
+        return cls(env, num_slots, board, data, preds, dirty, model_ids, model_versions)
 
     @classmethod
     def for_worker(cls, *, env, slots_per_worker, num_workers, worker_id):
@@ -112,7 +128,10 @@ class View:
         # preds = [np.ndarray((slots_per_worker, model.head_sizes[head]), dtype=np.float64,
         #                     buffer=evaluator_view.preds[head.value][start:end]) for head in model_const.Head]
         dirty = np.ndarray((slots_per_worker, 3), dtype=np.float64, buffer=evaluator_view.dirty[start:end])
-        return cls(env, slots_per_worker, board, data, preds, dirty)
+        model_ids = np.ndarray((slots_per_worker,), dtype=np.int64, buffer=evaluator_view.model_ids[start:end])
+        model_versions = np.ndarray((slots_per_worker,), dtype=np.int64,
+                                    buffer=evaluator_view.model_versions[start:end])
+        return cls(env, slots_per_worker, board, data, preds, dirty, model_ids, model_versions)
 
     def write_board(self, board, slot):
         assert 0 <= slot < self.num_slots
@@ -129,7 +148,12 @@ class View:
         self.data[slot, :] = data
         self.dirty[slot, DataType.DATA.value] = 1
 
-    def write_preds(self, preds):
+    def write_model_id(self, model_id, slot):
+        assert 0 <= slot < self.num_slots
+        assert self.dirty[slot, DataType.BOARDS.value] == 0
+        self.model_ids[slot] = model_id
+
+    def write_preds(self, preds, model_versions=0):
         assert self.dirty.shape[0] == self.num_slots
         for i in range(self.num_slots):
             assert self.dirty[i, DataType.PREDS.value] == 0
@@ -138,6 +162,7 @@ class View:
             v = head.value
             assert preds[v].shape == self.preds[v].shape
             self.preds[v][:] = preds[v]
+        self.model_versions[:] = model_versions
 
         self.dirty[:, DataType.PREDS.value] = 1
 
@@ -195,7 +220,10 @@ class SharedMemoryManager:
         preds_shared = [shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.PREDS, head))
                         for head in model_const.Head]
         dirty_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.DIRTY))
-        return Env(env_id, boards_shared, data_shared, preds_shared, dirty_shared)
+        model_ids_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.MODEL_IDS))
+        model_versions_shared = shared_memory.SharedMemory(name=get_segment_name(env_id, DataType.MODEL_VERSIONS))
+        return Env(env_id, boards_shared, data_shared, preds_shared, dirty_shared, model_ids_shared,
+                   model_versions_shared)
 
     def get_worker_view(self, *, env_id, worker_id):
         env = SharedMemoryManager.make_env(env_id)
@@ -212,3 +240,6 @@ class SharedMemoryManager:
             env.data_shared.unlink()
             for pred in env.preds_shared:
                 pred.unlink()
+            env.dirty_shared.unlink()
+            env.model_ids_shared.unlink()
+            env.model_versions_shared.unlink()
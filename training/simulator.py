@@ -1,61 +1,59 @@
 import asyncio
 import attr
 import cProfile
+import itertools
 import logging
-import os
-import signal
-import time
-import uvloop
+import numpy as np
 
 from agents.mcts_zero import MCTSZeroAgent, MCTSZeroAgentManual
-from game.game_state import GameState
+from game import record as game_record
+from game.game_state import GameOptions, GameState, Setup
 from game.play import apply_move
 from play import play
-from training import shared_memory_manager
-from training.worker_env_conn import WorkerEnvConn
+from training import metrics, shared_memory_manager
+from training.metrics import Counter, Phase
+from training.replay_buffer import ReplayBuffer
+from training.socket_transport import RemoteView
 
 
+# Plays games in one slot of one environment as a coroutine. A worker runs one of these per slot, all on one event loop,
+# so the number of games in flight is limited by memory rather than by processes.
 @attr.s(slots=True)
 class AsyncSimulator:
     worker_id = attr.ib()
     env_id = attr.ib()
+    slot = attr.ib()
     agent = attr.ib()
     num_players = attr.ib()
     view = attr.ib()
-    learner_queue = attr.ib()
     worker_env_conn = attr.ib()
+    replay_buffer = attr.ib(default=None)
+    game_options = attr.ib(default=GameOptions())
 
     @classmethod
-    def init(cls, num_workers, worker_id, env, num_players, c, simulations_per_choice, learner_queue):
-        view = shared_memory_manager.View.for_worker(env, num_workers, worker_id)
-        worker_env_conn = WorkerEnvConn.for_worker(env.id, worker_id)
+    def init(cls, *, worker_id, slot, view, worker_env_conn, num_players, c, simulations_per_choice, replay_buffer=None,
+             rng=None, game_options=GameOptions()):
         agent = MCTSZeroAgent(c=c, simulations_per_choice=simulations_per_choice, view=view,
-                                worker_env_conn=worker_env_conn)
-        return cls(worker_id, env.id, agent, num_players, view, learner_queue, worker_env_conn)
-
-    # As long as we haven't just started, there should be a probability distribution waiting for us.
-    # Decode it to get the next move of the simulation, apply that to our game state, and encode
-    # the new game state for the evaluator.
-    async def run_async(self):
-        for _ in range(5):
-            game_state = GameState.from_num_players(self.num_players)
-            self.agent.begin_episode()
+                              worker_env_conn=worker_env_conn, env_slot=slot,
+                              rng=rng if rng is not None else np.random.default_rng())
+        return cls(worker_id, worker_env_conn.env_id, slot, agent, num_players, view, worker_env_conn, replay_buffer,
+                   game_options)
 
+    # [games] is shared by every simulator in the worker; each game played takes one item from it
+    async def run_async(self, games):
+        for _ in games:
+            game_state = GameState.from_setup(Setup.random(self.num_players, self.agent.rng, self.game_options))
+            self.agent.begin_episode(game_state.player_idx_by_faction_name.keys())
             if logging.getLogger().isEnabledFor(logging.DEBUG):
-                logging.debug(f'Worker {self.worker_id} starting a self-play match in environment {self.env_id}')
-            print(f'Worker {self.worker_id} starting a self-play match in environment{self.env_id}')
-            start = time.time()
+                logging.debug(f'Worker {self.worker_id} starting a self-play match in environment {self.env_id}, '
+                              f'slot {self.slot}')
             game_state = await play.play_game(game_state, [self.agent for _ in range(self.num_players)])
-            end = time.time()
-            if logging.getLogger().isEnabledFor(logging.DEBUG):
-                logging.debug(f'Worker {self.worker_id} finished a game at {end} ({end - start} seconds)')
-            print(f'Worker {self.worker_id} finished a game at {end} ({end - start} seconds)')
             self.agent.complete_episode(game_state.winner)
-            # if logging.getLogger().isEnabledFor(logging.DEBUG):
-            #     logging.debug(f'Worker {self.worker_id} adding {len(agent.experience_collector.game_states)} '
-            #                   f'samples to learner queue')
-            # print(f'Worker {self.worker_id} adding {len(self.agent.experience_collector.game_states)} samples to learner queue')
-            # self.learner_queue.put(agent.experience_collector.to_numpy())
+            if self.replay_buffer is not None:
+                for experience_collector in self.agent.experience_collectors.values():
+                    if experience_collector is not None and experience_collector.game_states:
+                        self.replay_buffer.append_experience(experience_collector.to_sparse())
+        self.worker_env_conn.retire_slot(lambda: self.view.write_preds_clean(self.slot))
 
 
 @attr.s(slots=True)
@@ -67,23 +65,56 @@ class Simulator:
     game_states = attr.ib()
     agents = attr.ib()
     num_games = attr.ib(default=None)
+    num_models = attr.ib(default=1)
+    replay_buffer = attr.ib(default=None)
+    # If set, every finished game is appended to this file as a [game.record.GameRecord]
+    game_log_path = attr.ib(default=None)
+    log_visits = attr.ib(default=False)
+    records = attr.ib(default=None)
+    game_options = attr.ib(default=GameOptions())
 
     @classmethod
-    def init(cls, *, worker_id, num_players, num_workers, slots_per_worker, envs, simulations_per_choice, c, num_games=None):
-        views = [shared_memory_manager.View.for_worker(env=env, slots_per_worker=slots_per_worker,
-                                                       num_workers=num_workers, worker_id=worker_id) for env in envs]
-        game_states = [([None] * slots_per_worker) for _ in range(len(envs))]
-        agents = [[MCTSZeroAgentManual(worker_id=worker_id, env_slot=slot, c=c, simulations_per_choice=simulations_per_choice, view=views[env])
-                    for slot in range(slots_per_worker)] for env in range(len(envs))]
+    def init(cls, *, worker_id, num_players, num_workers, slots_per_worker, envs, simulations_per_choice, c, num_games=None,
+             num_models=1, replay_buffer=None, views=None, game_log_path=None, log_visits=False, seed=None,
+             game_options=GameOptions()):
+        # [views] replaces the shared memory views of [envs], e.g. with [socket_transport.RemoteView]s
+        if views is None:
+            views = [shared_memory_manager.View.for_worker(env=env, slots_per_worker=slots_per_worker,
+                                                           num_workers=num_workers, worker_id=worker_id)
+                     for env in envs]
+        game_states = [([None] * slots_per_worker) for _ in range(len(views))]
+        # Each slot has its own generator for its games' setups and its agent's moves, so that with a [seed] the games
+        # a slot plays don't depend on how the slots happen to interleave
+        rngs = np.random.default_rng(seed).spawn(len(views) * slots_per_worker)
+        agents = [[MCTSZeroAgentManual(worker_id=worker_id, env_slot=slot, c=c, simulations_per_choice=simulations_per_choice, view=views[env],
+                                       rng=rngs[env * slots_per_worker + slot])
+                    for slot in range(slots_per_worker)] for env in range(len(views))]
+        records = [([None] * slots_per_worker) for _ in range(len(views))]
         return cls(worker_id, num_players, slots_per_worker, views, game_states,
-                   agents, num_games)
+                   agents, num_games, num_models, replay_buffer, game_log_path=game_log_path,
+                   log_visits=log_visits, records=records, game_options=game_options)
+
+    # When the evaluator is serving more than one model, every game is an arena match. Deal the models out to the
+    # players in a random order so that no model is stuck with the same seat.
+    def assign_models(self, game_state, rng):
+        if self.num_models == 1:
+            return None
+        faction_names = list(game_state.player_idx_by_faction_name.keys())
+        model_ids = rng.permutation(len(faction_names)) % self.num_models
+        return {faction_name: int(model_id) for faction_name, model_id in zip(faction_names, model_ids)}
+
+    def start_game(self, env_num, slot_num):
+        agent = self.agents[env_num][slot_num]
+        setup = Setup.random(self.num_players_per_game, agent.rng, self.game_options)
+        game_state = self.game_states[env_num][slot_num] = GameState.from_setup(setup)
+        if self.game_log_path:
+            self.records[env_num][slot_num] = game_record.GameRecord.new(setup, with_visits=self.log_visits)
+        agent.begin_episode(game_state.player_idx_by_faction_name.keys(), self.assign_models(game_state, agent.rng))
 
     def run(self):
         for env_num in range(len(self.game_states)):
             for slot_num in range(self.slots_per_worker):
-                game_state = GameState.from_num_players(self.num_players_per_game)
-                self.game_states[env_num][slot_num] = game_state
-                self.agents[env_num][slot_num].begin_episode(game_state.player_idx_by_faction_name.keys())
+                self.start_game(env_num, slot_num)
 
         last_game = self.num_games if self.num_games else -1
         this_game = 0
@@ -91,10 +122,13 @@ class Simulator:
         def handle_terminal_state(*, agent, game_state, env_num, slot_num):
             # We finished a self-play episode. Feed the learner and start over.
             agent.complete_episode(game_state.winner)
-            print(f'If there were a learner, we would send {sum([len(e.game_states) for e in agent.experience_collectors.values()])} samples')
-            # This is where we would feed stuff to the learner
-            game_state = self.game_states[env_num][slot_num] = GameState.from_num_players(self.num_players_per_game)
-            agent.begin_episode(game_state.player_idx_by_faction_name.keys())
+            if self.replay_buffer is not None:
+                for experience_collector in agent.experience_collectors.values():
+                    if experience_collector is not None and experience_collector.game_states:
+                        self.replay_buffer.append_experience(experience_collector.to_sparse())
+            if self.game_log_path:
+                game_record.append(self.game_log_path, self.records[env_num][slot_num])
+            self.start_game(env_num, slot_num)
             return MCTSZeroAgentManual.Result.NEXT_SIMULATION, None
 
         while this_game != last_game:
@@ -128,7 +162,10 @@ class Simulator:
                         elif result is MCTSZeroAgentManual.Result.MOVE_SELECTED:
                             # We finished the current simulation. Apply the move and start the next simulation by
                             # updating the game state and current player.
+                            if self.game_log_path:
+                                self.records[env_num][slot_num].record_move(choices, move, agent.last_move_visits)
                             game_state = apply_move(game_state, move)
+                            metrics.increment(Counter.MOVES)
                             if game_state.is_over():
                                 this_game += 1
                                 result, move = handle_terminal_state(agent=agent, game_state=game_state,
@@ -160,51 +197,70 @@ class Simulator:
 
             if this_game != last_game:
                 for env_num, view in enumerate(self.views):
-                    for slot_num in range(slots_per_worker):
+                    for slot_num in range(self.slots_per_worker):
+                        t = metrics.start()
                         view.wait_for_preds(slot_num)
+                        metrics.stop(Phase.WAIT, t)
                         self.agents[env_num][slot_num].decode_predictions_and_propagate_values()
 
 
-def async_worker(wid, num_workers, num_envs, learner_queue, num_players, simulations_per_choice):
-    # os.nice(-20)
-    param = os.sched_param(os.sched_get_priority_max(os.SCHED_FIFO))
-    os.sched_setscheduler(0, os.SCHED_FIFO, param)
-    print(f'Worker {wid} starting')
+# [worker_env_conns] holds this worker's connection to each environment, made by the parent process with
+# [WorkerEnvConn.init]. Every slot of every environment gets its own coroutine. [num_games] is the total for the worker.
+def async_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, simulations_per_choice, c,
+                 worker_env_conns, num_games=None, replay_buffer_path=None, replay_buffer_lock=None, seed=None,
+                 game_options=GameOptions()):
     if logging.getLogger().isEnabledFor(logging.DEBUG):
-        logging.debug(f'Worker {wid} starting')
-    shm_envs = [shared_memory_manager.SharedMemoryManager.make_env(env_id) for env_id in range(num_envs)]
-
-    # A single worker process is responsible for playing N simultaneous games, where N is the number
-    # of environments. We need to get all of the shared memory blocks and then give each
-    # simulator only the slices that it needs to do its job.
-    sims = [AsyncSimulator.init(num_workers, wid, shm_envs[i], num_players, c=0.8,
-                           simulations_per_choice=simulations_per_choice, learner_queue=learner_queue)
-            for i in range(num_envs)]
-
-    # def on_kill(_signum, _stack_frame):
-    #     for sim in sims:
-    #         sim.worker_env_conn.clean_up()
-    #
-    # signal.signal(signal.SIGKILL, on_kill)
-    uvloop.install()
-    asyncio.run(asyncio.wait([sim.run_async() for sim in sims]))
-    for sim in sims:
-        sim.worker_env_conn.clean_up()
-
-
-def profile_async_worker(wid, num_workers, num_envs, learner_queue, num_players, simulations_per_choice):
-    cProfile.runctx('async_worker(wid, num_workers, num_envs, learner_queue, num_players, simulations_per_choice)',
-                    globals(), locals(), sort='tottime')
+        logging.debug(f'Worker {worker_id} starting')
+    envs = [shared_memory_manager.SharedMemoryManager.make_env(env_id) for env_id in range(num_envs)]
+    views = [shared_memory_manager.View.for_worker(env=env, slots_per_worker=slots_per_worker,
+                                                   num_workers=num_workers, worker_id=worker_id) for env in envs]
+    replay_buffer = ReplayBuffer.open(replay_buffer_path, lock=replay_buffer_lock) if replay_buffer_path else None
+    rngs = iter(np.random.default_rng(seed).spawn(num_envs * slots_per_worker))
+    sims = [AsyncSimulator.init(worker_id=worker_id, slot=slot, view=views[env_id],
+                                worker_env_conn=worker_env_conns[env_id], num_players=num_players, c=c,
+                                simulations_per_choice=simulations_per_choice, replay_buffer=replay_buffer,
+                                rng=next(rngs), game_options=game_options)
+            for env_id in range(num_envs) for slot in range(slots_per_worker)]
+    games = iter(range(num_games)) if num_games else itertools.repeat(None)
 
+    async def run_all():
+        await asyncio.gather(*[sim.run_async(games) for sim in sims])
 
-def manual_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, simulations_per_choice, c, num_games=None):
-    os.nice(-20)
-    # param = os.sched_param(os.sched_get_priority_max(os.SCHED_FIFO))
-    # os.sched_setscheduler(0, os.SCHED_FIFO, param)
-    envs = [shared_memory_manager.SharedMemoryManager.make_env(env_id) for env_id in range(num_envs)]
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    try:
+        asyncio.run(run_all())
+    finally:
+        for worker_env_conn in worker_env_conns:
+            worker_env_conn.clean_up()
+
+
+def profile_async_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, simulations_per_choice, c,
+                         worker_env_conns, num_games=None):
+    cProfile.runctx('async_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, '
+                    'simulations_per_choice, c, worker_env_conns, num_games)', globals(), locals(), sort='tottime')
+
+
+def manual_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, simulations_per_choice, c, num_games=None,
+                  num_models=1, replay_buffer_path=None, replay_buffer_lock=None, evaluator_address=None,
+                  game_log_path=None, log_visits=False, seed=None, game_options=GameOptions()):
+    # With an evaluator address we talk to the evaluator over sockets instead of shared memory
+    if evaluator_address:
+        envs = None
+        views = [RemoteView.connect(evaluator_address, env_id=env_id, worker_id=worker_id,
+                                    slots_per_worker=slots_per_worker) for env_id in range(num_envs)]
+    else:
+        envs = [shared_memory_manager.SharedMemoryManager.make_env(env_id) for env_id in range(num_envs)]
+        views = None
     sim = Simulator.init(worker_id=worker_id, num_players=num_players, num_workers=num_workers,
                          slots_per_worker=slots_per_worker, envs=envs, simulations_per_choice=simulations_per_choice,
-                         c=c, num_games=num_games)
+                         c=c, num_games=num_games, num_models=num_models,
+                         replay_buffer=ReplayBuffer.open(replay_buffer_path, lock=replay_buffer_lock)
+                         if replay_buffer_path else None, views=views, game_log_path=game_log_path,
+                         log_visits=log_visits, seed=seed, game_options=game_options)
     sim.run()
 
 
@@ -212,21 +268,3 @@ def profile_manual_worker(worker_id, num_players, num_workers, slots_per_worker,
     cProfile.runctx('manual_worker(worker_id, num_players, num_workers, slots_per_worker, num_envs, simulations_per_choice, c, num_games)',
                     globals(), locals(), sort='tottime')
 
-
-if __name__ == '__main__':
-    import multiprocessing as mp
-    from training import evaluator
-    # logging.getLogger().setLevel(logging.DEBUG)
-    model_base_path = 'C:\\Users\\dan\\PycharmProjects\\ScytheBot\\training\\data'
-    num_envs = 2
-    num_workers = 6
-    slots_per_worker = 6
-    num_slots = num_workers * slots_per_worker
-    smm = shared_memory_manager.SharedMemoryManager.init(num_workers=num_workers, slots_per_worker=slots_per_worker,
-                                                         envs_per_worker=num_envs)
-    ev = mp.Process(target=evaluator.evaluator, args=(num_envs, num_slots, model_base_path, True))
-    ev.start()
-    profile_manual_worker(worker_id=0, num_players=2, num_workers=num_workers, slots_per_worker=slots_per_worker,
-                  num_envs=num_envs, simulations_per_choice=10, c=1, num_games=72)
-    ev.kill()
-    smm.unlink()
\ No newline at end of file
@@ -0,0 +1,287 @@
+import argparse
+import attr
+import numpy as np
+import select
+import socket
+import struct
+import time
+
+from training import metrics
+from training.constants import Head
+from training.evaluator import empty_preds, start_watchers
+from training.metrics import Counter, Phase
+from training.shared_memory_manager import DataType, get_boards_shape, get_data_shape
+
+# An alternative to shared memory for getting encoded game states to the evaluator and predictions back, for when the
+# workers and the evaluator aren't on the same machine. Each worker opens one connection per environment. Requests and
+# responses are length-prefixed frames whose payload is just the bytes of the numpy arrays involved, sent and received
+# in place with scatter/gather I/O so that nothing is serialized or copied on either end:
+#
+#   request:  model_ids (int64) | boards (float64) | data (float64)          for each of the worker's slots
+#   response: model_versions (int64) | one float64 array per model head     for each of the worker's slots
+#
+# A worker sends an environment's batch as soon as its last slot has been written and moves straight on to the next
+# environment, so each worker has up to one batch per environment in flight while the evaluator works through them.
+
+DEFAULT_PORT = 7337
+LENGTH = struct.Struct('<Q')
+# Sent once by the worker after connecting: environment, worker id and number of slots
+HELLO = struct.Struct('<III')
+CONNECT_TIMEOUT_SECONDS = 120
+CONNECT_RETRY_SECONDS = 1
+
+
+def as_bytes(array):
+    return memoryview(array).cast('B')
+
+
+def send_frame(sock, arrays):
+    buffers = [as_bytes(array) for array in arrays]
+    buffers.insert(0, memoryview(LENGTH.pack(sum(len(b) for b in buffers))))
+    while buffers:
+        # sendmsg can come back early if it's interrupted by a signal (the sampling profiler uses one)
+        sent = sock.sendmsg(buffers)
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers:
+            buffers[0] = buffers[0][sent:]
+
+
+def recv_exactly_into(sock, buf):
+    while len(buf):
+        received = sock.recv_into(buf)
+        if not received:
+            raise ConnectionError('Connection closed by peer')
+        buf = buf[received:]
+
+
+# Receives one frame directly into [arrays], which must add up to exactly the size of the frame
+def recv_frame_into(sock, arrays):
+    header = bytearray(LENGTH.size)
+    recv_exactly_into(sock, memoryview(header))
+    length, = LENGTH.unpack(header)
+    expected = sum(array.nbytes for array in arrays)
+    if length != expected:
+        raise ValueError(f'Expected a frame of {expected} bytes but got {length}')
+    for array in arrays:
+        recv_exactly_into(sock, as_bytes(array))
+
+
+def connect(address, timeout=CONNECT_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            sock = socket.create_connection(address)
+            break
+        except ConnectionRefusedError:
+            # The evaluator may still be starting up
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(CONNECT_RETRY_SECONDS)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+# Has the same interface as the worker side of a [View], so the simulator and agents can't tell the difference
+@attr.s(slots=True)
+class RemoteView:
+    sock = attr.ib()
+    num_slots = attr.ib()
+    boards = attr.ib()
+    data = attr.ib()
+    preds = attr.ib()
+    dirty = attr.ib()
+    model_ids = attr.ib()
+    model_versions = attr.ib()
+    # One array per head covering every slot; the response is received into these and [preds] slices them per slot
+    preds_by_head = attr.ib()
+
+    @classmethod
+    def connect(cls, address, *, env_id, worker_id, slots_per_worker, timeout=CONNECT_TIMEOUT_SECONDS):
+        sock = connect(address, timeout)
+        sock.sendall(HELLO.pack(env_id, worker_id, slots_per_worker))
+        boards = np.zeros(get_boards_shape(slots_per_worker), dtype=np.float64)
+        data = np.zeros(get_data_shape(slots_per_worker), dtype=np.float64)
+        preds_by_head = empty_preds(slots_per_worker)
+        preds = [[preds_by_head[head.value][slot] for head in Head] for slot in range(slots_per_worker)]
+        dirty = np.zeros((slots_per_worker, 3), dtype=np.float64)
+        model_ids = np.zeros(slots_per_worker, dtype=np.int64)
+        model_versions = np.zeros(slots_per_worker, dtype=np.int64)
+        return cls(sock, slots_per_worker, boards, data, preds, dirty, model_ids, model_versions, preds_by_head)
+
+    def write_board(self, board, slot):
+        assert 0 <= slot < self.num_slots
+        assert self.dirty[slot, DataType.BOARDS.value] == 0
+        self.boards[slot, :] = board
+        self.dirty[slot, DataType.BOARDS.value] = 1
+
+    def write_data(self, data, slot):
+        assert 0 <= slot < self.num_slots
+        assert self.dirty[slot, DataType.DATA.value] == 0
+        self.data[slot, :] = data
+        self.dirty[slot, DataType.DATA.value] = 1
+        # Data is the last thing written for a slot, so once every slot has some the batch is complete
+        if self.dirty[:, DataType.DATA.value].all():
+            assert self.dirty[:, DataType.BOARDS.value].all()
+            send_frame(self.sock, [self.model_ids, self.boards, self.data])
+            self.dirty[:, DataType.BOARDS.value] = 0
+            self.dirty[:, DataType.DATA.value] = 0
+
+    def write_model_id(self, model_id, slot):
+        assert 0 <= slot < self.num_slots
+        assert self.dirty[slot, DataType.BOARDS.value] == 0
+        self.model_ids[slot] = model_id
+
+    def wait_for_preds(self, slot):
+        assert 0 <= slot < self.num_slots
+        if self.dirty[slot, DataType.PREDS.value] == 0:
+            recv_frame_into(self.sock, [self.model_versions] + self.preds_by_head)
+            self.dirty[:, DataType.PREDS.value] = 1
+
+    def write_preds_clean(self, slot):
+        assert 0 <= slot < self.num_slots
+        self.dirty[slot, DataType.PREDS.value] = 0
+
+    def close(self):
+        self.sock.close()
+
+
+@attr.s(slots=True, eq=False)
+class WorkerConn:
+    sock = attr.ib()
+    worker_id = attr.ib()
+    num_slots = attr.ib()
+    # This worker's rows of the environment's batch
+    rows = attr.ib(default=None)
+
+
+# The evaluator's side of one environment: every connected worker's slots, stacked into one batch. Each worker's
+# requests are received directly into its rows and its responses are sent directly out of them.
+@attr.s(slots=True)
+class EnvBatch:
+    conns = attr.ib(factory=list)
+    model_ids = attr.ib(default=None)
+    boards = attr.ib(default=None)
+    data = attr.ib(default=None)
+    preds = attr.ib(default=None)
+    versions = attr.ib(default=None)
+
+    def allocate(self):
+        offset = 0
+        for conn in self.conns:
+            conn.rows = slice(offset, offset + conn.num_slots)
+            offset += conn.num_slots
+        self.model_ids = np.zeros(offset, dtype=np.int64)
+        self.boards = np.zeros(get_boards_shape(offset), dtype=np.float64)
+        self.data = np.zeros(get_data_shape(offset), dtype=np.float64)
+        self.preds = empty_preds(offset)
+        self.versions = np.zeros(offset, dtype=np.int64)
+
+    def add(self, conn):
+        self.conns.append(conn)
+        self.allocate()
+
+    def remove(self, conns):
+        for conn in conns:
+            print(f'Worker {conn.worker_id} disconnected')
+            conn.sock.close()
+        self.conns = [conn for conn in self.conns if conn not in conns]
+        self.allocate()
+
+
+def listen(address):
+    return socket.create_server(address, backlog=socket.SOMAXCONN)
+
+
+# Takes on any workers that are waiting to connect. Blocks until one does if [block] is set.
+def accept_workers(listener, batches, block):
+    while select.select([listener], [], [], None if block else 0)[0]:
+        sock, peer = listener.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = bytearray(HELLO.size)
+        try:
+            recv_exactly_into(sock, memoryview(hello))
+        except ConnectionError:
+            sock.close()
+            continue
+        env_id, worker_id, num_slots = HELLO.unpack(hello)
+        if env_id >= len(batches):
+            print(f'Worker {worker_id} at {peer} asked for environment {env_id}, but there are only {len(batches)}')
+            sock.close()
+            continue
+        batches[env_id].add(WorkerConn(sock, worker_id, num_slots))
+        print(f'Worker {worker_id} at {peer} connected to environment {env_id} with {num_slots} slots')
+        block = False
+
+
+def predict(batch, current_models):
+    for model_id, current_model in enumerate(current_models):
+        slots = np.flatnonzero(batch.model_ids == model_id)
+        if not len(slots):
+            continue
+        version, nn = current_model()
+        if len(slots) == len(batch.model_ids):
+            predictions = nn.predict([batch.boards, batch.data], batch_size=len(slots))
+        else:
+            predictions = nn.predict([batch.boards[slots], batch.data[slots]], batch_size=len(slots))
+        batch.versions[slots] = version
+        for head, head_preds in zip(batch.preds, predictions):
+            head[slots] = head_preds
+
+
+# Like [evaluate_forever], but for workers connected through [listener]. [current_models] holds a function per model
+# id returning the version and the model to use for the next batch. Workers can connect and disconnect at any time;
+# they're added to or dropped from their environment's batch between rounds.
+def serve_forever(listener, num_envs, current_models):
+    batches = [EnvBatch() for _ in range(num_envs)]
+    while True:
+        accept_workers(listener, batches, block=not any(batch.conns for batch in batches))
+        for batch in batches:
+            if not batch.conns:
+                continue
+            t = metrics.start()
+            lost = []
+            for conn in batch.conns:
+                try:
+                    recv_frame_into(conn.sock, [batch.model_ids[conn.rows], batch.boards[conn.rows],
+                                                batch.data[conn.rows]])
+                except ConnectionError:
+                    lost.append(conn)
+            metrics.stop(Phase.BATCH_WAIT, t)
+            t = metrics.start()
+            predict(batch, current_models)
+            metrics.stop(Phase.PREDICT, t)
+            metrics.increment(Counter.REQUESTS, len(batch.model_ids) - sum(conn.num_slots for conn in lost))
+            for conn in batch.conns:
+                if conn in lost:
+                    continue
+                try:
+                    send_frame(conn.sock, [batch.versions[conn.rows]] + [head[conn.rows] for head in batch.preds])
+                except ConnectionError:
+                    lost.append(conn)
+            if lost:
+                batch.remove(lost)
+
+
+# The evaluator process for the socket transport. We listen before loading the model so that workers that start
+# first wait in the backlog instead of retrying.
+def socket_evaluator(num_envs, address, model_base_paths):
+    listener = listen(address)
+    watchers = start_watchers(model_base_paths)
+    serve_forever(listener, num_envs, [watcher.current for watcher in watchers])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve predictions to self-play workers on other machines')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--num-envs', type=int, required=True)
+    parser.add_argument('--model-base-path', nargs='+', required=True,
+                        help='More than one serves an arena; workers pick a model per game')
+    args = parser.parse_args(argv)
+    socket_evaluator(args.num_envs, (args.host, args.port), args.model_base_path)
+
+
+if __name__ == '__main__':
+    main()
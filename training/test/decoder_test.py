@@ -225,17 +225,13 @@ def test_decoding(preds, top_action_class, choices):
     if top_action_class is MoveOnePiece:
         priors = decode.get_board_coords_and_piece_typ_priors(choices, preds[Head.BOARD_COORDS_HEAD.value],
                                                               preds[Head.PIECE_TYP_HEAD.value])
-        for (board_coords, piece_typ) in choices:
-            actual = priors[(board_coords, piece_typ)]
+        for (board_coords, piece_typ), actual in zip(choices, priors):
             expected = (Head.BOARD_COORDS_HEAD.value * 100 + board_coords_value(board_coords)) \
                        * (Head.PIECE_TYP_HEAD.value * 100 + enum_value(piece_typ))
             assert expected == actual
     else:
-        head = decode.model_head_by_action_class[top_action_class].value
-        priors = {choice: preds[head][decode.decoders[top_action_class](choice)] for choice in choices}
-
-        for choice in choices:
-            actual = priors[choice]
+        priors = decode.get_move_priors(preds, top_action_class, choices)
+        for choice, actual in zip(choices, priors):
             expected = decode.model_head_by_action_class[top_action_class].value * 100 \
                        + to_expected_value[top_action_class](choice)
             assert expected == actual
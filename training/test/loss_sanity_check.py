@@ -24,7 +24,7 @@ def do_it():
         agent.complete_episode(game_state.winner)
 
     experience_collector = agents[0].experience_collector
-    encoded_boards, encoded_data, values_and_move_probs = experience_collector.to_numpy()
+    encoded_boards, encoded_data, values_and_move_probs, _ = experience_collector.to_numpy()
 
     preds = nn([encoded_boards, encoded_data])
     print(f'{len(experience_collector.game_states)} game states')
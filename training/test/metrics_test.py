@@ -0,0 +1,48 @@
+import os
+import time
+
+from multiprocessing import resource_tracker
+
+from training import metrics
+from training.metrics import Counter
+from training.orchestrator import Config, ManagedProcess, Orchestrator
+
+
+def count_games_forever():
+    metrics.increment(Counter.GAMES)
+    while True:
+        time.sleep(1)
+
+
+def wait_for_games(name):
+    for _ in range(100):
+        process_metrics = metrics.read(name)
+        if process_metrics is not None and process_metrics[1][Counter.GAMES.value]:
+            return
+        time.sleep(0.1)
+    raise AssertionError(f'{name} never published its metrics')
+
+
+# A worker that's terminated doesn't run its exit handlers, so it's up to the orchestrator to remove its segment
+def test_shut_down_unlinks_segments():
+    name = f'metrics-test-{os.getpid()}'
+    managed = ManagedProcess(name, min(os.sched_getaffinity(0)), 0, True, None, count_games_forever, ())
+    orchestrator = Orchestrator(Config(), None, [managed], [])
+    # Shared with the worker, as it is when the shared memory manager starts it before anything is forked. Otherwise
+    # the worker would get a tracker of its own that cleans up after it anyway.
+    resource_tracker.ensure_running()
+    try:
+        orchestrator.start()
+        wait_for_games(name)
+    finally:
+        orchestrator.shut_down()
+    assert metrics.read(name) is None
+
+
+def run_tests():
+    test_shut_down_unlinks_segments()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
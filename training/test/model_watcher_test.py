@@ -0,0 +1,101 @@
+import numpy as np
+import os
+import tempfile
+import threading
+
+from training import model
+from training.constants import Head
+from training.evaluator import ModelWatcher, evaluate_forever
+from training.shared_memory_manager import SharedMemoryManager, View
+
+SLOTS = 3
+POLL_SECONDS = 0.01
+MAX_ROUNDS = 10000
+
+
+# Every head predicts the number saved in the model file
+class ConstantModel:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, inputs, batch_size):
+        return [np.full((batch_size, model.head_sizes[head]), self.value) for head in Head]
+
+
+# Stands in for [model.load], remembering which thread every model was loaded on
+def loader(loaded_on):
+    def load(model_base_path):
+        loaded_on.append(threading.get_ident())
+        with open(os.path.join(model_base_path, model.MODEL_FILE_NAME)) as f:
+            return ConstantModel(float(f.read()))
+    return load
+
+
+# Swapped in the same way as [model.save]
+def save(value, model_base_path):
+    model_file = os.path.join(model_base_path, model.MODEL_FILE_NAME)
+    with open(model_file + '.tmp', 'w') as f:
+        f.write(str(value))
+    os.replace(model_file + '.tmp', model_file)
+
+
+def request_predictions(view):
+    for slot in range(SLOTS):
+        view.write_board(np.zeros(view.boards.shape[1:]), slot)
+        view.write_data(np.zeros(view.data.shape[1:]), slot)
+    values = set()
+    versions = set()
+    for slot in range(SLOTS):
+        view.wait_for_preds(slot)
+        values.update(np.unique(np.concatenate([view.preds[slot][head.value] for head in Head])))
+        versions.add(int(view.model_versions[slot]))
+        view.write_preds_clean(slot)
+    # Every batch comes from a single model
+    assert len(values) == 1 and len(versions) == 1, (values, versions)
+    return values.pop(), versions.pop()
+
+
+# Saves a new model while the evaluator is running: it has to be loaded on the evaluator's own thread, since a
+# TensorFlow graph belongs to the thread that built it, and the very next batch should use it.
+def test_swap_under_running_evaluator():
+    smm = SharedMemoryManager.init(num_workers=1, slots_per_worker=SLOTS, envs_per_worker=1)
+    evaluator_thread = []
+    loaded_on = []
+
+    def run_evaluator():
+        evaluator_thread.append(threading.get_ident())
+        view = View.for_evaluator(env=SharedMemoryManager.make_env(0), num_slots=SLOTS)
+        watcher = ModelWatcher.start(model_base_path, POLL_SECONDS, loader(loaded_on))
+        evaluate_forever([view], watcher.current, SLOTS)
+
+    try:
+        with tempfile.TemporaryDirectory() as model_base_path:
+            save(1, model_base_path)
+            first_version = model.version(model_base_path)
+            threading.Thread(target=run_evaluator, daemon=True).start()
+            view = View.for_worker(env=SharedMemoryManager.make_env(0), slots_per_worker=SLOTS, num_workers=1,
+                                   worker_id=0)
+            assert request_predictions(view) == (1, first_version)
+            save(2, model_base_path)
+            second_version = model.version(model_base_path)
+            assert second_version != first_version
+            for _ in range(MAX_ROUNDS):
+                value, version = request_predictions(view)
+                if version == second_version:
+                    break
+                assert (value, version) == (1, first_version)
+            else:
+                raise AssertionError('The evaluator never picked up the new model')
+            assert value == 2
+            assert loaded_on == evaluator_thread * 2, (loaded_on, evaluator_thread)
+    finally:
+        smm.unlink()
+
+
+def run_tests():
+    test_swap_under_running_evaluator()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
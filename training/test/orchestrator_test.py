@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+from training.orchestrator import Config, ManagedProcess, Orchestrator
+
+
+def sleep_forever():
+    while True:
+        time.sleep(1)
+
+
+def exit_with(code):
+    sys.exit(code)
+
+
+def managed_process(name, target, *args):
+    return ManagedProcess(name, min(os.sched_getaffinity(0)), 0, False, None, target, args)
+
+
+# Starts everything and waits for the processes that are going to exit to do so
+def started(workers, services):
+    orchestrator = Orchestrator(Config(), None, workers, services)
+    orchestrator.start()
+    for managed in workers + services:
+        if managed.target is exit_with:
+            managed.process.join()
+    return orchestrator
+
+
+def check_supervise(worker_target, worker_args, service_exitcode, *, running, worker_restarts, service_restarts):
+    worker = managed_process('worker-0', worker_target, *worker_args)
+    service = managed_process('evaluator', exit_with, service_exitcode)
+    orchestrator = started([worker], [service])
+    try:
+        assert orchestrator.supervise() is running
+        assert worker.restarts == worker_restarts and service.restarts == service_restarts
+    finally:
+        orchestrator.shut_down()
+
+
+# A service that finished on its own isn't restarted, but one that crashed is
+def test_services_restarted_only_after_crashes():
+    check_supervise(sleep_forever, (), 0, running=True, worker_restarts=0, service_restarts=0)
+    check_supervise(sleep_forever, (), 1, running=True, worker_restarts=0, service_restarts=1)
+
+
+def test_crashed_worker_restarted():
+    check_supervise(exit_with, (1,), 0, running=True, worker_restarts=1, service_restarts=0)
+
+
+# Once the workers are done, so are the services, whatever state they're in
+def test_services_not_supervised_after_workers_finish():
+    check_supervise(exit_with, (0,), 1, running=False, worker_restarts=0, service_restarts=0)
+
+
+def run_tests():
+    test_services_restarted_only_after_crashes()
+    test_crashed_worker_restarted()
+    test_services_not_supervised_after_workers_finish()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
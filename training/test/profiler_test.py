@@ -0,0 +1,50 @@
+import sys
+
+from training.profiler import MAX_STACK_DEPTH, SamplingProfiler
+
+
+# Stand-ins named after the functions [profiler.phase_of] looks for, so that a sample taken at the bottom of [recurse]
+# is in the selection phase of a search however deep the recursion goes
+def advance_until_predictions_needed_or_move_selected_or_game_over(profiler, depth):
+    return select_branch(profiler, depth)
+
+
+def select_branch(profiler, depth):
+    return recurse(profiler, depth)
+
+
+def recurse(profiler, depth):
+    if depth:
+        return recurse(profiler, depth - 1)
+    profiler.sample(None, sys._getframe())
+
+
+def sampled_stack(depth):
+    profiler = SamplingProfiler()
+    advance_until_predictions_needed_or_move_selected_or_game_over(profiler, depth)
+    (stack,) = profiler.stacks_by_action['none']
+    return stack.split(';')
+
+
+def test_shallow_stack():
+    stack = sampled_stack(3)
+    assert stack[0] == 'selection'
+    assert stack[-1].endswith(':recurse')
+
+
+# The phase functions are too far from the top of the stack to be written out, but they still decide the phase
+def test_deep_stack():
+    stack = sampled_stack(2 * MAX_STACK_DEPTH)
+    assert stack[0] == 'selection'
+    assert len(stack) == 1 + MAX_STACK_DEPTH
+    assert all(name.endswith(':recurse') for name in stack[1:])
+
+
+def run_tests():
+    test_shallow_stack()
+    test_deep_stack()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,200 @@
+import multiprocessing as mp
+import numpy as np
+import tempfile
+
+from agents.mcts_zero import experience_collectors_from_record
+from game.test.record_test import play_and_record
+from training import model, replay_buffer as rb
+from training.replay_buffer import ReplayBuffer
+
+FIELDS = {'boards': ((2, 3), 'float32'), 'model_versions': ((), 'int64')}
+ENTRY_FIELDS = {'heads': 'int8', 'probs': 'float32'}
+# Boards big enough that copying one out of the buffer takes a while, to widen the window for a torn read
+BIG_FIELDS = {'boards': ((64, 64, 8), 'float32'), 'model_versions': ((), 'int64')}
+
+
+def make_samples(start, n, fields=FIELDS):
+    ids = np.arange(start, start + n)
+    shape = fields['boards'][0]
+    return {'boards': np.broadcast_to(ids.reshape(n, *[1] * len(shape)), (n, *shape)).astype(np.float32),
+            'model_versions': ids}
+
+
+# Sample i has i % 4 entries, each of which holds i
+def make_samples_with_entries(start, n):
+    samples = make_samples(start, n)
+    ids = samples['model_versions']
+    lengths = (ids % 4).astype(np.int16)
+    entry_ids = np.repeat(ids, lengths)
+    samples.update({rb.ENTRY_LENGTHS: lengths, 'heads': entry_ids.astype(np.int8),
+                    'probs': entry_ids.astype(np.float32)})
+    return samples
+
+
+def check_entries(batch):
+    for row, version in enumerate(batch['model_versions']):
+        entries = batch[rb.ENTRY_ROWS] == row
+        assert entries.sum() == version % 4
+        assert (batch['probs'][entries] == version).all()
+        assert (batch['heads'][entries] == version).all()
+
+
+def test_ring_eviction():
+    with tempfile.TemporaryDirectory() as path:
+        check_ring_eviction(path)
+
+
+def check_ring_eviction(path):
+    buffer = ReplayBuffer.create(path, shard_size=4, num_shards=3, lock=mp.Lock(), fields=FIELDS)
+    buffer.append(make_samples(0, 5))
+    assert len(buffer) == 5
+    # Wraps around: samples 12 and 13 overwrite samples 0 and 1
+    buffer.append(make_samples(5, 9))
+    assert len(buffer) == 12
+    assert buffer.header[0] == 2
+    stored = np.concatenate([shard['model_versions'] for shard in buffer.shards])
+    assert sorted(stored) == list(range(2, 14))
+
+
+def test_sample():
+    with tempfile.TemporaryDirectory() as path:
+        buffer = ReplayBuffer.create(path, shard_size=4, num_shards=3, lock=mp.Lock(), fields=FIELDS)
+        buffer.append(make_samples(100, 7))
+        check_sample(buffer.sample(64, rng=np.random.default_rng(0)), range(100, 107))
+
+
+def check_sample(batch, versions):
+    assert batch['boards'].shape == (64, 2, 3)
+    assert set(batch['model_versions']) <= set(versions)
+    # Every field of a sampled row must come from the same sample
+    for board, version in zip(batch['boards'], batch['model_versions']):
+        assert (board == version).all()
+
+
+def test_entries():
+    with tempfile.TemporaryDirectory() as path:
+        buffer = ReplayBuffer.create(path, shard_size=4, num_shards=3, lock=mp.Lock(), fields=FIELDS,
+                                     entry_fields=ENTRY_FIELDS)
+        buffer.append(make_samples_with_entries(100, 7))
+        batch = buffer.sample(64, rng=np.random.default_rng(0))
+        assert set(batch['model_versions']) <= set(range(100, 107))
+        check_entries(batch)
+        # Wrapping around the sample ring leaves the entries of the samples that are left alone
+        buffer.append(make_samples_with_entries(107, 9))
+        assert len(buffer) == 12
+        batch = buffer.sample(64, rng=np.random.default_rng(1))
+        assert set(batch['model_versions']) <= set(range(104, 116))
+        check_entries(batch)
+
+
+# Samples whose entries have been overwritten are evicted, even though their rows haven't been
+def test_entry_ring_eviction():
+    with tempfile.TemporaryDirectory() as path:
+        buffer = ReplayBuffer.create(path, shard_size=4, num_shards=2, lock=mp.Lock(), fields=FIELDS,
+                                     entry_fields=ENTRY_FIELDS, entries_per_sample=1)
+        # 6 entries
+        buffer.append(make_samples_with_entries(0, 4))
+        assert len(buffer) == 4
+        # 6 more, which overwrite the entries of samples 1, 2 and 3, so sample 0 has to go too
+        buffer.append(make_samples_with_entries(4, 4))
+        assert len(buffer) == 4
+        batch = buffer.sample(64, rng=np.random.default_rng(0))
+        assert set(batch['model_versions']) == set(range(4, 8))
+        check_entries(batch)
+
+
+# Self-play experience goes through the buffer with its policy targets intact
+def test_experience():
+    game_record, _, _ = play_and_record(np.random.default_rng(0))
+    (experience_collector, *_) = experience_collectors_from_record(game_record).values()
+    # Tag each sample with its own model version to tell them apart
+    experience_collector.model_versions = list(range(len(experience_collector.game_states)))
+    experience = experience_collector.to_sparse()
+    _, _, dense_targets, _ = experience_collector.to_numpy()
+    n = len(experience_collector.game_states)
+    with tempfile.TemporaryDirectory() as path:
+        buffer = ReplayBuffer.create(path, shard_size=n, num_shards=1, lock=mp.Lock())
+        buffer.append_experience(experience)
+        batch = buffer.sample(n, rng=np.random.default_rng(0))
+    sampled_targets = model.sparse_to_dense(batch['values'], batch[rb.ENTRY_ROWS], batch['policy_heads'],
+                                            batch['policy_indices'], batch['policy_probs'])
+    for row, i in enumerate(batch['model_versions']):
+        for sampled, dense in zip(sampled_targets, dense_targets):
+            assert np.allclose(sampled[row], dense[i])
+
+
+# A restart keeps what's already in the buffer, unless the buffer it asks for is a different one
+def test_reopen():
+    with tempfile.TemporaryDirectory() as path:
+        kwargs = {'shard_size': 4, 'num_shards': 3, 'lock': mp.Lock(), 'fields': FIELDS, 'entry_fields': ENTRY_FIELDS}
+        ReplayBuffer.open_or_create(path, **kwargs).append(make_samples_with_entries(0, 5))
+        buffer = ReplayBuffer.open_or_create(path, **kwargs)
+        assert len(buffer) == 5
+        buffer.append(make_samples_with_entries(5, 2))
+        batch = buffer.sample(64, rng=np.random.default_rng(0))
+        assert set(batch['model_versions']) == set(range(7))
+        check_entries(batch)
+        buffer = ReplayBuffer.open_or_create(path, **{**kwargs, 'num_shards': 2})
+        assert len(buffer) == 0 and buffer.num_shards == 2
+
+
+def append_from_child(path, lock, start):
+    ReplayBuffer.open(path, lock=lock).append(make_samples(start, 3))
+
+
+def test_shared_between_processes():
+    with tempfile.TemporaryDirectory() as path:
+        check_shared_between_processes(path)
+
+
+def check_shared_between_processes(path):
+    lock = mp.Lock()
+    buffer = ReplayBuffer.create(path, shard_size=8, num_shards=2, lock=lock, fields=FIELDS)
+    procs = [mp.Process(target=append_from_child, args=(path, lock, 10 * i)) for i in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert len(buffer) == 12
+    stored = np.concatenate([shard['model_versions'] for shard in buffer.shards])[:12]
+    assert sorted(stored) == [10 * i + j for i in range(4) for j in range(3)]
+
+
+def append_forever(path, lock, stop):
+    buffer = ReplayBuffer.open(path, lock=lock)
+    start = 0
+    while not stop.is_set():
+        buffer.append(make_samples(start, 5, BIG_FIELDS))
+        start += 5
+
+
+# Samples while another process keeps overwriting the ring, so that an unlocked copy would eventually read a board from
+# one sample next to the model version of another
+def test_sample_during_appends():
+    with tempfile.TemporaryDirectory() as path:
+        lock = mp.Lock()
+        buffer = ReplayBuffer.create(path, shard_size=4, num_shards=2, lock=lock, fields=BIG_FIELDS)
+        buffer.append(make_samples(0, 1, BIG_FIELDS))
+        stop = mp.Event()
+        writer = mp.Process(target=append_forever, args=(path, lock, stop))
+        writer.start()
+        try:
+            rng = np.random.default_rng(0)
+            for _ in range(200):
+                batch = buffer.sample(16, rng=rng)
+                for board, version in zip(batch['boards'], batch['model_versions']):
+                    assert (board == version).all()
+        finally:
+            stop.set()
+            writer.join()
+
+
+def run_tests():
+    for test in [test_ring_eviction, test_sample, test_entries, test_entry_ring_eviction, test_experience,
+                 test_reopen, test_shared_between_processes, test_sample_during_appends]:
+        test()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
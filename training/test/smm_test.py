@@ -4,7 +4,6 @@ import numpy as np
 
 from training import model, constants as model_const
 from training import shared_memory_manager
-from training.worker_env_conn import WorkerEnvConn
 
 
 def board_value(*, env_id, worker_id, slot, row, col, plane):
@@ -99,32 +98,36 @@ def worker_manual(num_envs, num_workers, slots_per_worker, worker_id):
                 my_view.write_preds_clean(slot)
 
 
-async def worker_coro(env_id, num_workers, slots_per_worker, worker_id):
+async def worker_coro(worker_env_conn, num_workers, slots_per_worker, worker_id):
     # A worker should write down some fake data into its reserved area for game encodings, sleep, and then
     # read back prediction data.
+    env_id = worker_env_conn.env_id
     print(f'Worker {worker_id+1} of {num_workers} starting for environment {env_id}')
-    worker_env_conn = WorkerEnvConn.for_worker(env_id=env_id, worker_id=worker_id)
     my_view = view_for_worker(worker_id=worker_id, slots_per_worker=slots_per_worker, num_workers=num_workers,
                               env_id=env_id)
     while True:
-        for slot in slots_per_worker:
+        for slot in range(slots_per_worker):
             board_data = np.fromfunction(lambda x, y, z: board_value(env_id=env_id, worker_id=worker_id, slot=slot, row=x,
-                                                                     col=y, plane=z), my_view.board.shape)
+                                                                     col=y, plane=z), my_view.boards[slot].shape)
             my_view.write_board(board_data, slot)
             data_data = np.fromfunction(lambda x: data_value(env_id=env_id, worker_id=worker_id, slot=slot, index=x),
-                                        my_view.data.shape)
+                                        my_view.data[slot].shape)
             my_view.write_data(data_data, slot)
 
         print(f'Worker {worker_id+1} signalling evaluator for environment {env_id}')
-        worker_env_conn.wake_up_env(worker_id)
-        received_env_id = await worker_env_conn.worker_get_woken_up()
-        print(f'Worker {worker_id+1} received signal from evaluator {received_env_id} (expected: {env_id})')
+        await asyncio.gather(*[worker_env_conn.request_predictions() for _ in range(slots_per_worker)])
+        print(f'Worker {worker_id+1} received signal from evaluator {env_id}')
         check_preds(preds=my_view.preds, env_id=env_id, worker_id=worker_id, slots_per_worker=slots_per_worker)
-        clear_preds(my_view.preds)
+        clear_preds(my_view.preds, slots_per_worker)
+        for slot in range(slots_per_worker):
+            my_view.write_preds_clean(slot)
 
 
-def worker_async(num_envs, num_workers, slots_per_worker, worker_id):
-    asyncio.run(asyncio.wait([worker_coro(env_id, num_workers, slots_per_worker, worker_id) for env_id in range(num_envs)]))
+def worker_async(worker_env_conns, num_workers, slots_per_worker, worker_id):
+    async def run_all():
+        await asyncio.gather(*[worker_coro(worker_env_conn, num_workers, slots_per_worker, worker_id)
+                               for worker_env_conn in worker_env_conns])
+    asyncio.run(run_all())
 
 
 def view_for_evaluator(env_id, num_slots):
@@ -138,19 +141,16 @@ def view_for_evaluator(env_id, num_slots):
     return view
 
 
-async def evaluator_coro(num_workers, slots_per_worker, env_id):
+async def evaluator_coro(worker_env_conns, num_workers, slots_per_worker, env_id):
     print(f'Evaluator {env_id} starting up')
-    worker_env_conns = [WorkerEnvConn.for_env(env_id=env_id, worker_id=worker_id) for worker_id in range(num_workers)]
     num_slots = num_workers * slots_per_worker
     # An evaluator should sleep, read data for game encodings, and then write back prediction data.
     my_view = view_for_evaluator(env_id, num_slots)
     while True:
-        for conn in worker_env_conns:
-            worker_id = await conn.env_get_woken_up()
-            print(f'Evaluator {env_id} received a wake-up signal from worker {worker_id+1}')
+        await asyncio.gather(*[conn.env_get_woken_up() for conn in worker_env_conns])
         print(f'Evaluator {env_id} received all wake-up signals')
-        check_boards(boards=my_view.board, num_workers=num_workers, slots_per_worker=slots_per_worker, env_id=env_id)
-        my_view.board[:] = 0
+        check_boards(boards=my_view.boards, num_workers=num_workers, slots_per_worker=slots_per_worker, env_id=env_id)
+        my_view.boards[:] = 0
         my_view.write_boards_clean()
         check_data(data=my_view.data, num_workers=num_workers, slots_per_worker=slots_per_worker, env_id=env_id)
         my_view.data[:] = 0
@@ -160,16 +160,19 @@ async def evaluator_coro(num_workers, slots_per_worker, env_id):
             for worker_id in range(num_workers):
                 for index in range(model.head_sizes[head]):
                     for slot in range(slots_per_worker):
-                        preds[head.value][worker_id, index] = \
+                        preds[head.value][worker_id * slots_per_worker + slot, index] = \
                             pred_value(env_id=env_id, worker_id=worker_id, slot=slot, head=head, index=index)
         my_view.write_preds(preds)
         print(f'Evaluator {env_id} notifying all workers that their predictions are ready')
         for conn in worker_env_conns:
-            conn.wake_up_worker(env_id)
+            conn.wake_up_worker()
 
 
-def evaluator_async(num_workers, slots_per_worker, num_envs):
-    asyncio.run(asyncio.wait([evaluator_coro(num_workers, slots_per_worker, env_id) for env_id in range(num_envs)]))
+def evaluator_async(worker_env_conns_by_env, num_workers, slots_per_worker):
+    async def run_all():
+        await asyncio.gather(*[evaluator_coro(worker_env_conns, num_workers, slots_per_worker, env_id)
+                               for env_id, worker_env_conns in enumerate(worker_env_conns_by_env)])
+    asyncio.run(run_all())
 
 
 def evaluator_manual(num_workers, slots_per_worker, num_envs):
@@ -0,0 +1,92 @@
+import numpy as np
+import threading
+
+from training import model
+from training.constants import Head
+from training.socket_transport import RemoteView, listen, serve_forever
+
+NUM_ROUNDS = 3
+SLOTS_PER_WORKER = 3
+
+
+# Every head predicts the first data entry of its request plus the head's index, so each worker can check that it got
+# the predictions for its own requests
+class EchoModel:
+    def predict(self, inputs, batch_size):
+        _, data = inputs
+        assert len(data) == batch_size
+        return [np.repeat(data[:, :1] + head.value, model.head_sizes[head], axis=1) for head in Head]
+
+
+def start_server(num_envs, num_models):
+    listener = listen(('localhost', 0))
+    nn = EchoModel()
+    current_models = [lambda version=version: (version, nn) for version in range(1, num_models + 1)]
+    threading.Thread(target=serve_forever, args=(listener, num_envs, current_models), daemon=True).start()
+    return listener.getsockname()
+
+
+def request_id(env_id, worker_id, slot, round_num):
+    return 1000 * round_num + 100 * env_id + 10 * worker_id + slot
+
+
+def play_rounds(address, env_id, worker_id, num_rounds, num_models, errors):
+    try:
+        view = RemoteView.connect(address, env_id=env_id, worker_id=worker_id, slots_per_worker=SLOTS_PER_WORKER)
+        for round_num in range(num_rounds):
+            board = np.zeros(view.boards.shape[1:])
+            for slot in range(SLOTS_PER_WORKER):
+                data = np.zeros(view.data.shape[1:])
+                data[0] = request_id(env_id, worker_id, slot, round_num)
+                view.write_model_id(slot % num_models, slot)
+                view.write_board(board, slot)
+                view.write_data(data, slot)
+            for slot in range(SLOTS_PER_WORKER):
+                view.wait_for_preds(slot)
+                for head in Head:
+                    assert (view.preds[slot][head.value] == request_id(env_id, worker_id, slot, round_num)
+                            + head.value).all()
+                assert view.model_versions[slot] == slot % num_models + 1
+                view.write_preds_clean(slot)
+        view.close()
+    except Exception as e:
+        errors.append(e)
+
+
+def run_workers(address, num_envs, rounds_by_worker, num_models=1):
+    errors = []
+    threads = [threading.Thread(target=play_rounds,
+                                args=(address, env_id, worker_id, num_rounds, num_models, errors))
+               for worker_id, num_rounds in enumerate(rounds_by_worker) for env_id in range(num_envs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+        assert not t.is_alive(), 'Worker is stuck'
+    assert not errors, errors
+
+
+def test_round_trip():
+    address = start_server(num_envs=2, num_models=1)
+    run_workers(address, num_envs=2, rounds_by_worker=[NUM_ROUNDS] * 3)
+
+
+def test_worker_disconnects():
+    # The first worker leaves after one round; the others must keep getting predictions
+    address = start_server(num_envs=1, num_models=1)
+    run_workers(address, num_envs=1, rounds_by_worker=[1, NUM_ROUNDS, NUM_ROUNDS])
+
+
+def test_multiple_models():
+    address = start_server(num_envs=1, num_models=2)
+    run_workers(address, num_envs=1, rounds_by_worker=[NUM_ROUNDS] * 2, num_models=2)
+
+
+def run_tests():
+    for test in [test_round_trip, test_worker_disconnects, test_multiple_models]:
+        test()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
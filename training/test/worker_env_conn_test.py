@@ -0,0 +1,146 @@
+import asyncio
+import multiprocessing as mp
+import numpy as np
+import os
+
+from training import metrics, model
+from training.constants import Head
+from training.evaluator import async_evaluate_forever
+from training.metrics import Counter
+from training.shared_memory_manager import SharedMemoryManager, View
+from training.worker_env_conn import WorkerEnvConn
+
+NUM_WORKERS = 2
+NUM_ENVS = 2
+# Enough coroutines per worker that waking them one at a time would show
+SLOTS_PER_WORKER = 100
+
+
+# Every head predicts the first data entry of its request plus the head's index
+class EchoModel:
+    def predict(self, inputs, batch_size):
+        _, data = inputs
+        return [np.repeat(data[:, :1] + head.value, model.head_sizes[head], axis=1) for head in Head]
+
+
+def run_evaluator(worker_env_conns_by_env, metrics_name):
+    metrics.enable(metrics_name)
+    views = [View.for_evaluator(env=SharedMemoryManager.make_env(env_id), num_slots=NUM_WORKERS * SLOTS_PER_WORKER)
+             for env_id in range(NUM_ENVS)]
+    nn = EchoModel()
+    async_evaluate_forever(views, lambda: (7, nn), NUM_WORKERS * SLOTS_PER_WORKER, worker_env_conns_by_env)
+
+
+def request_id(env_id, worker_id, slot, round_num):
+    return 100000 * round_num + 10000 * env_id + 1000 * worker_id + slot
+
+
+# Slots stop after different numbers of rounds, so the others have to carry on without them
+def num_rounds(worker_id, slot):
+    return 1 + slot % 4
+
+
+# Every slot of worker 0 stops after the first round, so worker 1 has to carry on without the whole worker
+def num_rounds_one_worker_retires(worker_id, slot):
+    return 1 if worker_id == 0 else 5
+
+
+async def play_slot(view, worker_env_conn, worker_id, slot, num_rounds):
+    env_id = worker_env_conn.env_id
+    for round_num in range(num_rounds(worker_id, slot)):
+        data = np.zeros(view.data.shape[1:])
+        data[0] = request_id(env_id, worker_id, slot, round_num)
+        view.write_board(np.zeros(view.boards.shape[1:]), slot)
+        view.write_data(data, slot)
+        await worker_env_conn.request_predictions()
+        for head in Head:
+            assert (view.preds[slot][head.value] == request_id(env_id, worker_id, slot, round_num) + head.value).all()
+        assert view.model_versions[slot] == 7
+        view.write_preds_clean(slot)
+    worker_env_conn.retire_slot(lambda: view.write_preds_clean(slot))
+
+
+def run_worker(worker_id, worker_env_conns, wake_ups, num_rounds):
+    views = [View.for_worker(env=SharedMemoryManager.make_env(env_id), slots_per_worker=SLOTS_PER_WORKER,
+                             num_workers=NUM_WORKERS, worker_id=worker_id) for env_id in range(NUM_ENVS)]
+
+    def count_wake_up(run_retired):
+        def on_wake_up():
+            wake_ups[worker_id] += 1
+            run_retired()
+        return on_wake_up
+
+    for worker_env_conn in worker_env_conns:
+        worker_env_conn.worker_waiter.on_wake_up = count_wake_up(worker_env_conn.run_retired)
+
+    async def run_all():
+        await asyncio.gather(*[play_slot(view, worker_env_conn, worker_id, slot, num_rounds)
+                               for view, worker_env_conn in zip(views, worker_env_conns)
+                               for slot in range(SLOTS_PER_WORKER)])
+
+    asyncio.run(run_all())
+
+
+# Plays [num_rounds] for every slot and returns how many times each worker was woken up, along with the number of
+# requests the evaluator counted
+def play(num_rounds):
+    smm = SharedMemoryManager.init(num_workers=NUM_WORKERS, slots_per_worker=SLOTS_PER_WORKER,
+                                   envs_per_worker=NUM_ENVS)
+    worker_env_conns_by_env = [[WorkerEnvConn.init(env_id=env_id, worker_id=worker_id, num_slots=SLOTS_PER_WORKER)
+                                for worker_id in range(NUM_WORKERS)] for env_id in range(NUM_ENVS)]
+    wake_ups = mp.Array('i', NUM_WORKERS)
+    metrics_name = f'worker-env-conn-test-{os.getpid()}'
+    evaluator = mp.Process(target=run_evaluator, args=(worker_env_conns_by_env, metrics_name), daemon=True)
+    evaluator.start()
+    workers = [mp.Process(target=run_worker, args=(worker_id, [conns[worker_id] for conns in worker_env_conns_by_env],
+                                                   wake_ups, num_rounds))
+               for worker_id in range(NUM_WORKERS)]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            assert worker.exitcode == 0, f'Worker exited with {worker.exitcode}'
+        _, counters = metrics.read(metrics_name)
+        return list(wake_ups), int(counters[Counter.REQUESTS.value])
+    finally:
+        for worker in workers:
+            worker.kill()
+        evaluator.kill()
+        smm.unlink()
+        metrics.unlink(metrics_name)
+
+
+# One wake-up per round per environment, however many slots are waiting on it
+def test_batched_wake_ups():
+    rounds = [max(num_rounds(worker_id, slot) for slot in range(SLOTS_PER_WORKER)) for worker_id in range(NUM_WORKERS)]
+    wake_ups, _ = play(num_rounds)
+    assert wake_ups == [r * NUM_ENVS for r in rounds], wake_ups
+
+
+# Only the requests that were actually made are counted, not the slots that had retired
+def total_requests(num_rounds):
+    return NUM_ENVS * sum(num_rounds(worker_id, slot) for worker_id in range(NUM_WORKERS)
+                          for slot in range(SLOTS_PER_WORKER))
+
+
+def test_requests_counted():
+    _, requests = play(num_rounds)
+    assert requests == total_requests(num_rounds), requests
+
+
+def test_worker_retires():
+    wake_ups, requests = play(num_rounds_one_worker_retires)
+    assert wake_ups == [NUM_ENVS, 5 * NUM_ENVS], wake_ups
+    assert requests == total_requests(num_rounds_one_worker_retires), requests
+
+
+def run_tests():
+    test_batched_wake_ups()
+    test_requests_counted()
+    test_worker_retires()
+    print('OK')
+
+
+if __name__ == '__main__':
+    run_tests()
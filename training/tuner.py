@@ -0,0 +1,117 @@
+import argparse
+import attr
+import itertools
+import numpy as np
+import time
+
+from training import metrics
+from training.metrics import COUNT, Counter, NUM_LEADING, Phase, TOTAL_NS
+from training.orchestrator import Config, Orchestrator
+
+# Long enough for the evaluator to load its model and for every slot to have sent in a first request
+WARMUP_SECONDS = 60
+BURST_SECONDS = 120
+
+
+@attr.s(frozen=True, slots=True)
+class Trial:
+    num_workers = attr.ib()
+    slots_per_worker = attr.ib()
+    num_envs = attr.ib()
+    # Positions evaluated per second, across all workers
+    positions_per_second = attr.ib()
+    # Moves actually played per second, across all workers
+    moves_per_second = attr.ib()
+    # Average fraction of each predict call that was filled with real requests
+    batch_fill = attr.ib()
+    # Fraction of the burst the evaluator spent waiting for workers to fill a batch
+    evaluator_idle = attr.ib()
+    # Fraction of the burst the average worker spent waiting for predictions. Workers on the 'eventfd' transport wait
+    # for every slot at once, so theirs is summed over slots.
+    worker_idle = attr.ib()
+
+    def __str__(self):
+        return f'workers={self.num_workers} slots={self.slots_per_worker} envs={self.num_envs}: ' \
+               f'{self.positions_per_second:.1f} positions/s, {self.moves_per_second:.2f} moves/s, ' \
+               f'batch fill {self.batch_fill:.2f}, evaluator idle {self.evaluator_idle:.2f}, ' \
+               f'worker idle {self.worker_idle:.2f}'
+
+
+# The metrics of the trial's processes, summed over [names]: the count and total time of each phase, and the counters
+def snapshot(names):
+    phases = np.zeros((len(Phase), NUM_LEADING), dtype=np.int64)
+    counters = np.zeros(len(Counter), dtype=np.int64)
+    for name in names:
+        process_metrics = metrics.read(name)
+        if process_metrics is not None:
+            phases += process_metrics[0][:, :NUM_LEADING]
+            counters += process_metrics[1]
+    return phases, counters
+
+
+# Runs self-play (without the learner) with the given parameters and measures the [burst_seconds] after warming up
+def run_trial(config, *, warmup_seconds, burst_seconds):
+    orchestrator = Orchestrator.init(config)
+    worker_names = [managed.name for managed in orchestrator.workers]
+    try:
+        orchestrator.start()
+        time.sleep(warmup_seconds)
+        evaluator_before, workers_before = snapshot(['evaluator']), snapshot(worker_names)
+        start = time.perf_counter()
+        time.sleep(burst_seconds)
+        evaluator_after, workers_after = snapshot(['evaluator']), snapshot(worker_names)
+        elapsed = time.perf_counter() - start
+        for managed in orchestrator.workers + orchestrator.services:
+            if managed.process.exitcode is not None:
+                raise RuntimeError(f'{managed.name} exited with code {managed.process.exitcode} during the trial')
+    finally:
+        orchestrator.shut_down()
+
+    evaluator_phases, evaluator_counters = (after - before for before, after in zip(evaluator_before, evaluator_after))
+    worker_phases, worker_counters = (after - before for before, after in zip(workers_before, workers_after))
+    num_workers = len(orchestrator.workers)
+    num_slots = num_workers * config.slots_per_worker
+    requests = evaluator_counters[Counter.REQUESTS.value]
+    batches = max(evaluator_phases[Phase.PREDICT.value, COUNT], 1)
+    return Trial(num_workers, config.slots_per_worker, config.num_envs,
+                 positions_per_second=requests / elapsed,
+                 moves_per_second=worker_counters[Counter.MOVES.value] / elapsed,
+                 batch_fill=requests / (batches * num_slots),
+                 evaluator_idle=evaluator_phases[Phase.BATCH_WAIT.value, TOTAL_NS] / 1e9 / elapsed,
+                 worker_idle=worker_phases[Phase.WAIT.value, TOTAL_NS] / 1e9 / (num_workers * elapsed))
+
+
+def tune(config, *, workers, slots, envs, warmup_seconds=WARMUP_SECONDS, burst_seconds=BURST_SECONDS):
+    config = attr.evolve(config, run_learner=False, num_games=None, metrics=True)
+    trials = []
+    for num_workers, slots_per_worker, num_envs in itertools.product(workers, slots, envs):
+        trial_config = attr.evolve(config, num_workers=num_workers, slots_per_worker=slots_per_worker,
+                                   num_envs=num_envs)
+        trial = run_trial(trial_config, warmup_seconds=warmup_seconds, burst_seconds=burst_seconds)
+        print(trial)
+        trials.append(trial)
+    return max(trials, key=lambda t: t.positions_per_second), trials
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search for the fastest self-play configuration')
+    parser.add_argument('--config', help='Base configuration; the tuned values replace its worker, slot and env counts')
+    parser.add_argument('--output', required=True, help='Where to write the best configuration')
+    parser.add_argument('--workers', type=int, nargs='+', required=True)
+    parser.add_argument('--slots', type=int, nargs='+', required=True)
+    parser.add_argument('--envs', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--warmup-seconds', type=float, default=WARMUP_SECONDS)
+    parser.add_argument('--burst-seconds', type=float, default=BURST_SECONDS)
+    args = parser.parse_args(argv)
+
+    config = Config.from_file(args.config) if args.config else Config()
+    best, _ = tune(config, workers=args.workers, slots=args.slots, envs=args.envs,
+                   warmup_seconds=args.warmup_seconds, burst_seconds=args.burst_seconds)
+    print(f'Best: {best}')
+    # Tuning runs without the learner; that's a property of the trial, not of the configuration we hand back
+    attr.evolve(config, num_workers=best.num_workers, slots_per_worker=best.slots_per_worker,
+                num_envs=best.num_envs).to_file(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,76 +3,138 @@ import attr
 import os
 
 
+# One direction of a [WorkerEnvConn]. The reader is added to the event loop the first time anyone waits and stays
+# there, and each time the eventfd fires every coroutine that's waiting is woken up at once. Signals that arrive while
+# nobody is waiting are counted, so the next wait returns straight away. Writing [RETIRED] says there will be no more
+# signals, after which every wait returns straight away and [retired] is set.
+RETIRED = 1 << 32
+
+
+@attr.s(slots=True)
+class EventFdWaiter:
+    fd = attr.ib()
+    # Called on every wake-up, before any of the waiting coroutines get to run
+    on_wake_up = attr.ib(default=None)
+    loop = attr.ib(default=None)
+    waiters = attr.ib(factory=list)
+    pending = attr.ib(default=0)
+    retired = attr.ib(default=False)
+
+    def wait(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.loop.add_reader(self.fd, self.on_readable)
+        future = self.loop.create_future()
+        if self.pending or self.retired:
+            self.pending = max(self.pending - 1, 0)
+            self.wake_up([future])
+        else:
+            self.waiters.append(future)
+        return future
+
+    def on_readable(self):
+        try:
+            value = os.eventfd_read(self.fd)
+        except BlockingIOError:
+            return
+        if value >= RETIRED:
+            self.retired = True
+            value -= RETIRED
+        self.pending += value
+        if self.waiters and (self.pending or self.retired):
+            self.pending = max(self.pending - 1, 0)
+            waiters, self.waiters = self.waiters, []
+            self.wake_up(waiters)
+
+    def wake_up(self, waiters):
+        if self.on_wake_up:
+            self.on_wake_up()
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop = None
+
+
+# Lets the coroutines of one worker in one environment and the evaluator for that environment wake each other up.
+# The data itself goes through shared memory; this only says when it's there. There is an eventfd for each direction.
+# Every slot's coroutine asks for predictions after writing its encodings, and once all of the worker's slots have
+# asked, the evaluator gets a single wake-up for the whole batch. It answers with a single wake-up too, which resumes
+# every slot at once. Once every slot has retired, the evaluator is told so that it stops waiting for this worker.
+#
+# The eventfds are anonymous, so the processes on both ends have to be forked from the one that called [init].
 @attr.s(slots=True)
 class WorkerEnvConn:
     env_id = attr.ib()
     worker_id = attr.ib()
+    num_slots = attr.ib()
     worker_to_env = attr.ib()
     env_to_worker = attr.ib()
-
-    @staticmethod
-    def get_worker_to_env_name(*, worker_id, env_id):
-        return f'/tmp/fifo-worker-{worker_id}-{env_id}'
-
-    @staticmethod
-    def get_env_to_worker_name(*, env_id, worker_id):
-        return f'/tmp/fifo-env-{env_id}-{worker_id}'
-
-    @staticmethod
-    def init_fifos(*, env_id, worker_id):
-        worker_to_env_name = WorkerEnvConn.get_worker_to_env_name(worker_id=worker_id, env_id=env_id)
-        env_to_worker_name = WorkerEnvConn.get_env_to_worker_name(env_id=env_id, worker_id=worker_id)
-        for fname in [worker_to_env_name, env_to_worker_name]:
-            if not os.path.exists(fname):
-                try:
-                    print(f'Creating {fname}')
-                    os.mkfifo(fname)
-                except FileExistsError:
-                    print(f'{fname} exists somehow')
+    env_waiter = attr.ib()
+    worker_waiter = attr.ib()
+    active_slots = attr.ib()
+    requested = attr.ib(default=0)
+    # Clean-up for slots that have stopped playing, run whenever a batch of predictions comes back
+    retired = attr.ib(factory=list)
 
     @classmethod
-    def for_worker(cls, env_id, worker_id):
-        WorkerEnvConn.init_fifos(env_id=env_id, worker_id=worker_id)
-        worker_to_env = open(WorkerEnvConn.get_worker_to_env_name(env_id=env_id, worker_id=worker_id),
-                             'a+b', buffering=0)
-        env_to_worker = open(WorkerEnvConn.get_env_to_worker_name(env_id=env_id, worker_id=worker_id),
-                             'rb', buffering=0)
-        return cls(env_id, worker_id, worker_to_env, env_to_worker)
+    def init(cls, *, env_id, worker_id, num_slots):
+        worker_to_env = os.eventfd(0, os.EFD_NONBLOCK)
+        env_to_worker = os.eventfd(0, os.EFD_NONBLOCK)
+        conn = cls(env_id, worker_id, num_slots, worker_to_env, env_to_worker, EventFdWaiter(worker_to_env),
+                   EventFdWaiter(env_to_worker), num_slots)
+        conn.worker_waiter.on_wake_up = conn.run_retired
+        return conn
 
-    @classmethod
-    def for_env(cls, env_id, worker_id):
-        WorkerEnvConn.init_fifos(env_id=env_id, worker_id=worker_id)
-        worker_to_env = open(WorkerEnvConn.get_worker_to_env_name(env_id=env_id, worker_id=worker_id),
-                             'rb', buffering=0)
-        env_to_worker = open(WorkerEnvConn.get_env_to_worker_name(env_id=env_id, worker_id=worker_id),
-                             'a+b', buffering=0)
-        return cls(env_id, worker_id, worker_to_env, env_to_worker)
-
-    @staticmethod
-    def _get_woken_up(fifo):
-        loop = asyncio.get_event_loop()
-        future = loop.create_future()
-
-        # @staticmethod
-        def set_determined():
-            future.set_result(fifo.read(1)[0])
-            asyncio.get_event_loop().remove_reader(fifo)
-
-        loop.add_reader(fifo, set_determined)
+    # Worker side. Called by a slot once its encodings are written; the future is done when the predictions are.
+    def request_predictions(self):
+        future = self.worker_waiter.wait()
+        self.requested += 1
+        self.wake_up_env_if_batch_complete()
         return future
 
-    def env_get_woken_up(self):
-        return WorkerEnvConn._get_woken_up(self.worker_to_env)
+    # Worker side. Called by a slot that won't ask for predictions again. The evaluator still writes predictions for
+    # it with every batch, so [clean_up] is called to clear them.
+    def retire_slot(self, clean_up):
+        self.active_slots -= 1
+        self.retired.append(clean_up)
+        if self.active_slots:
+            self.wake_up_env_if_batch_complete()
+        else:
+            os.eventfd_write(self.worker_to_env, RETIRED)
 
-    def wake_up_env(self):
-        self.worker_to_env.write(bytes([self.worker_id]))
+    def wake_up_env_if_batch_complete(self):
+        if self.active_slots and self.requested == self.active_slots:
+            self.requested = 0
+            os.eventfd_write(self.worker_to_env, 1)
 
-    def worker_get_woken_up(self):
-        return WorkerEnvConn._get_woken_up(self.env_to_worker)
+    def run_retired(self):
+        for clean_up in self.retired:
+            clean_up()
+
+    # Evaluator side
+    def env_get_woken_up(self):
+        return self.env_waiter.wait()
+
+    # Evaluator side. True once the worker has retired every slot and won't ask for predictions again.
+    def worker_retired(self):
+        return self.env_waiter.retired
 
     def wake_up_worker(self):
-        self.env_to_worker.write(bytes([self.env_id]))
+        os.eventfd_write(self.env_to_worker, 1)
+
+    # Throws away a wake-up meant for a worker that has since died, so that its replacement doesn't take it as its own
+    def drain_worker(self):
+        try:
+            os.eventfd_read(self.env_to_worker)
+        except BlockingIOError:
+            pass
 
     def clean_up(self):
-        os.unlink(self.worker_to_env)
-        os.unlink(self.env_to_worker)
+        self.env_waiter.close()
+        self.worker_waiter.close()
+        os.close(self.worker_to_env)
+        os.close(self.env_to_worker)